@@ -6,6 +6,7 @@ from .personalities.traits.organized import OrganizedPersonality
 from services.google_calendar import GoogleCalendarService
 from utils.enhanced_time_parser import EnhancedTimeParser
 from utils.date_utils import DateUtils
+from services.tracing import traced
 
 class CalendarAgent(BaseAgent):
     def __init__(self):
@@ -211,6 +212,7 @@ class CalendarAgent(BaseAgent):
                 'message': f"Error al programar la reunión: {str(e)}"
             }
 
+    @traced()
     async def process(self, message: str, context: Dict[str, Any]) -> str:
         """Process calendar-related requests"""
         try:
@@ -10,6 +10,7 @@ from slack_sdk.errors import SlackApiError
 
 from .base_agent import BaseAgent
 from services.gmail_service import GmailService
+from services.tracing import traced
 
 class EmailAgent(BaseAgent):
     def __init__(self, slack_config_path: Optional[str] = 'credentials/slack_config.json'):
@@ -148,6 +149,7 @@ class EmailAgent(BaseAgent):
                 
         return context
 
+    @traced()
     async def process(self, message: str, context: Dict[str, Any]) -> str:
         """Process email-related requests"""
         msg = message.lower()
@@ -1,5 +1,6 @@
 from typing import Dict, Any
 from .base_agent import BaseAgent
+from services.tracing import traced
 
 class LuciusAgent(BaseAgent):
     def __init__(self):
@@ -9,6 +10,7 @@ class LuciusAgent(BaseAgent):
             personality="Profesional y eficiente"
         )
     
+    @traced()
     async def process(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Procesa un mensaje y retorna una respuesta"""
         # Por ahora, una implementación simple
@@ -1,8 +1,13 @@
 from typing import Dict, Any, List
 from datetime import datetime
+import asyncio
 from .base_agent import BaseAgent
 from .calendar_agent import CalendarAgent
 from .email_agent import EmailAgent
+from services.metrics_service import MetricsService
+from services.tracing import trace_span
+from services.concurrency_limiter import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded
+from services.fair_queue import FairQueue
 
 class LuciusFox(BaseAgent):
     def __init__(self):
@@ -13,6 +18,14 @@ class LuciusFox(BaseAgent):
         )
         self.agents: Dict[str, BaseAgent] = {}
         self.conversation_context: Dict[str, Any] = {}
+        self.metrics_service = MetricsService()
+        # Adaptive in-flight limit for incoming Slack messages
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter('lucius_fox', latency_slo_ms=15000)
+        self.metrics_service.register_limiter(self.concurrency_limiter)
+        self.request_timeout = 60
+        # Per-user fair share of message processing
+        self.fair_queue = FairQueue('lucius_fox', capacity=8, per_user_limit=2)
+        self.metrics_service.register_queue(self.fair_queue)
         
         # Initialize and register agents
         self.register_agent(CalendarAgent())
@@ -57,8 +70,7 @@ class LuciusFox(BaseAgent):
         # Include conversation history in the context
         context['conversation_history'] = conv_context['history']
         
-        response = await agent.process(message, context)
-        return response
+        return await agent.process(message, context)
 
     def should_continue_with_active_agent(self, message: str, thread_context: Dict[str, Any]) -> bool:
         """Determine if we should continue with the currently active agent"""
@@ -76,6 +88,34 @@ class LuciusFox(BaseAgent):
 
     async def process(self, message: str, context: Dict[str, Any]) -> str:
         """Process incoming messages and coordinate with other agents"""
+        # Error and load rates of every worker of the deployment
+        if await self.metrics_service.should_throttle():
+            return self.format_response(
+                "Sistema temporalmente sobrecargado, por favor espere."
+            )
+        try:
+            # Wait for the user's fair share first, so queued messages hold
+            # no limiter slot and their wait counts neither as latency nor
+            # towards the timeout
+            async with self.fair_queue.slot(context.get('user')):
+                async with self.concurrency_limiter.slot():
+                    async with trace_span('LuciusFox.process', recorder=self.metrics_service):
+                        return await asyncio.wait_for(
+                            self._process(message, context),
+                            self.request_timeout
+                        )
+        except ConcurrencyLimitExceeded:
+            self.metrics_service.record_throttled()
+            return self.format_response(
+                "Sistema temporalmente sobrecargado, por favor espere."
+            )
+        except asyncio.TimeoutError:
+            return self.format_response(
+                "La solicitud está tardando demasiado y se canceló. Por favor, inténtalo de nuevo en unos minutos."
+            )
+
+    async def _process(self, message: str, context: Dict[str, Any]) -> str:
+        """Route a message to the right agent"""
         thread_id = context.get('thread_ts', context.get('ts'))
         thread_context = self.get_conversation_context(thread_id)
         user = context.get('user')
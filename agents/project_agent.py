@@ -1,8 +1,10 @@
 from typing import Dict, Any, List, Optional
+import re
 from .base_agent import BaseAgent
 from services.project_service import ProjectService
 from services.task_service import TaskService
 from services.document_service import DocumentService
+from services.tracing import traced
 
 class ProjectAgent(BaseAgent):
     def __init__(self):
@@ -13,10 +15,11 @@ class ProjectAgent(BaseAgent):
         )
         self.current_project: Optional[Dict[str, Any]] = None
         self.project_history: List[Dict[str, Any]] = []
+        self.page_size = 20
         
         # Initialize services
-        self.project_service = ProjectService()
         self.task_service = TaskService()
+        self.project_service = ProjectService(task_service=self.task_service)
         self.document_service = DocumentService()
 
     def _clean_name(self, name: str) -> str:
@@ -79,6 +82,38 @@ class ProjectAgent(BaseAgent):
         
         return None
 
+    def _extract_task_names(self, message: str) -> List[str]:
+        """Extract several task names from a bulleted list or an enumeration after 'tareas:'"""
+        lines = [line.strip() for line in message.splitlines()]
+        bullets = [
+            re.sub(r'^([-*•]|\d+[.)])\s*', '', line)
+            for line in lines if re.match(r'^([-*•]|\d+[.)])\s+', line)
+        ]
+        names = bullets
+        if not names:
+            match = re.search(r'\b(?:tareas|tasks)\s*:\s*(.+)', message, re.IGNORECASE)
+            if match:
+                names = re.split(r'\s*[,;•]\s*', match.group(1).strip().rstrip('.'))
+                # 'a, b y c': the conjunction only separates the last item of a
+                # list; elsewhere it is part of the name ('diseño y arquitectura')
+                if len(names) > 1:
+                    names[-1:] = re.split(r'^(?:y|and)\s+|\s+(?:y|and)\s+(?!.*\s(?:y|and)\s)',
+                                          names[-1], maxsplit=1)
+        names = [self._clean_name(name) for name in names]
+        return [name for name in names if name]
+
+    def _suggestions(self, matches: List[Dict[str, Any]], kind: str) -> List[Dict[str, Any]]:
+        """Compact view of find_similar_* results for the response"""
+        return [
+            {'id': match[kind]['id'], 'name': match[kind]['name'], 'score': match['score']}
+            for match in matches
+        ]
+
+    def _duplicate_message(self, existing_phrase: str, existing_name: str, score: float) -> str:
+        if score >= 1.0:
+            return f"Ya existe {existing_phrase} '{existing_name}'"
+        return f"¿Quisiste decir '{existing_name}'? Ya existe {existing_phrase} así (similitud {score:.0%})"
+
     def extract_project_intent(self, message: str) -> Dict[str, Any]:
         """Extract project management related intent from message"""
         msg = message.lower()
@@ -86,6 +121,7 @@ class ProjectAgent(BaseAgent):
             'action': 'unknown',
             'project': None,
             'task': None,
+            'tasks': [],
             'priority': 'medium',
             'deadline': None,
             'assignee': None
@@ -100,6 +136,7 @@ class ProjectAgent(BaseAgent):
                     ["proyecto", "project", "llamado", "named", "titulado", "titled"]
                 )
             else:
+                intent['tasks'] = self._extract_task_names(message)
                 intent['task'] = self._extract_name(
                     message,
                     ["tarea", "task", "llamada", "named", "titulada", "titled"]
@@ -121,6 +158,7 @@ class ProjectAgent(BaseAgent):
             
         return intent
 
+    @traced()
     async def process(self, message: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Process project management related requests"""
         if context is None:
@@ -140,12 +178,16 @@ class ProjectAgent(BaseAgent):
         try:
             if intent['action'] == "create":
                 # Handle project/task creation
+                # Near-identical names are rejected with a suggestion unless
+                # the caller insists with context['force_create']
+                check_duplicates = not context.get('force_create')
                 if "proyecto" in message.lower() or "project" in message.lower():
                     name = intent['project'] or 'Nuevo Proyecto'
-                    # Check for duplicates
-                    existing = await self.project_service.list_projects({'name': name})
-                    if existing:
-                        response['error'] = f"Ya existe un proyecto llamado '{name}'"
+                    similar = await self.project_service.find_similar_projects(name) if check_duplicates else []
+                    if similar:
+                        response['suggestions'] = self._suggestions(similar, 'project')
+                        response['error'] = self._duplicate_message(
+                            "un proyecto llamado", similar[0]['project']['name'], similar[0]['score'])
                     else:
                         project = await self.project_service.create_project({
                             'name': name,
@@ -155,12 +197,40 @@ class ProjectAgent(BaseAgent):
                         })
                         response['projects'].append(project)
                         response['action_taken'] = "project_created"
+                elif len(intent['tasks']) > 1:
+                    # Several tasks in one message: create them in a single batch
+                    names = list(dict.fromkeys(intent['tasks']))
+                    conflicts = {}
+                    if check_duplicates:
+                        for name in names:
+                            similar = await self.task_service.find_similar_tasks(name, limit=1)
+                            if similar:
+                                conflicts[name] = similar[0]
+                    if conflicts:
+                        response['suggestions'] = self._suggestions(list(conflicts.values()), 'task')
+                        response['error'] = "Ya existen tareas parecidas: " + ', '.join(
+                            f"'{name}' (¿quisiste decir '{match['task']['name']}'?)"
+                            for name, match in conflicts.items()
+                        )
+                    else:
+                        tasks = await self.task_service.create_tasks([
+                            {
+                                'name': name,
+                                'description': message,
+                                'status': 'pending',
+                                'priority': intent['priority']
+                            }
+                            for name in names
+                        ])
+                        response['tasks'].extend(tasks)
+                        response['action_taken'] = "tasks_created"
                 else:
                     name = intent['task'] or 'Nueva Tarea'
-                    # Check for duplicates
-                    existing = await self.task_service.list_tasks({'name': name})
-                    if existing:
-                        response['error'] = f"Ya existe una tarea llamada '{name}'"
+                    similar = await self.task_service.find_similar_tasks(name) if check_duplicates else []
+                    if similar:
+                        response['suggestions'] = self._suggestions(similar, 'task')
+                        response['error'] = self._duplicate_message(
+                            "una tarea llamada", similar[0]['task']['name'], similar[0]['score'])
                     else:
                         task = await self.task_service.create_task({
                             'name': name,
@@ -172,15 +242,23 @@ class ProjectAgent(BaseAgent):
                         response['action_taken'] = "task_created"
 
             elif intent['action'] == "list":
-                # Handle listing projects/tasks
+                # Handle listing projects/tasks one page at a time; the caller
+                # passes next_cursor back in the context for the next page
+                page_size = context.get('page_size', self.page_size)
+                cursor = context.get('cursor')
                 if "proyecto" in message.lower() or "project" in message.lower():
-                    projects = await self.project_service.list_projects()
-                    response['projects'] = projects
+                    page = await self.project_service.query_projects(
+                        order_by=['-updated_at'], limit=page_size, cursor=cursor
+                    )
+                    response['projects'] = page['items']
                     response['action_taken'] = "projects_listed"
                 else:
-                    tasks = await self.task_service.list_tasks()
-                    response['tasks'] = tasks
+                    page = await self.task_service.query_tasks(
+                        order_by=['due_date'], limit=page_size, cursor=cursor
+                    )
+                    response['tasks'] = page['items']
                     response['action_taken'] = "tasks_listed"
+                response['next_cursor'] = page['next_cursor']
 
             elif intent['action'] == "update":
                 # TODO: Implement project/task updates
@@ -4,6 +4,7 @@ from services.search_service import SearchService
 from services.document_service import DocumentService
 from services.analysis_service import AnalysisService
 from services.knowledge_service import KnowledgeService
+from services.tracing import traced
 
 class ResearchAgent(BaseAgent):
     def __init__(self):
@@ -93,6 +94,7 @@ class ResearchAgent(BaseAgent):
         
         return context
 
+    @traced()
     async def process(self, message: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Process research-related requests"""
         if context is None:
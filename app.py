@@ -5,6 +5,9 @@ from flask import Flask, request, jsonify
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 from agents import LuciusFox
+from services.task_service import TaskService
+from services.due_date_scheduler import DueDateScheduler
+from services.file_lock import FileLock
 
 # Load environment variables
 load_dotenv()
@@ -29,6 +32,36 @@ def get_bot_user_id():
 
 BOT_USER_ID = get_bot_user_id()
 
+# Channel for task due-date reminders; reminders are off when unset
+REMINDER_CHANNEL = os.getenv('SLACK_REMINDER_CHANNEL')
+
+def send_due_reminder(task, due_at):
+    assignee = f" (responsable: {task['assignee']})" if task.get('assignee') else ''
+    slack_client.chat_postMessage(
+        channel=REMINDER_CHANNEL,
+        text=f"⏰ La tarea '{task['name']}' vence ahora ({due_at:%d/%m/%Y %H:%M}){assignee}"
+    )
+
+# Held for the life of the process by the worker that sends the reminders
+reminder_lock = FileLock('data/reminders.lock')
+
+def start_reminder_scheduler():
+    """Send due-date reminders from a background thread of a single process"""
+    if not REMINDER_CHANNEL:
+        return None
+    # Every worker imports this module; the one holding the lock sends the
+    # reminders and the rest skip them
+    if not reminder_lock.acquire(blocking=False):
+        return None
+    # A TaskService of its own, only touched by the scheduler thread: task
+    # writes of this and other workers arrive as journal changes at each poll
+    scheduler = DueDateScheduler(send_due_reminder, poll_interval=5.0)
+    scheduler.attach(TaskService())
+    scheduler.start()
+    return scheduler
+
+reminder_scheduler = start_reminder_scheduler()
+
 async def handle_message(text: str, channel_id: str, thread_ts: str = None, user: str = None):
     try:
         # Create context for the message
@@ -5,6 +5,7 @@ import asyncio
 from datetime import datetime
 
 from services.metrics_service import MetricsService
+from services.tracing import trace_span
 from agents.base_agent import BaseAgent
 
 class WorkflowState(TypedDict):
@@ -27,28 +28,25 @@ class AutonomoNode(Node):
     async def process(self, state: WorkflowState) -> WorkflowState:
         """Procesa el estado actual y retorna el nuevo estado"""
         try:
-            # Registrar inicio
-            start_time = datetime.now()
-            
             # Extraer último mensaje
             last_message = state["messages"][-1] if state["messages"] else {"content": ""}
             
-            # Procesar con el agente
-            result = await self.agent.process(
-                last_message["content"],
-                state["context"]
-            )
-            
-            # Registrar finalización
-            end_time = datetime.now()
+            # Procesar con el agente (span anidado bajo el del workflow)
+            async with trace_span(
+                f"{self.agent.name.lower()}.{state['workflow_type']}",
+                recorder=self.metrics_service
+            ) as span:
+                result = await self.agent.process(
+                    last_message["content"],
+                    state["context"]
+                )
             
             # Actualizar métricas
             await self.metrics_service.record_task(
                 self.agent.name.lower(),
                 {
                     "type": state["workflow_type"],
-                    "start_time": start_time.isoformat(),
-                    "end_time": end_time.isoformat(),
+                    "duration_ns": span.duration_ns,
                     "handoff_success": True
                 }
             )
@@ -141,6 +139,10 @@ class LangGraphOrchestrator:
             "tom": ProjectAgent()
         }
         
+        document_service = getattr(agents[agent_name], "document_service", None)
+        if document_service is not None:
+            self.metrics_service.register_cache(document_service.cache)
+        
         return AutonomoNode(
             agent=agents[agent_name],
             metrics_service=self.metrics_service
@@ -180,7 +182,8 @@ class LangGraphOrchestrator:
         # Ejecutar workflow
         try:
             graph = self.graphs[workflow_type]
-            final_state = await graph.arun(initial_state)
+            async with trace_span(f"workflow.{workflow_type}", recorder=self.metrics_service):
+                final_state = await graph.arun(initial_state)
             
             return {
                 "status": "success",
@@ -1,5 +1,4 @@
 from typing import Dict, List, Any, Optional
-from datetime import datetime
 import asyncio
 import json
 
@@ -8,6 +7,7 @@ from langgraph.checkpoint.memory import MemorySaver
 from langgraph.types import interrupt
 
 from services.metrics_service import MetricsService
+from services.tracing import trace_span
 from agents.lucius_agent import LuciusAgent
 from agents.research_agent import ResearchAgent
 from agents.project_agent import ProjectAgent
@@ -24,14 +24,12 @@ tom = ProjectAgent()
 @task
 async def process_with_lucius(message: str, context: Dict[str, Any]) -> Dict[str, Any]:
     """Procesa un mensaje con Lucius"""
-    start_time = datetime.now()
-    result = await lucius.process(message, context)
-    end_time = datetime.now()
+    async with trace_span('lucius.evaluation', recorder=metrics_service) as span:
+        result = await lucius.process(message, context)
     
     await metrics_service.record_task('lucius', {
         'type': 'evaluation',
-        'start_time': start_time.isoformat(),
-        'end_time': end_time.isoformat(),
+        'duration_ns': span.duration_ns,
         'handoff_success': True
     })
     
@@ -40,14 +38,12 @@ async def process_with_lucius(message: str, context: Dict[str, Any]) -> Dict[str
 @task
 async def process_with_mike(message: str, context: Dict[str, Any]) -> Dict[str, Any]:
     """Procesa un mensaje con Mike"""
-    start_time = datetime.now()
-    result = await mike.process(message, context)
-    end_time = datetime.now()
+    async with trace_span('mike.research', recorder=metrics_service) as span:
+        result = await mike.process(message, context)
     
     await metrics_service.record_task('mike', {
         'type': 'research',
-        'start_time': start_time.isoformat(),
-        'end_time': end_time.isoformat(),
+        'duration_ns': span.duration_ns,
         'handoff_success': True
     })
     
@@ -56,14 +52,12 @@ async def process_with_mike(message: str, context: Dict[str, Any]) -> Dict[str,
 @task
 async def process_with_tom(message: str, context: Dict[str, Any]) -> Dict[str, Any]:
     """Procesa un mensaje con Tom"""
-    start_time = datetime.now()
-    result = await tom.process(message, context)
-    end_time = datetime.now()
+    async with trace_span('tom.project', recorder=metrics_service) as span:
+        result = await tom.process(message, context)
     
     await metrics_service.record_task('tom', {
         'type': 'project',
-        'start_time': start_time.isoformat(),
-        'end_time': end_time.isoformat(),
+        'duration_ns': span.duration_ns,
         'handoff_success': True
     })
     
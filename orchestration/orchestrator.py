@@ -2,11 +2,21 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime
 import asyncio
 from services.metrics_service import MetricsService
+from services.tracing import trace_span
+from services.concurrency_limiter import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded
+from services.fair_queue import FairQueue
 from agents.base_agent import BaseAgent
 
 class Orchestrator:
     def __init__(self):
         self.metrics_service = MetricsService()
+        # In-flight limit that adapts to observed latency instead of fixed thresholds
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter('orchestrator', latency_slo_ms=30000)
+        self.metrics_service.register_limiter(self.concurrency_limiter)
+        self.request_timeout = 120
+        # Per-user fair share of workflow execution
+        self.fair_queue = FairQueue('orchestrator', capacity=8, per_user_limit=2)
+        self.metrics_service.register_queue(self.fair_queue)
         self.autonomos: Dict[str, BaseAgent] = {}
         self.workflows: Dict[str, Dict[str, Any]] = {
             'research': {
@@ -29,17 +39,21 @@ class Orchestrator:
     def register_autonomo(self, name: str, autonomo: BaseAgent) -> None:
         """Register an autonomo with the orchestrator"""
         self.autonomos[name] = autonomo
+        document_service = getattr(autonomo, 'document_service', None)
+        if document_service is not None:
+            self.metrics_service.register_cache(document_service.cache)
 
     async def process_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """Process a user request through the appropriate workflow"""
         # Record interaction
+        complexity = self._estimate_complexity(request)
         await self.metrics_service.record_interaction({
             'type': 'request',
-            'complexity': self._estimate_complexity(request),
+            'complexity': complexity,
             'workflow': request.get('workflow', 'unknown')
         })
         
-        # Check if we should throttle
+        # Turn work away while the deployment is overloaded or failing
         if await self.metrics_service.should_throttle():
             return {
                 'status': 'throttled',
@@ -56,11 +70,34 @@ class Orchestrator:
         
         # Execute workflow
         try:
-            result = await self._execute_workflow(workflow, request)
+            # Heavier workflows use up more of the user's share. The fair
+            # queue comes first so the limiter only counts running workflows
+            async with self.fair_queue.slot(request.get('user'), cost=complexity):
+                async with self.concurrency_limiter.slot():
+                    result = await asyncio.wait_for(
+                        self._execute_workflow(workflow, request),
+                        self.request_timeout
+                    )
             return {
                 'status': 'success',
                 'result': result
             }
+        except ConcurrencyLimitExceeded:
+            self.metrics_service.record_throttled()
+            return {
+                'status': 'throttled',
+                'message': 'Sistema temporalmente sobrecargado, por favor espere.'
+            }
+        except asyncio.TimeoutError:
+            await self.metrics_service.record_error({
+                'type': 'workflow_timeout',
+                'workflow': request.get('workflow'),
+                'error': f'Tiempo de espera agotado ({self.request_timeout} s)'
+            })
+            return {
+                'status': 'timeout',
+                'message': 'El workflow tardó demasiado y se canceló, por favor inténtelo de nuevo.'
+            }
         except Exception as e:
             await self.metrics_service.record_error({
                 'type': 'workflow_error',
@@ -84,48 +121,50 @@ class Orchestrator:
             'results': {}
         }
         
-        for step in workflow['steps']:
-            # Get autonomo
-            autonomo = self.autonomos.get(step)
-            if not autonomo:
-                raise ValueError(f'Autonomo no encontrado: {step}')
-            
-            # Get transition
-            transition = workflow['transitions'][step][
-                len(context['results'].get(step, []))
-            ]
-            
-            # Execute step
-            try:
-                start_time = datetime.now()
-                # Extract message for autonomo
-                message = request.get('message', '')
-                # Add context to message if needed
-                if context['results']:
-                    message += '\nContexto previo: ' + str(context['results'])
-                result = await autonomo.process(message, context)
-                end_time = datetime.now()
-                
-                # Record task
-                await self.metrics_service.record_task(step, {
-                    'type': transition,
-                    'start_time': start_time.isoformat(),
-                    'end_time': end_time.isoformat(),
-                    'handoff_success': True
-                })
+        async with trace_span(
+            f"workflow.{request.get('workflow')}",
+            recorder=self.metrics_service
+        ):
+            for step in workflow['steps']:
+                # Get autonomo
+                autonomo = self.autonomos.get(step)
+                if not autonomo:
+                    raise ValueError(f'Autonomo no encontrado: {step}')
                 
-                # Store result
-                if step not in context['results']:
-                    context['results'][step] = []
-                context['results'][step].append(result)
+                # Get transition
+                transition = workflow['transitions'][step][
+                    len(context['results'].get(step, []))
+                ]
                 
-            except Exception as e:
-                await self.metrics_service.record_task(step, {
-                    'type': transition,
-                    'error': str(e),
-                    'handoff_success': False
-                })
-                raise
+                # Execute step
+                try:
+                    # Extract message for autonomo
+                    message = request.get('message', '')
+                    # Add context to message if needed
+                    if context['results']:
+                        message += '\nContexto previo: ' + str(context['results'])
+                    async with trace_span(f'{step}.{transition}') as span:
+                        result = await autonomo.process(message, context)
+                    
+                    # Record task
+                    await self.metrics_service.record_task(step, {
+                        'type': transition,
+                        'duration_ns': span.duration_ns,
+                        'handoff_success': True
+                    })
+                    
+                    # Store result
+                    if step not in context['results']:
+                        context['results'][step] = []
+                    context['results'][step].append(result)
+                    
+                except Exception as e:
+                    await self.metrics_service.record_task(step, {
+                        'type': transition,
+                        'error': str(e),
+                        'handoff_success': False
+                    })
+                    raise
         
         return context['results']
 
@@ -0,0 +1,63 @@
+"""Benchmark del grafo de dependencias de tareas.
+
+Uso: python -m scripts.benchmark_dependency_graph [--nodes 20000] [--edges 100000]
+
+Los nodos se insertan en orden aleatorio para que las aristas obliguen a
+reordenar el orden topológico incremental.
+"""
+import argparse
+import random
+import time
+from services.dependency_graph import DependencyGraph, DependencyCycleError
+
+def _timed(label: str, func, count: int = 1):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    rate = f" ({count / elapsed:,.0f}/s)" if count > 1 else ""
+    print(f"{label:<40} {elapsed * 1000:>10.1f} ms{rate}")
+    return result
+
+def main(node_count: int, edge_count: int, seed: int) -> None:
+    rng = random.Random(seed)
+    graph = DependencyGraph()
+    nodes = list(range(node_count))
+    rng.shuffle(nodes)
+    for node in nodes:
+        graph.add_node(node)
+
+    # Aristas de ids mayores a menores: el grafo final es acíclico
+    edges = set()
+    while len(edges) < edge_count:
+        a, b = rng.sample(range(node_count), 2)
+        edges.add((max(a, b), min(a, b)))
+    edges = list(edges)
+
+    _timed(f"insertar {edge_count:,} aristas", lambda: graph.load(edges), edge_count)
+
+    def try_cycles():
+        rejected = 0
+        for task, dependency in rng.sample(edges, 1000):
+            try:
+                graph.add_edge(dependency, task)
+            except DependencyCycleError:
+                rejected += 1
+        return rejected
+    rejected = _timed("detectar 1,000 ciclos", try_cycles, 1000)
+    assert rejected == 1000
+
+    sample = rng.sample(range(node_count), 100)
+    _timed("100 dependencias transitivas", lambda: [graph.transitive_dependencies(n) for n in sample], 100)
+    _timed("100 dependientes transitivos", lambda: [graph.transitive_dependents(n) for n in sample], 100)
+    _timed("orden topológico completo", graph.topological_order)
+    result = _timed("ruta crítica (todos los nodos)",
+                    lambda: graph.critical_path(graph.order, lambda n: 1 + n % 5))
+    print(f"longitud de la ruta crítica: {result['length']} ({len(result['path'])} tareas)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del grafo de dependencias")
+    parser.add_argument('--nodes', type=int, default=20_000)
+    parser.add_argument('--edges', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    main(args.nodes, args.edges, args.seed)
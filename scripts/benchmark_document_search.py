@@ -0,0 +1,109 @@
+"""Benchmark del planificador de búsquedas de documentos de investigación.
+
+Uso: python -m scripts.benchmark_document_search [--docs 100000] [--repeat 200]
+
+Genera un índice sintético (solo metadatos, sin archivos por documento)
+con temas y etiquetas de frecuencia muy desigual y fechas repartidas en
+un año, y compara search_documents con el recorrido completo del índice
+que hacía antes para varias combinaciones de filtros.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from services.document_service import DocumentService
+
+TOPICS = [f"tema{i}" for i in range(200)]
+TAGS = [f"etiqueta{i}" for i in range(50)]
+
+def _timed(label: str, func, count: int = 1):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    rate = f" ({count / elapsed:,.0f}/s)" if count > 1 else ""
+    print(f"{label:<40} {elapsed * 1000:>10.1f} ms{rate}")
+    return result
+
+def _populate(service: DocumentService, count: int, rng: random.Random) -> None:
+    topic_weights = [1 / (rank + 1) for rank in range(len(TOPICS))]
+    tag_weights = [1 / (rank + 1) for rank in range(len(TAGS))]
+    start = datetime(2024, 1, 1)
+    documents = service.document_index["documents"]
+    for i in range(count):
+        timestamp = (start + timedelta(seconds=i * 365 * 86400 // count)).isoformat()
+        doc_id = f"doc_{timestamp}_{i:08x}"
+        metadata = {
+            "id": doc_id,
+            "timestamp": timestamp,
+            "query": f"consulta {i}",
+            "topics": list(set(rng.choices(TOPICS, topic_weights, k=rng.randint(1, 3)))),
+            "tags": list(set(rng.choices(TAGS, tag_weights, k=rng.randint(0, 3)))),
+            "type": "research"
+        }
+        documents[doc_id] = metadata
+        for section in ("topics", "tags"):
+            for value in metadata[section]:
+                service.document_index[section].setdefault(value, []).append(doc_id)
+
+def _full_scan(service: DocumentService, topics=None, tags=None, date_from=None, date_to=None) -> list:
+    """Filtro anterior: comprueba todos los documentos del índice"""
+    date_from = datetime.fromisoformat(date_from) if date_from else None
+    date_to = datetime.fromisoformat(date_to) if date_to else None
+    results = []
+    for doc_id, metadata in service.document_index["documents"].items():
+        if topics and not all(topic in metadata["topics"] for topic in topics):
+            continue
+        if tags and not all(tag in metadata["tags"] for tag in tags):
+            continue
+        if date_from or date_to:
+            doc_date = datetime.fromisoformat(metadata["timestamp"])
+            if (date_from and doc_date < date_from) or (date_to and doc_date > date_to):
+                continue
+        results.append(doc_id)
+    return results
+
+CASES = [
+    ("tema raro", {"topics": ["tema150"]}),
+    ("tema común + etiqueta rara", {"topics": ["tema0"], "tags": ["etiqueta40"]}),
+    ("dos temas comunes", {"topics": ["tema0", "tema1"]}),
+    ("una semana", {"date_from": "2024-06-01", "date_to": "2024-06-07T23:59:59"}),
+    ("tema común + un mes", {"topics": ["tema2"], "date_from": "2024-03-01", "date_to": "2024-03-31"}),
+]
+
+async def _run(service: DocumentService, repeat: int) -> None:
+    for label, filters in CASES:
+        plan = service.explain_search(**filters)
+        expected = _full_scan(service, **filters)
+        results = await service.search_documents(limit=None, **filters)
+        assert sorted(r.id for r in results) == sorted(expected)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await service.search_documents(limit=None, **filters)
+        planned = (time.perf_counter() - start) / repeat * 1000
+        start = time.perf_counter()
+        for _ in range(max(1, repeat // 20)):
+            _full_scan(service, **filters)
+        scanned = (time.perf_counter() - start) / max(1, repeat // 20) * 1000
+        print(f"{label:<28} {len(expected):>6} docs  plan {plan['driver']}:{plan['rows']:<6} "
+              f"{planned:>8.3f} ms  vs recorrido {scanned:>8.2f} ms")
+
+def main(doc_count: int, repeat: int, seed: int) -> None:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        service = DocumentService()
+        _timed(f"generar {doc_count:,} metadatos", lambda: _populate(service, doc_count, rng))
+        _timed("ordenar listas e índice de fechas", service._build_search_indexes)
+        asyncio.run(_run(service, repeat))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del planificador de búsquedas")
+    parser.add_argument('--docs', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    main(args.docs, args.repeat, args.seed)
@@ -0,0 +1,95 @@
+"""Benchmark del retraso del bucle de eventos durante escrituras concurrentes.
+
+Uso: python -m scripts.benchmark_event_loop_lag [--writers 50] [--ops 20] [--backend json]
+
+Lanza varias corrutinas que crean tareas, guardan documentos de
+investigación y actualizan proyectos mientras otra mide cada milisegundo
+cuánto tarda el bucle en despertarla. Compara las escrituras bloqueantes
+que se hacían antes en el propio bucle (bloqueo, json.dump y vuelta) con
+las del pool de E/S, que agrupa las escrituras pequeñas.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from services.document_service import DocumentService
+from services.project_service import ProjectService
+from services.task_service import TaskService
+
+async def _blocking_create_task(service: TaskService, data: dict) -> dict:
+    """Escritura anterior: todo en el bucle de eventos"""
+    with service.storage.lock():
+        return service._create_task(data)
+
+async def _blocking_save_research(service: DocumentService, data: dict) -> str:
+    doc_id = service._generate_id(str(data))
+    metadata = {"id": doc_id, "timestamp": doc_id[4:30], "query": data["query"],
+                "topics": [], "tags": [], "type": "research"}
+    return service._add_document(metadata, data, service._encode_content(data))
+
+async def _blocking_update_project(service: ProjectService, project_id: int, updates: dict) -> dict:
+    with service.storage.lock():
+        return service._update_project(project_id, updates, None)
+
+async def _writer(services, blocking: bool, worker: int, ops: int) -> None:
+    tasks, documents, projects, project_id = services
+    for i in range(ops):
+        task_data = {"name": f"Tarea {worker}-{i}", "description": "x" * 200}
+        research = {"query": f"Consulta {worker}-{i}", "summary": "texto " * 300}
+        updates = {"description": f"Revisión {worker}-{i}"}
+        if blocking:
+            await _blocking_create_task(tasks, task_data)
+            await _blocking_save_research(documents, research)
+            await _blocking_update_project(projects, project_id, updates)
+        else:
+            await tasks.create_task(task_data)
+            await documents.save_research(research)
+            await projects.update_project(project_id, updates)
+        await asyncio.sleep(0)
+
+async def _measure(blocking: bool, writers: int, ops: int, preload: int) -> None:
+    tasks, documents, projects = TaskService(), DocumentService(), ProjectService()
+    if preload:
+        await tasks.create_tasks([{"name": f"Previa {i}", "description": "x" * 200} for i in range(preload)])
+    project_id = (await projects.create_project({"name": "Benchmark"}))["id"]
+    services = (tasks, documents, projects, project_id)
+    lags = []
+    done = False
+
+    async def ticker() -> None:
+        while not done:
+            expected = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    ticking = asyncio.ensure_future(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(_writer(services, blocking, worker, ops) for worker in range(writers)))
+    elapsed = time.perf_counter() - start
+    done = True
+    await ticking
+
+    lags.sort()
+    percentile = lambda q: lags[min(len(lags) - 1, int(q * len(lags)))] * 1000
+    groups = "" if blocking else (f", {tasks.writes.stats['groups'] + documents.writes.stats['groups'] + projects.writes.stats['groups']:,}"
+                                  f" escrituras agrupadas")
+    label = "bloqueante" if blocking else "pool de E/S"
+    print(f"{label:<12} {writers * ops * 3 / elapsed:>8,.0f} ops/s  retraso p50 {percentile(0.5):6.2f} ms  "
+          f"p99 {percentile(0.99):7.2f} ms  máx {lags[-1] * 1000:7.2f} ms{groups}")
+
+def main(writers: int, ops: int, preload: int, backend: str) -> None:
+    os.environ["LUCIUS_STORAGE"] = backend
+    for blocking in (True, False):
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            asyncio.run(_measure(blocking, writers, ops, preload))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del retraso del bucle de eventos")
+    parser.add_argument('--writers', type=int, default=50)
+    parser.add_argument('--ops', type=int, default=20)
+    parser.add_argument('--preload', type=int, default=2000, help="tareas existentes antes de empezar")
+    parser.add_argument('--backend', default='json', choices=['json', 'journal', 'sqlite'])
+    args = parser.parse_args()
+    main(args.writers, args.ops, args.preload, args.backend)
@@ -0,0 +1,86 @@
+"""Benchmark del índice de trigramas para nombres de tareas y proyectos.
+
+Uso: python -m scripts.benchmark_fuzzy_index [--names 100000] [--queries 1000]
+
+Los nombres combinan verbos y calificativos habituales (trigramas muy
+frecuentes) con palabras generadas con la frecuencia de letras del español.
+Las consultas son nombres existentes con una palabra vacía añadida y una
+errata; también se mide la búsqueda exacta por nombre normalizado.
+"""
+import argparse
+import random
+import time
+from services.fuzzy_index import FuzzyIndex
+
+VERBS = ['Revisar', 'Preparar', 'Migrar', 'Diseñar', 'Documentar', 'Probar', 'Desplegar',
+         'Optimizar', 'Analizar', 'Actualizar', 'Configurar', 'Integrar', 'Auditar', 'Planificar']
+LETTERS = 'eaosrnidlctumpbgvyqhfzjñxkw'
+LETTER_WEIGHTS = [13.7, 12.5, 8.7, 7.9, 6.9, 6.7, 6.2, 5.9, 5.0, 4.7, 4.6, 3.9, 3.2, 2.5,
+                  1.4, 1.0, 0.9, 0.9, 0.9, 0.7, 0.7, 0.5, 0.4, 0.3, 0.2, 0.1, 0.1]
+QUALIFIERS = ['trimestral', 'de producción', 'del equipo', 'interno', 'v2', 'urgente', 'Q3',
+              'de ventas', 'mensual', 'legacy', 'nuevo', 'europeo']
+
+def _timed(label: str, func, count: int = 1):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    rate = f" ({count / elapsed:,.0f}/s)" if count > 1 else ""
+    print(f"{label:<40} {elapsed * 1000:>10.1f} ms{rate}")
+    return result
+
+def _make_names(count: int, rng: random.Random, vocabulary: int = 20000) -> list:
+    nouns = list({
+        ''.join(rng.choices(LETTERS, LETTER_WEIGHTS, k=rng.randint(4, 10)))
+        for _ in range(vocabulary)
+    })
+    return [
+        f"{rng.choice(VERBS)} {rng.choice(nouns)} {rng.choice(nouns)} {rng.choice(QUALIFIERS)}"
+        for _ in range(count)
+    ]
+
+def _misspell(name: str, rng: random.Random) -> str:
+    position = rng.randrange(len(name))
+    return f"el {name[:position]}{name[position + 1:]}"
+
+def main(name_count: int, query_count: int, threshold: float, seed: int) -> None:
+    rng = random.Random(seed)
+    names = _make_names(name_count, rng)
+    index = FuzzyIndex()
+    _timed(f"indexar {name_count:,} nombres", lambda: index.load(enumerate(names)), name_count)
+    print(f"trigramas distintos: {index.stats()['trigrams']:,}")
+
+    targets = rng.sample(range(name_count), query_count)
+    queries = [_misspell(names[i], rng) for i in targets]
+    latencies = []
+
+    def run_queries():
+        found = 0
+        for target, query in zip(targets, queries):
+            start = time.perf_counter()
+            matches = index.similar(query, limit=5, threshold=threshold)
+            latencies.append(time.perf_counter() - start)
+            found += any(record_id == target for record_id, _ in matches)
+        return found
+
+    found = _timed(f"{query_count:,} búsquedas aproximadas", run_queries, query_count)
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"latencia p50 {p50:.3f} ms, p99 {p99:.3f} ms; acierto {found / query_count:.1%}")
+
+    _timed(f"{query_count:,} búsquedas exactas", lambda: [
+        index.exact(names[i].upper()) for i in targets
+    ], query_count)
+
+    _timed("1,000 altas y bajas", lambda: [
+        (index.add(name_count + i, names[i]), index.remove(name_count + i)) for i in range(1000)
+    ], 1000)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del índice de trigramas")
+    parser.add_argument('--names', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--threshold', type=float, default=0.7)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    main(args.names, args.queries, args.threshold, args.seed)
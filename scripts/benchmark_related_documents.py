@@ -0,0 +1,61 @@
+"""Benchmark de get_related_documents con el índice MinHash/LSH.
+
+Uso: python -m scripts.benchmark_related_documents [--docs 100000] [--queries 200]
+
+Usa el mismo índice sintético que benchmark_document_search y, para varias
+combinaciones de bandas y filas, compara la búsqueda por LSH con la
+exhaustiva: tiempo por consulta, candidatos puntuados y proporción de los
+documentos relacionados que encuentra (recall).
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from services.document_service import DocumentService
+from services.minhash_index import MinHashIndex
+from scripts.benchmark_document_search import _populate, _timed
+
+CONFIGS = [(16, 2), (32, 2), (64, 2), (16, 3)]
+
+async def _run(service: DocumentService, targets: list) -> None:
+    start = time.perf_counter()
+    exact = {}
+    for doc_id in targets:
+        exact[doc_id] = {r.id for r in await service.get_related_documents(doc_id, limit=None, exhaustive=True)}
+    exhaustive_ms = (time.perf_counter() - start) / len(targets) * 1000
+    related = sum(map(len, exact.values())) / len(targets)
+    print(f"exhaustiva: {exhaustive_ms:.2f} ms/consulta, {related:,.0f} relacionados de media")
+
+    for bands, rows in CONFIGS:
+        service.related_index = MinHashIndex(bands, rows)
+        _timed(f"índice LSH {bands}x{rows}", service._build_search_indexes)
+        candidates = found = 0
+        start = time.perf_counter()
+        for doc_id in targets:
+            results = await service.get_related_documents(doc_id, limit=None)
+            found += len({r.id for r in results} & exact[doc_id])
+        elapsed_ms = (time.perf_counter() - start) / len(targets) * 1000
+        for doc_id in targets:
+            candidates += len(service.related_index.candidates(doc_id))
+        expected = sum(map(len, exact.values()))
+        print(f"  {elapsed_ms:8.2f} ms/consulta, {candidates / len(targets):9,.0f} candidatos, "
+              f"recall {found / expected if expected else 1:.1%}, umbral {service.related_index.threshold():.2f}")
+
+def main(doc_count: int, query_count: int, seed: int) -> None:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        service = DocumentService()
+        _timed(f"generar {doc_count:,} metadatos", lambda: _populate(service, doc_count, rng))
+        targets = rng.sample(list(service.document_index["documents"]), query_count)
+        asyncio.run(_run(service, targets))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de documentos relacionados")
+    parser.add_argument('--docs', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    main(args.docs, args.queries, args.seed)
@@ -0,0 +1,71 @@
+"""Compara el throughput de create/update de TaskService con JSON y SQLite.
+
+Uso: python -m scripts.benchmark_storage [--sizes 10000 100000 1000000] [--ops 20]
+
+Para cada tamaño se precarga la tienda con N tareas y luego se miden
+--ops llamadas a create_task y update_task a través de la API async.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+from services.record_storage import JSONRecordStorage, SQLiteRecordStorage
+from services.task_service import TaskService, INDEXED_FIELDS
+
+def _make_tasks(count: int):
+    now = datetime.now().isoformat()
+    return [{
+        'id': i,
+        'name': f'Tarea {i}',
+        'description': '',
+        'status': 'pending',
+        'priority': 'medium',
+        'created_at': now,
+        'updated_at': now,
+        'due_date': None,
+        'assignee': f'user{i % 50}',
+        'project_id': i % 500,
+        'dependencies': [],
+        'metadata': {}
+    } for i in range(1, count + 1)]
+
+def _build_storage(backend: str, directory: str, rows):
+    if backend == 'json':
+        storage = JSONRecordStorage(os.path.join(directory, 'tasks.json'))
+        storage._write(rows)
+    else:
+        storage = SQLiteRecordStorage(os.path.join(directory, 'lucius.db'), 'tasks', INDEXED_FIELDS)
+        storage.upsert_many(rows)
+    return storage
+
+async def _measure(service: TaskService, ops: int):
+    start = time.perf_counter()
+    created = [await service.create_task({'name': f'Nueva {i}'}) for i in range(ops)]
+    create_rate = ops / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for task in created:
+        await service.update_task(task['id'], {'status': 'in_progress'})
+    update_rate = ops / (time.perf_counter() - start)
+    return create_rate, update_rate
+
+async def main(sizes, ops):
+    print(f"{'filas':>10} {'backend':>8} {'create/s':>12} {'update/s':>12}")
+    for size in sizes:
+        rows = _make_tasks(size)
+        for backend in ('json', 'sqlite'):
+            with tempfile.TemporaryDirectory() as directory:
+                storage = _build_storage(backend, directory, rows)
+                service = TaskService(storage=storage)
+                create_rate, update_rate = await _measure(service, ops)
+                storage.close()
+            print(f"{size:>10} {backend:>8} {create_rate:>12.1f} {update_rate:>12.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de almacenamiento de tareas")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--ops', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.ops))
@@ -0,0 +1,103 @@
+"""Benchmark del índice invertido de documentos de investigación.
+
+Uso: python -m scripts.benchmark_text_index [--docs 100000] [--queries 1000]
+
+Cada documento tiene una consulta corta, un título y un resumen con
+palabras de un vocabulario con distribución de Zipf (unas pocas muy
+frecuentes, muchas raras). Las búsquedas toman dos o tres palabras de un
+documento existente, con la última recortada para probar los prefijos.
+
+Las palabras más frecuentes aparecen en casi todos los documentos, así que
+las consultas que solo llevan palabras de ese tipo puntúan decenas de miles
+de candidatos: son las que marcan el p90 y el p99.
+"""
+import argparse
+import random
+import time
+from services.text_index import TextIndex
+from services.document_service import TEXT_FIELD_WEIGHTS
+
+LETTERS = 'eaosrnidlctumpbgvyqhfzjñxkw'
+LETTER_WEIGHTS = [13.7, 12.5, 8.7, 7.9, 6.9, 6.7, 6.2, 5.9, 5.0, 4.7, 4.6, 3.9, 3.2, 2.5,
+                  1.4, 1.0, 0.9, 0.9, 0.9, 0.7, 0.7, 0.5, 0.4, 0.3, 0.2, 0.1, 0.1]
+
+def _timed(label: str, func, count: int = 1):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    rate = f" ({count / elapsed:,.0f}/s)" if count > 1 else ""
+    print(f"{label:<40} {elapsed * 1000:>10.1f} ms{rate}")
+    return result
+
+def _make_docs(count: int, rng: random.Random, vocabulary: int = 50000) -> list:
+    words = list({
+        ''.join(rng.choices(LETTERS, LETTER_WEIGHTS, k=rng.randint(4, 11)))
+        for _ in range(vocabulary)
+    })
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+
+    def text(length):
+        return ' '.join(rng.choices(words, weights, k=length))
+
+    return [{
+        'query': text(rng.randint(2, 5)),
+        'title': text(rng.randint(4, 10)),
+        'summary': text(rng.randint(30, 80))
+    } for _ in range(count)]
+
+def _make_query(doc: dict, rng: random.Random, prefix: bool = True) -> str:
+    words = rng.sample((doc['query'] + ' ' + doc['title']).split(), 2)
+    if rng.random() < 0.5:
+        words.append(rng.choice(doc['summary'].split()))
+    if prefix:
+        last = words[-1]
+        words[-1] = last[:max(3, len(last) - 2)]
+    return ' '.join(words)
+
+def main(doc_count: int, query_count: int, seed: int) -> None:
+    rng = random.Random(seed)
+    docs = _make_docs(doc_count, rng)
+    index = TextIndex(TEXT_FIELD_WEIGHTS)
+    _timed(f"indexar {doc_count:,} documentos", lambda: [
+        index.set_fields(i, doc) for i, doc in enumerate(docs)
+    ], doc_count)
+    print(f"términos distintos: {index.stats()['terms']:,}")
+
+    persisted = index.docs
+    _timed("reconstruir desde los términos guardados", lambda: TextIndex(TEXT_FIELD_WEIGHTS).load(persisted))
+
+    targets = rng.sample(range(doc_count), query_count)
+    prefix_queries = [_make_query(docs[i], rng) for i in targets]
+    word_queries = [_make_query(docs[i], rng, prefix=False) for i in targets]
+
+    for label, queries, prefix, limit in (("top 10, prefijo", prefix_queries, True, 10),
+                                          ("top 10, palabras", word_queries, False, 10),
+                                          ("todos, prefijo", prefix_queries, True, None)):
+        latencies = []
+
+        def run_queries():
+            found = 0
+            for target, query in zip(targets, queries):
+                start = time.perf_counter()
+                matches = index.search(query, limit=limit, prefix=prefix)
+                latencies.append(time.perf_counter() - start)
+                found += any(doc_id == target for doc_id, _ in matches)
+            return found
+
+        found = _timed(f"{query_count:,} búsquedas ({label})", run_queries, query_count)
+        latencies.sort()
+        p50, p90, p99 = (latencies[int(len(latencies) * q)] * 1000 for q in (0.5, 0.9, 0.99))
+        print(f"latencia p50 {p50:.3f} ms, p90 {p90:.3f} ms, p99 {p99:.3f} ms; "
+              f"documento de origen encontrado {found / query_count:.1%}")
+
+    _timed("1,000 altas y bajas", lambda: [
+        (index.set_fields(doc_count + i, docs[i]), index.remove(doc_count + i)) for i in range(1000)
+    ], 1000)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del índice invertido")
+    parser.add_argument('--docs', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    main(args.docs, args.queries, args.seed)
@@ -0,0 +1,207 @@
+"""Importación y reindexado masivo de documentos de investigación.
+
+Uso:
+  python -m scripts.ingest_research_documents ingest RUTA... [--workers 8] [--knowledge]
+  python -m scripts.ingest_research_documents reindex [--workers 8]
+
+`ingest` lee archivos .json (un resultado de investigación, una lista de
+ellos o un documento {"metadata", "content"} de versiones anteriores) y
+.jsonl (uno por línea), recorriendo los directorios. `reindex` vuelve a
+calcular el índice de texto de todos los documentos del pack.
+
+Un pool de procesos lee, analiza, calcula el hash, comprime y tokeniza
+los documentos por lotes; el proceso principal junta los resultados
+parciales y escribe el pack y el índice una sola vez, en lugar de
+reescribir el índice con cada save_research. Con --knowledge el
+contenido se envía también a KnowledgeService en lotes.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from services.document_service import DocumentService
+from services.pack_store import pack_blob, unpack_blob
+from services.text_index import field_terms, flatten_text
+
+def _timed(label: str, func, count: int = 1):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    rate = f" ({count / elapsed:,.0f}/s)" if count > 1 and elapsed else ""
+    print(f"{label:<40} {elapsed * 1000:>10.1f} ms{rate}")
+    return result
+
+def _find_files(paths: Iterable[str]) -> List[str]:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                found.extend(os.path.join(directory, name) for name in names
+                             if name.endswith(('.json', '.jsonl')) and not name.startswith('research_index'))
+        else:
+            found.append(path)
+    return sorted(found)
+
+def _records(path: str) -> Iterable[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        data = json.load(f)
+    yield from (data if isinstance(data, list) else [data])
+
+def _prepare(record: Dict[str, Any], with_text: bool) -> Dict[str, Any]:
+    """Everything the index needs about one record, computed in a worker"""
+    if isinstance(record.get("content"), dict) and isinstance(record.get("metadata"), dict):
+        metadata, content = dict(record["metadata"]), record["content"]
+    else:
+        metadata, content = {}, record
+    metadata.setdefault("query", content.get("query", ""))
+    metadata.setdefault("topics", [])
+    metadata.setdefault("tags", [])
+    metadata.setdefault("type", "research")
+    prepared = {
+        "metadata": metadata,
+        "terms": field_terms(DocumentService._text_fields(metadata, content)),
+        "blob": pack_blob(DocumentService._encode_content(content)),
+        # Same hash as DocumentService._generate_id
+        "id_hash": hashlib.md5(str(content).encode()).hexdigest()[:8]
+    }
+    if with_text:
+        prepared["text"] = flatten_text(content)
+    return prepared
+
+def _prepare_files(paths: List[str], with_text: bool) -> Tuple[List[Dict[str, Any]], List[str], int]:
+    """Worker: prepared documents, errors and bytes read for a chunk of files"""
+    prepared, errors, size = [], [], 0
+    for path in paths:
+        try:
+            size += os.path.getsize(path)
+            prepared.extend(_prepare(record, with_text) for record in _records(path))
+        except (OSError, ValueError, AttributeError) as e:
+            errors.append(f"{path}: {e}")
+    return prepared, errors, size
+
+def _reindex_chunk(items: List[Tuple[str, Dict[str, Any], int, bytes]]) -> Dict[str, Dict[str, Dict[str, int]]]:
+    """Worker: text index terms of (doc id, metadata, codec, compressed content) items"""
+    return {
+        doc_id: field_terms(DocumentService._text_fields(metadata, json.loads(unpack_blob(codec, compressed))))
+        for doc_id, metadata, codec, compressed in items
+    }
+
+def _chunks(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _assign_ids(service: DocumentService, prepared: List[Dict[str, Any]],
+                keep_duplicates: bool) -> Tuple[List[Dict[str, Any]], int]:
+    """Give new documents an id and timestamp and drop content already stored"""
+    taken = set(service.document_index["documents"])
+    seen = set(service.document_index["blobs"].values())
+    start = datetime.now()
+    accepted, duplicates = [], 0
+    for document in prepared:
+        digest = document["blob"][0]
+        if digest in seen and not keep_duplicates:
+            duplicates += 1
+            continue
+        seen.add(digest)
+        metadata = document["metadata"]
+        if "timestamp" not in metadata or metadata.get("id", "") in taken or "id" not in metadata:
+            # One microsecond apart: unique, chronological ids in input order
+            timestamp = (start + timedelta(microseconds=len(accepted))).isoformat()
+            metadata["timestamp"] = timestamp
+            metadata["id"] = f"doc_{timestamp}_{document['id_hash']}"
+        taken.add(metadata["id"])
+        accepted.append(document)
+    return accepted, duplicates
+
+async def _push_knowledge(documents: List[Dict[str, Any]], batch_size: int) -> None:
+    # Imported here: sentence-transformers and faiss are only needed with --knowledge
+    from services.knowledge_service import KnowledgeService
+    knowledge = KnowledgeService()
+    items = [{"content": document["text"], "source": "research", "doc_id": document["metadata"]["id"],
+              "metadata": {"query": document["metadata"]["query"]}}
+             for document in documents if document.get("text")]
+    for batch in _chunks(items, batch_size):
+        await knowledge.add_knowledge_batch(batch)
+
+def ingest(paths: List[str], workers: Optional[int], chunk_size: int,
+           keep_duplicates: bool, knowledge: bool, knowledge_batch: int) -> None:
+    start = time.perf_counter()
+    files = _find_files(paths)
+    service = _timed("cargar índice", DocumentService)
+
+    prepared, errors, size = [], [], 0
+    parse_start = time.perf_counter()
+    chunks = _chunks(files, chunk_size)
+    with ProcessPoolExecutor(workers) as pool:
+        for chunk_prepared, chunk_errors, chunk_size_read in pool.map(
+                _prepare_files, chunks, [knowledge] * len(chunks)):
+            prepared.extend(chunk_prepared)
+            errors.extend(chunk_errors)
+            size += chunk_size_read
+    elapsed = time.perf_counter() - parse_start
+    print(f"{'analizar y comprimir (' + str(workers or os.cpu_count()) + ' procesos)':<40} {elapsed * 1000:>10.1f} ms "
+          f"({len(files) / elapsed:,.0f} archivos/s, {size / elapsed / 1e6:,.1f} MB/s)")
+
+    documents, duplicates = _assign_ids(service, prepared, keep_duplicates)
+    _timed("escribir pack e índice", lambda: service.import_documents(documents), len(documents))
+    if knowledge:
+        _timed("enviar a KnowledgeService", lambda: asyncio.run(_push_knowledge(documents, knowledge_batch)),
+               len(documents))
+
+    for error in errors:
+        print(f"⚠️  {error}")
+    elapsed = time.perf_counter() - start
+    print(f"✅ {len(documents):,} documentos importados de {len(files):,} archivos "
+          f"({duplicates:,} duplicados omitidos, {len(errors)} errores) en {elapsed:.2f} s: "
+          f"{len(documents) / elapsed:,.0f} documentos/s")
+
+def reindex(workers: Optional[int], chunk_size: int) -> None:
+    start = time.perf_counter()
+    service = _timed("cargar índice", DocumentService)
+    blobs = service.document_index["blobs"]
+    items = []
+    for doc_id, metadata in service.document_index["documents"].items():
+        packed = service.packs.get_packed(blobs.get(doc_id, ""))
+        if packed is not None:
+            items.append((doc_id, metadata, *packed))
+
+    terms = {}
+    parse_start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        for partial_terms in pool.map(_reindex_chunk, _chunks(items, chunk_size)):
+            terms.update(partial_terms)
+    elapsed = time.perf_counter() - parse_start
+    print(f"{'tokenizar (' + str(workers or os.cpu_count()) + ' procesos)':<40} {elapsed * 1000:>10.1f} ms "
+          f"({len(items) / elapsed if elapsed else 0:,.0f} documentos/s)")
+
+    _timed("escribir índice", lambda: service.replace_terms(terms), len(items))
+    elapsed = time.perf_counter() - start
+    print(f"✅ {len(items):,} documentos reindexados en {elapsed:.2f} s: {len(items) / elapsed:,.0f} documentos/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importación y reindexado masivo de documentos de investigación")
+    parser.add_argument('--workers', type=int, default=None, help="procesos (por defecto, uno por CPU)")
+    parser.add_argument('--chunk-size', type=int, default=64, help="archivos o documentos por lote de trabajo")
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = commands.add_parser('ingest', help="importar archivos .json/.jsonl")
+    ingest_parser.add_argument('paths', nargs='+')
+    ingest_parser.add_argument('--keep-duplicates', action='store_true',
+                               help="importar también contenido que ya está en el corpus")
+    ingest_parser.add_argument('--knowledge', action='store_true', help="enviar el contenido a KnowledgeService")
+    ingest_parser.add_argument('--knowledge-batch', type=int, default=256)
+    commands.add_parser('reindex', help="recalcular el índice de texto de todos los documentos")
+    args = parser.parse_args()
+    if args.command == 'ingest':
+        ingest(args.paths, args.workers, args.chunk_size, args.keep_duplicates,
+               args.knowledge, args.knowledge_batch)
+    else:
+        reindex(args.workers, args.chunk_size)
@@ -0,0 +1,25 @@
+"""Migra data/tasks.json y data/projects.json a la base SQLite.
+
+Uso: python -m scripts.migrate_to_sqlite [--db data/lucius.db]
+"""
+import argparse
+from services.record_storage import SQLiteRecordStorage
+from services import task_service, project_service
+
+def migrate(db_path: str) -> None:
+    stores = [
+        ('tasks', 'data/tasks.json', task_service.INDEXED_FIELDS),
+        ('projects', 'data/projects.json', project_service.INDEXED_FIELDS),
+    ]
+    for table, json_path, fields in stores:
+        storage = SQLiteRecordStorage(db_path, table, fields)
+        count = storage.migrate_from_json(json_path)
+        print(f"✅ {count} registros migrados de {json_path} a {db_path}:{table}")
+        storage.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrar almacenamiento JSON a SQLite")
+    parser.add_argument('--db', default='data/lucius.db')
+    args = parser.parse_args()
+    migrate(args.db)
+    print("Usa LUCIUS_STORAGE=sqlite para activar el backend SQLite.")
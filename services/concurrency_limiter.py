@@ -0,0 +1,113 @@
+from typing import Dict, Any, Optional
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import threading
+import time
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a request arrives while the in-flight limit is reached"""
+
+
+class AdaptiveConcurrencyLimiter:
+    """In-flight request limit adjusted by AIMD from observed latency.
+
+    The limit grows by `additive_increase / limit` per successful request
+    (about +additive_increase per round of `limit` requests) while the p95
+    latency of recent requests stays under the SLO. Timeouts and errors
+    shrink it multiplicatively, at most once per SLO period so that one
+    burst of failures counts as a single congestion signal.
+    """
+
+    def __init__(self,
+                 name: str,
+                 initial_limit: float = 10,
+                 min_limit: float = 1,
+                 max_limit: float = 200,
+                 latency_slo_ms: float = 5000,
+                 additive_increase: float = 1.0,
+                 backoff_ratio: float = 0.5,
+                 window_size: int = 100):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.latency_slo_ns = int(latency_slo_ms * 1_000_000)
+        self.additive_increase = additive_increase
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self.latencies = deque(maxlen=window_size)
+        self.stats = {'accepted': 0, 'rejected': 0, 'successes': 0, 'errors': 0, 'timeouts': 0}
+        self._last_backoff_ns = 0
+        # Flask handlers run an event loop per request thread, so guard the counters
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """Take an in-flight slot if the current limit allows it"""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                self.stats['rejected'] += 1
+                return False
+            self.in_flight += 1
+            self.stats['accepted'] += 1
+            return True
+
+    def release(self, latency_ns: int, outcome: str = 'success') -> None:
+        """Return a slot and adjust the limit from the request outcome"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.perf_counter_ns()
+
+            if outcome in ('error', 'timeout'):
+                self.stats['errors' if outcome == 'error' else 'timeouts'] += 1
+                if now - self._last_backoff_ns >= self.latency_slo_ns:
+                    self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+                    self._last_backoff_ns = now
+                return
+
+            self.stats['successes'] += 1
+            self.latencies.append(latency_ns)
+            p95 = self.p95_latency_ns()
+            if p95 is not None and p95 <= self.latency_slo_ns:
+                self.limit = min(self.max_limit, self.limit + self.additive_increase / self.limit)
+
+    def p95_latency_ns(self) -> Optional[int]:
+        """p95 of the latencies in the sliding window"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the duration of the block.
+
+        Raises ConcurrencyLimitExceeded when no slot is free. The outcome
+        is taken from the exception leaving the block, if any.
+        """
+        if not self.try_acquire():
+            raise ConcurrencyLimitExceeded(f"{self.name}: in-flight limit {int(self.limit)} reached")
+        start = time.perf_counter_ns()
+        outcome = 'success'
+        try:
+            yield self
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            raise
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            self.release(time.perf_counter_ns() - start, outcome)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limiter state for metrics export"""
+        p95 = self.p95_latency_ns()
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'p95_latency_ms': p95 / 1_000_000 if p95 is not None else None,
+            'latency_slo_ms': self.latency_slo_ns / 1_000_000,
+            **self.stats
+        }
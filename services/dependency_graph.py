@@ -0,0 +1,175 @@
+from typing import Dict, Any, List, Optional, Set, Iterable, Callable, Hashable
+from collections import deque
+
+
+class DependencyCycleError(ValueError):
+    """Raised when a new dependency would make the graph cyclic"""
+
+
+class DependencyGraph:
+    """Task dependency DAG with an incrementally maintained topological order.
+
+    An edge dependency -> task means the dependency has to finish first.
+    Every node has a position in a topological order; inserting an edge
+    that already agrees with the order costs O(1). Otherwise only the nodes
+    whose positions lie between the two endpoints are searched and
+    re-numbered (Pearce-Kelly), which also detects cycles.
+    """
+
+    def __init__(self):
+        self.prerequisites: Dict[Hashable, Set[Hashable]] = {}
+        self.dependents: Dict[Hashable, Set[Hashable]] = {}
+        self.order: Dict[Hashable, int] = {}
+        self._next_position = 0
+
+    def __contains__(self, node: Hashable) -> bool:
+        return node in self.order
+
+    def add_node(self, node: Hashable) -> None:
+        if node in self.order:
+            return
+        self.prerequisites[node] = set()
+        self.dependents[node] = set()
+        self.order[node] = self._next_position
+        self._next_position += 1
+
+    def remove_node(self, node: Hashable) -> None:
+        if node not in self.order:
+            return
+        for prerequisite in self.prerequisites.pop(node):
+            self.dependents[prerequisite].discard(node)
+        for dependent in self.dependents.pop(node):
+            self.prerequisites[dependent].discard(node)
+        del self.order[node]
+
+    def add_edge(self, task: Hashable, dependency: Hashable) -> bool:
+        """Make task depend on dependency; returns False if the edge already existed"""
+        self.add_node(task)
+        self.add_node(dependency)
+        if dependency in self.prerequisites[task]:
+            return False
+        if task == dependency:
+            raise DependencyCycleError(f"Task {task} cannot depend on itself")
+
+        lower, upper = self.order[task], self.order[dependency]
+        if upper > lower:
+            # The dependency is currently ordered after the task: repair the
+            # order inside the affected window, or fail if that is impossible
+            forward = self._search(task, self.dependents, lambda n: self.order[n] <= upper, dependency)
+            backward = self._search(dependency, self.prerequisites, lambda n: self.order[n] >= lower)
+            self._reorder(backward, forward)
+
+        self.prerequisites[task].add(dependency)
+        self.dependents[dependency].add(task)
+        return True
+
+    def remove_edge(self, task: Hashable, dependency: Hashable) -> None:
+        if task in self.prerequisites:
+            self.prerequisites[task].discard(dependency)
+        if dependency in self.dependents:
+            self.dependents[dependency].discard(task)
+
+    def _search(self, start: Hashable, edges: Dict[Hashable, Set[Hashable]],
+                in_window: Callable[[Hashable], bool],
+                cycle_target: Optional[Hashable] = None) -> List[Hashable]:
+        """Nodes reachable from start through edges, restricted to the window"""
+        seen = {start}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for neighbour in edges[node]:
+                if neighbour == cycle_target:
+                    raise DependencyCycleError(
+                        f"Dependency {cycle_target} already depends on task {start}")
+                if neighbour not in seen and in_window(neighbour):
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        return list(seen)
+
+    def _reorder(self, backward: List[Hashable], forward: List[Hashable]) -> None:
+        """Give the backward set the lowest freed positions, then the forward set"""
+        backward.sort(key=self.order.__getitem__)
+        forward.sort(key=self.order.__getitem__)
+        positions = sorted(self.order[node] for node in backward + forward)
+        for node, position in zip(backward + forward, positions):
+            self.order[node] = position
+
+    def load(self, edges: Iterable[tuple]) -> List[tuple]:
+        """Insert (task, dependency) pairs, returning the ones rejected as cyclic"""
+        rejected = []
+        for task, dependency in edges:
+            try:
+                self.add_edge(task, dependency)
+            except DependencyCycleError:
+                rejected.append((task, dependency))
+        return rejected
+
+    def _walk(self, start: Hashable, edges: Dict[Hashable, Set[Hashable]]) -> Set[Hashable]:
+        if start not in edges:
+            return set()
+        seen: Set[Hashable] = set()
+        queue = deque(edges[start])
+        while queue:
+            node = queue.popleft()
+            if node not in seen:
+                seen.add(node)
+                queue.extend(edges[node] - seen)
+        return seen
+
+    def transitive_dependencies(self, task: Hashable) -> Set[Hashable]:
+        """Everything the task waits on, directly or indirectly"""
+        return self._walk(task, self.prerequisites)
+
+    def transitive_dependents(self, task: Hashable) -> Set[Hashable]:
+        """Everything that waits on the task, directly or indirectly"""
+        return self._walk(task, self.dependents)
+
+    def topological_order(self, nodes: Optional[Iterable[Hashable]] = None) -> List[Hashable]:
+        """Nodes (all, or the given subset) with every dependency before its dependents"""
+        if nodes is None:
+            nodes = self.order
+        return sorted((node for node in nodes if node in self.order), key=self.order.__getitem__)
+
+    def critical_path(self, nodes: Iterable[Hashable],
+                      duration: Callable[[Hashable], float]) -> Dict[str, Any]:
+        """Critical path and per-node slack over the subgraph induced by nodes.
+
+        Runs one forward and one backward pass in topological order, so it
+        is O(V + E) for the subgraph.
+        """
+        ordered = self.topological_order(nodes)
+        members = set(ordered)
+        durations = {node: duration(node) for node in ordered}
+        earliest_start: Dict[Hashable, float] = {}
+        earliest_finish: Dict[Hashable, float] = {}
+        for node in ordered:
+            start = max((earliest_finish[p] for p in self.prerequisites[node] if p in members), default=0.0)
+            earliest_start[node] = start
+            earliest_finish[node] = start + durations[node]
+
+        length = max(earliest_finish.values(), default=0.0)
+        latest_start: Dict[Hashable, float] = {}
+        for node in reversed(ordered):
+            finish = min((latest_start[d] for d in self.dependents[node] if d in members), default=length)
+            latest_start[node] = finish - durations[node]
+
+        slack = {node: latest_start[node] - earliest_start[node] for node in ordered}
+
+        # Walk back from the last critical node through critical prerequisites
+        path: List[Hashable] = []
+        current = next((node for node in reversed(ordered)
+                        if earliest_finish[node] == length and abs(slack[node]) < 1e-9), None)
+        while current is not None:
+            path.append(current)
+            current = next((p for p in self.prerequisites[current]
+                            if p in members and abs(slack[p]) < 1e-9
+                            and earliest_finish[p] == earliest_start[current]), None)
+        path.reverse()
+
+        return {
+            'length': length,
+            'path': path,
+            'earliest_start': earliest_start,
+            'latest_start': latest_start,
+            'slack': slack
+        }
@@ -1,32 +1,421 @@
 import os
 from typing import List, Dict, Any, Optional
+import asyncio
 import json
 from datetime import datetime
+from functools import partial
 import hashlib
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
 from pathlib import Path
+from services.text_index import TextIndex, flatten_text
+from services.minhash_index import MinHashIndex
+from services.record_storage import JournalRecordStorage
+from services.pack_store import PackStore
+from services.lru_cache import ByteLRUCache
+from services.text_delta import make_delta, apply_delta
+from services.io_pool import get_io_pool, Records, WriteBatcher
+
+# Searchable text of a research document; words in the query, title,
+# topics and tags weigh more than words in the body
+TEXT_FIELD_WEIGHTS = {
+    "query": 3.0,
+    "title": 2.0,
+    "topics": 2.0,
+    "tags": 2.0,
+    "summary": 1.0,
+    "findings": 1.0,
+    "content": 1.0
+}
+CONTENT_TEXT_FIELDS = ("title", "summary", "findings", "content")
+
+class DocumentResult:
+    """Search hit built from the index metadata alone.
+
+    The document content is only read by `load()` (or by passing
+    include_content=True to the search), so listing a page of results
+    costs no disk reads.
+    """
+
+    __slots__ = ('metadata', 'similarity', 'score', '_service', '_document')
+
+    def __init__(self, service: 'DocumentService', metadata: Dict[str, Any],
+                 similarity: Optional[float] = None, score: Optional[float] = None):
+        self._service = service
+        self.metadata = metadata
+        self.similarity = similarity
+        # BM25 relevance when the search had a text query
+        self.score = score
+        self._document: Optional[Dict[str, Any]] = None
+
+    @property
+    def id(self) -> str:
+        return self.metadata["id"]
+
+    @property
+    def loaded(self) -> bool:
+        return self._document is not None
+
+    @property
+    def content(self) -> Optional[Dict[str, Any]]:
+        """Document content, or None until load() has been awaited"""
+        return self._document["content"] if self._document else None
+
+    async def load(self) -> Optional[Dict[str, Any]]:
+        """Read the full document (once) and return it"""
+        if self._document is None:
+            self._document = await self._service.get_document(self.id)
+        return self._document
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {"metadata": self.metadata}
+        if self._document is not None:
+            result["content"] = self._document["content"]
+        if self.similarity is not None:
+            result["similarity"] = self.similarity
+        if self.score is not None:
+            result["score"] = self.score
+        return result
+
+    def __repr__(self) -> str:
+        return f"DocumentResult({self.id!r})"
+
+
+class _IndexRecords:
+    """The document index as storage records, one per document"""
+
+    def __init__(self, service: 'DocumentService'):
+        self.service = service
+
+    def values(self) -> List[Dict[str, Any]]:
+        return [self.service._record(doc_id) for doc_id in self.service.document_index["documents"]]
+
 
 class DocumentService:
+    # Longest posting list, relative to the current candidates, that the
+    # planner intersects instead of checking on each candidate
+    INTERSECT_RATIO = 8
+    # LSH banding for get_related_documents: more bands or fewer rows find
+    # more of the related documents but re-rank more candidates
+    LSH_BANDS = 32
+    LSH_ROWS = 2
+    # Index log entries appended before they are folded into the snapshot
+    COMPACT_EVERY = 1000
+    # The pack is rewritten once blobs no document uses take up more than
+    # this share of it (and at least PACK_COMPACT_MIN_BYTES)
+    PACK_COMPACT_RATIO = 0.5
+    PACK_COMPACT_MIN_BYTES = 1 << 20
+    # Decoded documents kept by get_document, by their size as JSON
+    CACHE_BYTES = 64 << 20
+    # Earlier versions of a document are stored as deltas against the next
+    # one, except every VERSION_KEYFRAME_EVERY-th, kept whole so rebuilding
+    # any version applies fewer deltas than that
+    VERSION_KEYFRAME_EVERY = 10
+
     def __init__(self):
         self.base_path = Path("research_documents")
         self.base_path.mkdir(exist_ok=True)
+        # Single-file index of earlier versions, migrated on first start
         self.index_file = self.base_path / "research_index.json"
-        self.document_index = self._load_index()
+        # One record per document (metadata and indexed terms) in a snapshot
+        # plus an append-only log of changes
+        self.storage = JournalRecordStorage(str(self.base_path / "research_index.snapshot.json"),
+                                            compact_every=self.COMPACT_EVERY)
+        # Index changes run on the event loop, pack and index writes on I/O
+        # threads, after the changes of other processes are applied
+        self.io = get_io_pool()
+        self.writes = WriteBatcher(self.io, self.storage.lock, self._flush_index,
+                                   load_if_stale=self._read_changes, apply=self._apply_changes,
+                                   key=lambda doc_id: doc_id)
+        # Contents of new documents, written to the pack with the next index write
+        self._unwritten: Dict[str, bytes] = {}
+        # Whether the next index write also compacts the pack
+        self._compact_pending = False
+        # Document contents, compressed and stored once per distinct content
+        self.packs = PackStore(str(self.base_path / "documents.pack"))
+        self.cache = ByteLRUCache("documents", self.CACHE_BYTES)
+        self.text_index = TextIndex(TEXT_FIELD_WEIGHTS)
+        self.related_index = MinHashIndex(self.LSH_BANDS, self.LSH_ROWS)
+        legacy = self.index_file.exists() and not os.path.exists(self.storage.path)
+        self.document_index = self._load_legacy_index() if legacy else self._load_index()
+        if "terms" not in self.document_index:
+            self._backfill_terms()
+        self.text_index.load(self.document_index["terms"])
+        self.document_index.setdefault("blobs", {})
+        self.document_index.setdefault("versions", {})
+        self._build_search_indexes()
+        self._count_blob_refs()
+        if legacy:
+            self._migrate_legacy_index()
+        self._migrate_document_files()
 
     def _load_index(self) -> Dict[str, Any]:
-        """Load the document index from file"""
-        if self.index_file.exists():
-            with open(self.index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {
+        """Load the document index from the snapshot and its log"""
+        with self.storage.lock():
+            return self._index_from_records(self.storage.load())
+
+    @staticmethod
+    def _index_from_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        index = {
             "documents": {},
             "topics": {},
-            "tags": {}
+            "tags": {},
+            "terms": {},
+            "blobs": {},
+            "versions": {}
         }
+        for record in records:
+            index["documents"][record["id"]] = record["metadata"]
+            index["terms"][record["id"]] = record["terms"]
+            if record.get("blob"):
+                index["blobs"][record["id"]] = record["blob"]
+            if record.get("versions"):
+                index["versions"][record["id"]] = record["versions"]
+        return index
+
+    def _load_legacy_index(self) -> Dict[str, Any]:
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _migrate_legacy_index(self) -> None:
+        """Write the single-file index of earlier versions as the snapshot,
+        unless a worker starting at the same time already did"""
+        with self.storage.lock():
+            if os.path.exists(self.storage.path):
+                self._apply_changes({"records": self.storage.load()})
+                return
+            self.storage.compact(_IndexRecords(self))
+            os.replace(self.index_file, f"{self.index_file}.bak")
+
+    def _unmigrated_files(self) -> List[str]:
+        blobs = self.document_index["blobs"]
+        return [doc_id for doc_id in self.document_index["documents"]
+                if doc_id not in blobs and (self.base_path / f"{doc_id}.json").exists()]
+
+    def _migrate_document_files(self) -> None:
+        """Move the per-document JSON files of earlier versions into the pack"""
+        if not self._unmigrated_files():
+            return
+        migrated = []
+        with self.storage.lock():
+            self._refresh()
+            for doc_id in self._unmigrated_files():
+                doc_path = self.base_path / f"{doc_id}.json"
+                with open(doc_path, 'r', encoding='utf-8') as f:
+                    content = json.load(f).get("content") or {}
+                digest = self.packs.put(self._encode_content(content))
+                self.document_index["blobs"][doc_id] = digest
+                self._ref_blob(digest)
+                migrated.append(doc_path)
+            # The files go only once the index points at their blobs
+            self._compact_index()
+        for doc_path in migrated:
+            doc_path.unlink()
+
+    def _read_changes(self) -> Records:
+        """Index changes other processes wrote since the last load (see
+        storage.read_changes), with the pack index reloaded when there are
+        some so their blobs can be read"""
+        changes = self.storage.read_changes()
+        if changes is not None:
+            self.packs.refresh()
+        return changes
+
+    def _refresh(self) -> None:
+        """Apply the index changes of other processes, if any, in the
+        calling thread. The lock is re-entrant, so callers holding it
+        refresh; coroutines await writes.refresh() instead, which reads the
+        changes on an I/O thread."""
+        self.writes.refresh_sync()
+
+    def _apply_changes(self, changes: Dict[str, Any]) -> None:
+        """Apply what storage.read_changes returned: every record (a full
+        reload, rebuilding every index) or the documents other processes
+        changed and deleted"""
+        if "records" in changes:
+            self.document_index = self._index_from_records(changes["records"])
+            self.text_index.load(self.document_index["terms"])
+            self._build_search_indexes()
+            self._count_blob_refs()
+            self.cache.clear()
+            return
+        for doc_id in changes["deleted"]:
+            if doc_id in self.document_index["documents"]:
+                self._unindex_document(doc_id)
+        for record in changes["changed"]:
+            if record["id"] in self.document_index["documents"]:
+                self._unindex_document(record["id"])
+            self._index_document(record)
+
+    def _count_blob_refs(self) -> None:
+        """Count the documents and versions using each blob and the pack
+        bytes none of them uses"""
+        self._blob_refs = Counter(self.document_index["blobs"].values())
+        self._blob_refs.update(version["blob"] for versions in self.document_index["versions"].values()
+                               for version in versions)
+        live_bytes = sum(self.packs.stored_size(digest) for digest in self._blob_refs)
+        self._dead_bytes = self.packs.size - live_bytes
+
+    @staticmethod
+    def _encode_content(content: Dict[str, Any]) -> bytes:
+        """Canonical bytes of a document's content, so equal contents share a blob"""
+        return json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def _ref_blob(self, digest: str) -> None:
+        self._blob_refs[digest] += 1
+        if self._blob_refs[digest] == 1:
+            # A blob counted as dead is live again
+            self._dead_bytes = max(0, self._dead_bytes - self.packs.stored_size(digest))
 
-    def _save_index(self) -> None:
-        """Save the document index to file"""
-        with open(self.index_file, 'w', encoding='utf-8') as f:
-            json.dump(self.document_index, f, indent=2, ensure_ascii=False)
+    def _unref_blob(self, digest: str) -> None:
+        self._blob_refs[digest] -= 1
+        if self._blob_refs[digest] > 0:
+            return
+        del self._blob_refs[digest]
+        self._dead_bytes += self.packs.stored_size(digest)
+
+    def _release_blob(self, doc_id: str) -> None:
+        """Drop the blob references of a document and its earlier versions;
+        the next index write compacts the pack when it is mostly unused"""
+        self._release_versions(doc_id)
+        digest = self.document_index["blobs"].pop(doc_id, None)
+        if digest is None:
+            return
+        self._unref_blob(digest)
+        self._check_dead_bytes()
+
+    def _release_versions(self, doc_id: str) -> None:
+        """Drop the earlier versions of a document"""
+        for version in self.document_index["versions"].pop(doc_id, []):
+            self._unref_blob(version["blob"])
+            self.cache.invalidate((doc_id, version["version"]))
+
+    def _check_dead_bytes(self) -> None:
+        if (self._dead_bytes >= self.PACK_COMPACT_MIN_BYTES
+                and self._dead_bytes > self.PACK_COMPACT_RATIO * self.packs.size):
+            self._compact_pending = True
+            self._dead_bytes = 0
+
+    @staticmethod
+    def _text_fields(metadata: Dict[str, Any], content: Dict[str, Any]) -> Dict[str, str]:
+        """Text of each indexed field of a document"""
+        fields = {field: flatten_text(content.get(field)) for field in CONTENT_TEXT_FIELDS}
+        fields["query"] = metadata.get("query", "")
+        fields["topics"] = " ".join(metadata.get("topics", []))
+        fields["tags"] = " ".join(metadata.get("tags", []))
+        return fields
+
+    def _backfill_terms(self) -> None:
+        """Build the text index of an index file written before it existed"""
+        self.document_index["terms"] = {}
+        self.text_index.load(self.document_index["terms"])
+        for doc_id, metadata in self.document_index["documents"].items():
+            doc_path = self.base_path / f"{doc_id}.json"
+            content = {}
+            if doc_path.exists():
+                with open(doc_path, 'r', encoding='utf-8') as f:
+                    content = json.load(f).get("content") or {}
+            self.text_index.set_fields(doc_id, self._text_fields(metadata, content))
+
+    def _build_search_indexes(self) -> None:
+        """Build the topic and tag posting lists and the date and
+        related-document indexes from the documents' metadata.
+
+        Document ids start with their creation time, so id order is
+        chronological and every posting list, like the date index, yields
+        documents oldest first.
+        """
+        documents = self.document_index["documents"]
+        for section in ("topics", "tags"):
+            postings = self.document_index[section] = {}
+            for doc_id in sorted(documents):
+                for value in documents[doc_id][section]:
+                    postings.setdefault(value, []).append(doc_id)
+        # (timestamp, doc id) pairs, sorted, for date ranges by bisect
+        self.date_index = sorted(
+            (metadata["timestamp"], doc_id)
+            for doc_id, metadata in self.document_index["documents"].items()
+        )
+        self.related_index.load(
+            (doc_id, self._related_tokens(metadata))
+            for doc_id, metadata in self.document_index["documents"].items()
+        )
+
+    @staticmethod
+    def _related_tokens(metadata: Dict[str, Any]) -> List[str]:
+        """Topics and tags of a document as one set for the MinHash index.
+
+        Topics go in twice, so the set's Jaccard similarity leans towards
+        topics like the 0.7 / 0.3 weighting of get_related_documents.
+        """
+        return ([f"t:{topic}:{copy}" for topic in metadata["topics"] for copy in (0, 1)]
+                + [f"g:{tag}" for tag in metadata["tags"]])
+
+    def _post(self, section: str, key: str, doc_id: str) -> None:
+        doc_ids = self.document_index[section].setdefault(key, [])
+        position = bisect_left(doc_ids, doc_id)
+        if position == len(doc_ids) or doc_ids[position] != doc_id:
+            doc_ids.insert(position, doc_id)
+
+    def _unpost(self, section: str, key: str, doc_id: str) -> None:
+        doc_ids = self.document_index[section].get(key)
+        if doc_ids is None:
+            return
+        position = bisect_left(doc_ids, doc_id)
+        if position < len(doc_ids) and doc_ids[position] == doc_id:
+            del doc_ids[position]
+        if not doc_ids:
+            del self.document_index[section][key]
+
+    def _record(self, doc_id: str) -> Dict[str, Any]:
+        record = {
+            "id": doc_id,
+            "metadata": self.document_index["documents"][doc_id],
+            "terms": self.document_index["terms"].get(doc_id, {}),
+            "blob": self.document_index["blobs"].get(doc_id)
+        }
+        if doc_id in self.document_index["versions"]:
+            record["versions"] = self.document_index["versions"][doc_id]
+        return record
+
+    def _save_index(self, changed: List[str] = (), deleted: List[str] = ()) -> None:
+        """Append the changed and deleted documents to the index log (with
+        the rest of the write group, if any)"""
+        if self.writes.active:
+            self.writes.stage(changed, deleted)
+        else:
+            with self.storage.lock():
+                self._flush_index(changed, deleted)
+
+    def _flush_index(self, changed: List[str], deleted: List[str]) -> None:
+        # Contents first, so the index never points at a missing blob
+        if self._unwritten:
+            self.packs.put_many(list(self._unwritten.values()))
+            self._unwritten = {}
+        self.storage.save(_IndexRecords(self), [self._record(doc_id) for doc_id in changed], deleted)
+        if self._compact_pending:
+            self._compact_pending = False
+            self.packs.compact(self._referenced_blobs())
+
+    def _referenced_blobs(self) -> List[str]:
+        """Blobs the index refers to, as documents or earlier versions.
+
+        Called with the lock held after the changes of other processes
+        were applied, so this is the shared index and the pack keeps the
+        blobs of every worker's documents.
+        """
+        referenced = list(self.document_index["blobs"].values())
+        referenced.extend(version["blob"] for versions in self.document_index["versions"].values()
+                          for version in versions)
+        return referenced
+
+    def _compact_index(self) -> None:
+        """Write the whole index as a new snapshot and clear the log.
+
+        Callers hold the lock and applied the changes of other processes
+        (see _refresh) before changing the index, or theirs would be lost.
+        """
+        self.storage.compact(_IndexRecords(self))
 
     def _generate_id(self, content: str) -> str:
         """Generate a unique ID for a document"""
@@ -49,158 +438,527 @@ class DocumentService:
             "type": "research"
         }
         
-        # Save document content
-        doc_path = self.base_path / f"{doc_id}.json"
-        document = {
-            "metadata": metadata,
-            "content": research_data
-        }
-        
-        with open(doc_path, 'w', encoding='utf-8') as f:
-            json.dump(document, f, indent=2, ensure_ascii=False)
+        data = self._encode_content(research_data)
+        return await self.writes.submit(partial(self._add_document, metadata, research_data, data))
+
+    def _add_document(self, metadata: Dict[str, Any], research_data: Dict[str, Any], data: bytes) -> str:
+        # Save document content (identical content is stored once)
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self.packs:
+            self._unwritten[digest] = data
+        self._ref_blob(digest)
         
         # Update index
+        doc_id = metadata["id"]
         self.document_index["documents"][doc_id] = metadata
-        self._save_index()
+        self.document_index["blobs"][doc_id] = digest
+        self.cache.invalidate(doc_id)
+        insort(self.date_index, (metadata["timestamp"], doc_id))
+        self.text_index.set_fields(doc_id, self._text_fields(metadata, research_data))
+        self._save_index(changed=[doc_id])
         
         return doc_id
 
+    def import_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """Add many prepared documents with one pack append and one index write.
+
+        Each document is a dict with its complete 'metadata', its text
+        index 'terms' (text_index.field_terms of _text_fields) and its
+        content as a pack_store.pack_blob tuple in 'blob', so parsing,
+        hashing and compressing can happen in other processes (see
+        scripts/ingest_research_documents.py). Meant for offline bulk
+        loads, not for a service handling requests. Returns how many
+        documents were added.
+        """
+        if not documents:
+            return 0
+        with self.storage.lock():
+            self._refresh()
+            self.packs.add_packed(document["blob"] for document in documents)
+            for document in documents:
+                metadata = document["metadata"]
+                doc_id, digest = metadata["id"], document["blob"][0]
+                # A document imported again starts a new version history
+                self._release_versions(doc_id)
+                if doc_id in self.document_index["blobs"]:
+                    self._unref_blob(self.document_index["blobs"][doc_id])
+                self.document_index["documents"][doc_id] = metadata
+                self.document_index["terms"][doc_id] = document["terms"]
+                self.document_index["blobs"][doc_id] = digest
+                self._ref_blob(digest)
+                self.cache.invalidate(doc_id)
+            self._compact_index()
+        self.text_index.load(self.document_index["terms"])
+        self._build_search_indexes()
+        return len(documents)
+
+    def replace_terms(self, terms: Dict[str, Dict[str, Dict[str, int]]]) -> None:
+        """Swap in text index terms rebuilt elsewhere and write the index once.
+
+        Documents missing from `terms` (e.g. saved by another process
+        meanwhile) keep their current terms.
+        """
+        with self.storage.lock():
+            self._refresh()
+            current = self.document_index["terms"]
+            self.document_index["terms"] = {doc_id: terms.get(doc_id, current.get(doc_id, {}))
+                                            for doc_id in self.document_index["documents"]}
+            self.text_index.load(self.document_index["terms"])
+            self._build_search_indexes()
+            self._compact_index()
+
     async def analyze_and_tag(self, doc_id: str, topics: List[str], tags: List[str]) -> None:
         """Add topics and tags to a document"""
+        await self.writes.submit(partial(self._analyze_and_tag, doc_id, topics, tags))
+
+    def _analyze_and_tag(self, doc_id: str, topics: List[str], tags: List[str]) -> None:
         if doc_id not in self.document_index["documents"]:
             raise ValueError(f"Document {doc_id} not found")
         
         # Update document metadata
-        self.document_index["documents"][doc_id]["topics"] = topics
-        self.document_index["documents"][doc_id]["tags"] = tags
+        metadata = self.document_index["documents"][doc_id]
+        previous_topics, previous_tags = metadata["topics"], metadata["tags"]
+        metadata["topics"] = topics
+        metadata["tags"] = tags
         
-        # Update topics index
+        # Update topics and tags indexes, dropping the ones no longer set
+        for topic in set(previous_topics) - set(topics):
+            self._unpost("topics", topic, doc_id)
+        for tag in set(previous_tags) - set(tags):
+            self._unpost("tags", tag, doc_id)
         for topic in topics:
-            if topic not in self.document_index["topics"]:
-                self.document_index["topics"][topic] = []
-            if doc_id not in self.document_index["topics"][topic]:
-                self.document_index["topics"][topic].append(doc_id)
-        
-        # Update tags index
+            self._post("topics", topic, doc_id)
         for tag in tags:
-            if tag not in self.document_index["tags"]:
-                self.document_index["tags"][tag] = []
-            if doc_id not in self.document_index["tags"][tag]:
-                self.document_index["tags"][tag].append(doc_id)
+            self._post("tags", tag, doc_id)
+        self.related_index.add(doc_id, self._related_tokens(metadata))
         
-        self._save_index()
+        self.text_index.set_fields(doc_id, {"topics": " ".join(topics), "tags": " ".join(tags)})
+        self.cache.invalidate(doc_id)
+        self._save_index(changed=[doc_id])
+
+    async def update_document(self, doc_id: str, research_data: Dict[str, Any]) -> int:
+        """Save new content for a document as its next version and return
+        the version number (save_research creates version 1).
+
+        The document keeps its id, timestamp, topics and tags; metadata
+        "version" and "updated" tell the current version and when it was
+        saved. The version it replaces stays readable through
+        get_document_version, stored as a delta against the new content.
+        Saving the current content again creates no version.
+        """
+        data = self._encode_content(research_data)
+        digest = hashlib.sha256(data).hexdigest()
+        # Rebuilds start from the stored (decoded) bytes, so diff the same
+        # text: a round trip through JSON turns non-str keys into strings
+        text = self._version_text(json.loads(data))
+        while True:
+            await self.writes.refresh()
+            metadata = self.document_index["documents"].get(doc_id)
+            base = self.document_index["blobs"].get(doc_id)
+            if metadata is None or base is None:
+                raise ValueError(f"Document {doc_id} not found")
+            if base == digest:
+                return metadata.get("version", 1)
+            # Diffing is CPU work on a long document: keep it off the loop
+            await self._refresh_packs()
+            delta = await self.io.run(self._version_delta, base, text)
+            version = await self.writes.submit(
+                partial(self._add_version, doc_id, base, research_data, data, delta))
+            # None: another update replaced the content meanwhile, diff against that one
+            if version is not None:
+                return version
+
+    def _add_version(self, doc_id: str, base: str, research_data: Dict[str, Any],
+                     data: bytes, delta: Optional[bytes]) -> Optional[int]:
+        metadata = self.document_index["documents"].get(doc_id)
+        if metadata is None:
+            raise ValueError(f"Document {doc_id} not found")
+        if self.document_index["blobs"].get(doc_id) != base:
+            return None
+        
+        # The current version joins the history, whole or as a delta
+        version = metadata.get("version", 1)
+        entry = {"version": version, "timestamp": metadata.get("updated", metadata["timestamp"])}
+        if delta is None or version % self.VERSION_KEYFRAME_EVERY == 0:
+            entry.update(blob=base, delta=False)
+        else:
+            delta_digest = hashlib.sha256(delta).hexdigest()
+            if delta_digest not in self.packs:
+                self._unwritten[delta_digest] = delta
+            self._ref_blob(delta_digest)
+            self._unref_blob(base)
+            entry.update(blob=delta_digest, delta=True)
+        self.document_index["versions"].setdefault(doc_id, []).append(entry)
+        
+        # The new content becomes the document's blob
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self.packs:
+            self._unwritten[digest] = data
+        self._ref_blob(digest)
+        self.document_index["blobs"][doc_id] = digest
+        metadata["version"] = version + 1
+        metadata["updated"] = datetime.now().isoformat()
+        metadata["query"] = research_data.get('query', metadata["query"])
+        self.text_index.set_fields(doc_id, self._text_fields(metadata, research_data))
+        self.cache.invalidate(doc_id)
+        self._check_dead_bytes()
+        self._save_index(changed=[doc_id])
+        
+        return version + 1
+
+    @staticmethod
+    def _version_text(content: Dict[str, Any]) -> str:
+        """Content as the text versions are diffed on: one value per line"""
+        return json.dumps(content, sort_keys=True, ensure_ascii=False, indent=1)
+
+    def _version_delta(self, digest: str, text: str) -> Optional[bytes]:
+        """Delta rebuilding the content of blob `digest` from the version
+        `text`, or None when it would not be smaller than that content"""
+        loaded = self._read_content(digest)
+        if loaded is None:
+            return None
+        content, size = loaded
+        delta = make_delta(text, self._version_text(content))
+        data = json.dumps(delta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return data if len(data) < size else None
 
     async def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve a document by ID"""
-        doc_path = self.base_path / f"{doc_id}.json"
-        if not doc_path.exists():
+        """Retrieve a document by ID.
+
+        Documents are served from an LRU cache of CACHE_BYTES, so repeated
+        calls return the same (not to be modified) dict. The cache is
+        dropped when the pack index file changes on disk under another
+        process. Misses are read and decoded on an I/O thread.
+        """
+        await self.writes.refresh()
+        await self._refresh_packs()
+        document = self.cache.get(doc_id)
+        if document is not None:
+            return document
+        
+        digest = self.document_index["blobs"].get(doc_id)
+        if digest is None:
             return None
+        loaded = await self.io.run(self._read_content, digest)
+        # The document may have been deleted while it was read
+        metadata = self.document_index["documents"].get(doc_id)
+        if loaded is None or metadata is None or self.document_index["blobs"].get(doc_id) != digest:
+            return None
+        content, size = loaded
+        document = {"metadata": dict(metadata), "content": content}
+        self.cache.put(doc_id, document, size)
+        return document
+
+    async def _refresh_packs(self) -> None:
+        """Reload the pack index if another process changed it (e.g.
+        compacted the pack, moving every blob) and drop the cached documents"""
+        if await self.io.run(self.packs.refresh):
+            self.cache.clear()
+
+    def _read_content(self, digest: str) -> Optional[tuple]:
+        """Decoded content of a blob and its size as JSON"""
+        data = self._unwritten.get(digest) or self.packs.get(digest)
+        return None if data is None else (json.loads(data), len(data))
+
+    async def get_document_version(self, doc_id: str, version: int) -> Optional[Dict[str, Any]]:
+        """Retrieve a version of a document, or None if there is no such version.
+
+        The current version is get_document's. Earlier ones are rebuilt on
+        an I/O thread from the next version stored whole, applying fewer
+        than VERSION_KEYFRAME_EVERY deltas, and cached like documents.
+        """
+        await self.writes.refresh()
+        metadata = self.document_index["documents"].get(doc_id)
+        if metadata is None:
+            return None
+        if version == metadata.get("version", 1):
+            return await self.get_document(doc_id)
+        versions = self.document_index["versions"].get(doc_id, [])
+        if not 1 <= version <= len(versions):
+            return None
+        document = self.cache.get((doc_id, version))
+        if document is not None:
+            return document
         
-        with open(doc_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # Each delta turns the next version into this one
+        deltas = []
+        for entry in versions[version - 1:]:
+            if not entry["delta"]:
+                base = entry["blob"]
+                break
+            deltas.append(entry["blob"])
+        else:
+            base = self.document_index["blobs"][doc_id]
+        await self._refresh_packs()
+        loaded = await self.io.run(self._rebuild_version, base, deltas)
+        if loaded is None or doc_id not in self.document_index["documents"]:
+            return None
+        content, size = loaded
+        entry = versions[version - 1]
+        document = {"metadata": dict(metadata, version=version, updated=entry["timestamp"]), "content": content}
+        self.cache.put((doc_id, version), document, size)
+        return document
+
+    def _rebuild_version(self, base: str, deltas: List[str]) -> Optional[tuple]:
+        """Content of a version from a blob stored whole and the deltas
+        leading back from it, and its size as text"""
+        data = self._unwritten.get(base) or self.packs.get(base)
+        if data is None:
+            return None
+        text = self._version_text(json.loads(data))
+        for digest in reversed(deltas):
+            delta = self._unwritten.get(digest) or self.packs.get(digest)
+            if delta is None:
+                return None
+            text = apply_delta(text, json.loads(delta))
+        return json.loads(text), len(text)
+
+    async def get_document_history(self, doc_id: str) -> List[Dict[str, Any]]:
+        """Versions of a document, oldest first: number, when it was saved,
+        whether it is stored as a delta and the pack bytes it takes"""
+        await self.writes.refresh()
+        metadata = self.document_index["documents"].get(doc_id)
+        if metadata is None:
+            return []
+        history = [
+            {"version": entry["version"], "timestamp": entry["timestamp"], "delta": entry["delta"],
+             "stored_bytes": self.packs.stored_size(entry["blob"])}
+            for entry in self.document_index["versions"].get(doc_id, [])
+        ]
+        history.append({
+            "version": metadata.get("version", 1),
+            "timestamp": metadata.get("updated", metadata["timestamp"]),
+            "delta": False,
+            "stored_bytes": self.packs.stored_size(self.document_index["blobs"].get(doc_id, ""))
+        })
+        return history
+
+    async def load_documents(self, results: List[DocumentResult]) -> List[DocumentResult]:
+        """Read the content of several results (concurrently, on the I/O pool)"""
+        await asyncio.gather(*(result.load() for result in results))
+        return results
 
     async def search_documents(self, 
                              query: Optional[str] = None,
                              topics: Optional[List[str]] = None,
                              tags: Optional[List[str]] = None,
                              date_from: Optional[str] = None,
-                             date_to: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Search documents by various criteria"""
+                             date_to: Optional[str] = None,
+                             limit: Optional[int] = 50,
+                             offset: int = 0,
+                             include_content: bool = False) -> List[DocumentResult]:
+        """Search documents by various criteria.
+
+        `query` matches documents containing all its words (the last one
+        also as a prefix) in the query, title, topics, tags, summary,
+        findings or content, best BM25 score first. Without it, the
+        planner (see explain_search) enumerates the most selective topic,
+        tag or date range and matches come oldest first.
+
+        Returns the page of matches [offset, offset + limit) (limit=None
+        for all of them) as DocumentResult objects; document contents are read
+        only with include_content=True or result.load().
+        """
+        await self.writes.refresh()
         results = []
+        stop = None if limit is None else offset + limit
+        skipped = 0
+        documents = self.document_index["documents"]
+        plan = self._plan(topics, tags, date_from, date_to, use_indexes=not query)
+        if query:
+            # With no other filter only the top offset + limit need ranking
+            ranked = self.text_index.search(query, limit=None if plan["residual"] else stop)
+        else:
+            ranked = ((doc_id, None) for doc_id in plan["ids"])
+        residual = plan["residual"]
         
-        for doc_id, metadata in self.document_index["documents"].items():
-            # Check if document matches all criteria
-            matches = True
-            
-            # Check query
-            if query and query.lower() not in metadata["query"].lower():
-                matches = False
-            
-            # Check topics
-            if topics and not all(topic in metadata["topics"] for topic in topics):
-                matches = False
-            
-            # Check tags
-            if tags and not all(tag in metadata["tags"] for tag in tags):
-                matches = False
-            
-            # Check date range
-            if date_from or date_to:
-                doc_date = datetime.fromisoformat(metadata["timestamp"])
-                if date_from and doc_date < datetime.fromisoformat(date_from):
-                    matches = False
-                if date_to and doc_date > datetime.fromisoformat(date_to):
-                    matches = False
-            
-            if matches:
-                document = await self.get_document(doc_id)
-                if document:
-                    results.append(document)
+        for doc_id, score in ranked:
+            metadata = documents[doc_id]
+            if residual and not self._matches(metadata, residual):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            results.append(DocumentResult(self, metadata, score=score))
+            if stop is not None and offset + len(results) >= stop:
+                break
         
+        if include_content:
+            await self.load_documents(results)
         return results
 
-    async def get_related_documents(self, doc_id: str) -> List[Dict[str, Any]]:
-        """Find documents related to a given document"""
-        if doc_id not in self.document_index["documents"]:
+    def explain_search(self,
+                       topics: Optional[List[str]] = None,
+                       tags: Optional[List[str]] = None,
+                       date_from: Optional[str] = None,
+                       date_to: Optional[str] = None) -> Dict[str, Any]:
+        """Plan search_documents would use for these filters (without a query)"""
+        self._refresh()
+        plan = self._plan(topics, tags, date_from, date_to)
+        del plan["ids"]
+        return plan
+
+    def _plan(self, topics: Optional[List[str]], tags: Optional[List[str]],
+              date_from: Optional[str], date_to: Optional[str],
+              use_indexes: bool = True) -> Dict[str, Any]:
+        """Pick the cheapest way to enumerate the candidates of a search.
+
+        Each topic, each tag and the date range can list its documents
+        oldest first: a posting list, or a bisected slice of the date
+        index. The smallest one drives the search and the other predicates
+        are checked on each candidate's metadata.
+        """
+        date_from = datetime.fromisoformat(date_from).isoformat() if date_from else None
+        date_to = datetime.fromisoformat(date_to).isoformat() if date_to else None
+        predicates = [("topics", topic) for topic in dict.fromkeys(topics or [])]
+        predicates += [("tags", tag) for tag in dict.fromkeys(tags or [])]
+        if date_from or date_to:
+            predicates.append(("date", (date_from, date_to)))
+
+        documents = self.document_index["documents"]
+        plan = {"driver": "all", "value": None, "rows": len(documents),
+                "ids": documents.keys(), "residual": predicates}
+        if not use_indexes:
+            return plan
+        for predicate in predicates:
+            section, value = predicate
+            if section == "date":
+                low = bisect_left(self.date_index, (date_from,)) if date_from else 0
+                high = bisect_right(self.date_index, (date_to, "\uffff")) if date_to else len(self.date_index)
+                rows = max(0, high - low)
+                ids = (self.date_index[i][1] for i in range(low, high))
+            else:
+                ids = self.document_index[section].get(value, [])
+                rows = len(ids)
+            if rows < plan["rows"] or plan["driver"] == "all" and rows == plan["rows"]:
+                plan = {"driver": section, "value": value, "rows": rows, "ids": ids,
+                        "residual": [other for other in predicates if other is not predicate]}
+
+        # Posting lists not much longer than the candidates are cheaper to
+        # intersect (in C, through a set) than to check document by document
+        plan["intersected"] = []
+        if plan["driver"] in ("topics", "tags"):
+            lists = sorted(
+                (predicate for predicate in plan["residual"] if predicate[0] != "date"),
+                key=lambda predicate: len(self.document_index[predicate[0]].get(predicate[1], [])))
+            for predicate in lists:
+                other = self.document_index[predicate[0]].get(predicate[1], [])
+                if len(other) > self.INTERSECT_RATIO * len(plan["ids"]):
+                    break
+                plan["ids"] = sorted(set(plan["ids"]).intersection(other))
+                plan["residual"].remove(predicate)
+                plan["intersected"].append(predicate)
+        return plan
+
+    @staticmethod
+    def _matches(metadata: Dict[str, Any], predicates: List[tuple]) -> bool:
+        for section, value in predicates:
+            if section == "date":
+                date_from, date_to = value
+                timestamp = metadata["timestamp"]
+                if (date_from and timestamp < date_from) or (date_to and timestamp > date_to):
+                    return False
+            elif value not in metadata[section]:
+                return False
+        return True
+
+    async def get_related_documents(self, doc_id: str,
+                                    limit: Optional[int] = 10,
+                                    offset: int = 0,
+                                    include_content: bool = False,
+                                    exhaustive: bool = False) -> List[DocumentResult]:
+        """Find documents related to a given document, most similar first.
+
+        Similarity is 0.7 * Jaccard(topics) + 0.3 * Jaccard(tags), computed
+        exactly from the index metadata, and documents above 0.3 are
+        related. Only the candidates of the MinHash/LSH index are scored,
+        so a related document can occasionally be missed (see LSH_BANDS);
+        exhaustive=True scores every document instead. See
+        search_documents for the paging and content arguments.
+        """
+        await self.writes.refresh()
+        documents = self.document_index["documents"]
+        if doc_id not in documents:
             return []
         
-        # Get document's topics and tags
-        doc_metadata = self.document_index["documents"][doc_id]
-        doc_topics = set(doc_metadata["topics"])
-        doc_tags = set(doc_metadata["tags"])
+        doc_metadata = documents[doc_id]
+        if exhaustive:
+            candidates = (other_id for other_id in documents if other_id != doc_id)
+        else:
+            candidates = self.related_index.candidates(doc_id)
         
-        related_docs = []
-        for other_id, other_metadata in self.document_index["documents"].items():
-            if other_id == doc_id:
-                continue
-            
-            # Calculate similarity based on shared topics and tags
-            other_topics = set(other_metadata["topics"])
-            other_tags = set(other_metadata["tags"])
-            
-            topic_similarity = len(doc_topics & other_topics) / len(doc_topics | other_topics) if doc_topics or other_topics else 0
-            tag_similarity = len(doc_tags & other_tags) / len(doc_tags | other_tags) if doc_tags or other_tags else 0
-            
-            # Use weighted similarity
-            similarity = (0.7 * topic_similarity) + (0.3 * tag_similarity)
-            
+        topics, tags = set(doc_metadata["topics"]), set(doc_metadata["tags"])
+        related = []
+        for other_id in candidates:
+            other_metadata = documents[other_id]
+            similarity = self._similarity(topics, tags, other_metadata)
             if similarity > 0.3:  # Threshold for relatedness
-                document = await self.get_document(other_id)
-                if document:
-                    document["similarity"] = similarity
-                    related_docs.append(document)
+                related.append((similarity, other_id, other_metadata))
         
-        # Sort by similarity
-        related_docs.sort(key=lambda x: x["similarity"], reverse=True)
-        return related_docs
+        # Sort by similarity, then oldest first
+        related.sort(key=lambda item: (-item[0], item[1]))
+        page = related[offset:] if limit is None else related[offset:offset + limit]
+        results = [DocumentResult(self, metadata, similarity) for similarity, _, metadata in page]
+        if include_content:
+            await self.load_documents(results)
+        return results
+
+    @staticmethod
+    def _similarity(topics: set, tags: set, other: Dict[str, Any]) -> float:
+        """Weighted similarity of a document's topics and tags to another document's"""
+        other_topics, other_tags = set(other["topics"]), set(other["tags"])
+        topic_similarity = len(topics & other_topics) / len(topics | other_topics) if topics or other_topics else 0
+        tag_similarity = len(tags & other_tags) / len(tags | other_tags) if tags or other_tags else 0
+        return (0.7 * topic_similarity) + (0.3 * tag_similarity)
 
     async def delete_document(self, doc_id: str) -> bool:
         """Delete a document and update indices"""
+        return await self.writes.submit(partial(self._delete_document, doc_id))
+
+    def _delete_document(self, doc_id: str) -> bool:
         if doc_id not in self.document_index["documents"]:
             return False
+        self._unindex_document(doc_id)
+        self._save_index(deleted=[doc_id])
+        return True
+
+    def _unindex_document(self, doc_id: str) -> None:
+        """Remove a document from the index and every search index"""
+        # Release its content blob
+        self._release_blob(doc_id)
+        self.cache.invalidate(doc_id)
         
-        # Remove file
-        doc_path = self.base_path / f"{doc_id}.json"
-        if doc_path.exists():
-            doc_path.unlink()
-        
-        # Remove from topics index
+        # Remove from topics, tags and date indexes
         metadata = self.document_index["documents"][doc_id]
         for topic in metadata["topics"]:
-            if topic in self.document_index["topics"]:
-                self.document_index["topics"][topic].remove(doc_id)
-                if not self.document_index["topics"][topic]:
-                    del self.document_index["topics"][topic]
-        
-        # Remove from tags index
+            self._unpost("topics", topic, doc_id)
         for tag in metadata["tags"]:
-            if tag in self.document_index["tags"]:
-                self.document_index["tags"][tag].remove(doc_id)
-                if not self.document_index["tags"][tag]:
-                    del self.document_index["tags"][tag]
+            self._unpost("tags", tag, doc_id)
+        position = bisect_left(self.date_index, (metadata["timestamp"], doc_id))
+        if position < len(self.date_index) and self.date_index[position] == (metadata["timestamp"], doc_id):
+            del self.date_index[position]
+        self.related_index.remove(doc_id)
         
-        # Remove from documents index
+        # Remove from documents and text index
         del self.document_index["documents"][doc_id]
-        
-        self._save_index()
-        return True
+        self.text_index.remove(doc_id)
+
+    def _index_document(self, record: Dict[str, Any]) -> None:
+        """Add a document from its index record (see _record) to the index
+        and every search index"""
+        doc_id, metadata = record["id"], record["metadata"]
+        self.document_index["documents"][doc_id] = metadata
+        self.text_index.set_terms(doc_id, record["terms"])
+        if record.get("blob"):
+            self.document_index["blobs"][doc_id] = record["blob"]
+            self._ref_blob(record["blob"])
+        if record.get("versions"):
+            self.document_index["versions"][doc_id] = record["versions"]
+            for version in record["versions"]:
+                self._ref_blob(version["blob"])
+        for topic in metadata["topics"]:
+            self._post("topics", topic, doc_id)
+        for tag in metadata["tags"]:
+            self._post("tags", tag, doc_id)
+        insort(self.date_index, (metadata["timestamp"], doc_id))
+        self.related_index.add(doc_id, self._related_tokens(metadata))
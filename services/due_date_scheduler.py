@@ -0,0 +1,201 @@
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from datetime import datetime, time as day_time, timedelta
+import heapq
+import itertools
+import threading
+import time
+from services.project_aggregates import DONE_STATUSES
+
+ReminderCallback = Callable[[Dict[str, Any], datetime], None]
+
+
+def parse_due_date(value: Optional[str], default_time: day_time) -> Optional[datetime]:
+    """Due date of a task as a local datetime; date-only values get default_time"""
+    if not value:
+        return None
+    try:
+        due = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if len(value) <= 10:
+        due = datetime.combine(due.date(), default_time)
+    return due
+
+
+class DueDateScheduler:
+    """Fires a callback when open tasks reach their due date.
+
+    Upcoming reminders sit in a min-heap keyed by fire time. Task changes
+    push a new entry and mark the task's previous one as superseded
+    instead of searching the heap for it (lazy deletion); superseded
+    entries are dropped when they reach the top, and the heap is rebuilt
+    when they outnumber the live ones. A tick only peeks at the top, so
+    its cost does not depend on the number of tasks.
+    """
+
+    def __init__(self,
+                 callback: ReminderCallback,
+                 lead_time: timedelta = timedelta(0),
+                 default_time: day_time = day_time(9, 0),
+                 poll_interval: float = 30.0,
+                 clock: Callable[[], float] = time.time):
+        self.callback = callback
+        self.lead_time = lead_time
+        self.default_time = default_time
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.source = None
+        self._heap: List[Tuple[float, int, Any]] = []
+        # task id -> (sequence of its live heap entry, task)
+        self._live: Dict[Any, Tuple[int, Dict[str, Any]]] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'fired': 0, 'errors': 0}
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def _fire_at(self, task: Dict[str, Any], keep_past: bool = False) -> Optional[float]:
+        if task.get('status') in DONE_STATUSES:
+            return None
+        due = parse_due_date(task.get('due_date'), self.default_time)
+        if due is None:
+            return None
+        fire_at = (due - self.lead_time).timestamp()
+        # Reminders already in the past are not sent (e.g. after a restart)
+        return fire_at if keep_past or fire_at >= self.clock() else None
+
+    def schedule(self, task: Dict[str, Any]) -> None:
+        """(Re)schedule the reminder of a task, or cancel it if it has none"""
+        fire_at = self._fire_at(task)
+        with self._lock:
+            self._live.pop(task['id'], None)
+            if fire_at is None:
+                self._compact()
+                return
+            seq = next(self._seq)
+            self._live[task['id']] = (seq, task)
+            earliest = not self._heap or fire_at < self._heap[0][0]
+            heapq.heappush(self._heap, (fire_at, seq, task['id']))
+            self._compact()
+        if earliest:
+            # The runner may be sleeping until a later reminder
+            self._wake.set()
+
+    def cancel(self, task_id: Any) -> None:
+        with self._lock:
+            self._live.pop(task_id, None)
+            self._compact()
+
+    def load(self, tasks: List[Dict[str, Any]]) -> None:
+        """Replace every reminder with the ones of the given tasks.
+
+        Tasks that already had a pending reminder keep it even if it came
+        due since the last tick, so a reload never drops an unsent one.
+        """
+        with self._lock:
+            pending = set(self._live)
+        entries = []
+        live = {}
+        for task in tasks:
+            fire_at = self._fire_at(task, keep_past=task['id'] in pending)
+            if fire_at is not None:
+                seq = next(self._seq)
+                live[task['id']] = (seq, task)
+                entries.append((fire_at, seq, task['id']))
+        heapq.heapify(entries)
+        with self._lock:
+            self._heap = entries
+            self._live = live
+        self._wake.set()
+
+    def _compact(self) -> None:
+        """Rebuild the heap once superseded entries dominate it (lock held)"""
+        if len(self._heap) > 2 * len(self._live) + 64:
+            live_seqs = {seq for seq, _ in self._live.values()}
+            self._heap = [entry for entry in self._heap if entry[1] in live_seqs]
+            heapq.heapify(self._heap)
+
+    def on_task_event(self, event: str, task: Optional[Dict[str, Any]],
+                      previous: Optional[Dict[str, Any]] = None) -> None:
+        """TaskService listener"""
+        if event == 'reloaded':
+            self.load(self.source.store.values() if self.source is not None else [])
+        elif event == 'deleted':
+            self.cancel(task['id'])
+        elif previous is None or any(
+                task.get(field) != previous.get(field) for field in ('due_date', 'status')):
+            self.schedule(task)
+
+    def attach(self, task_service) -> None:
+        """Follow a TaskService: load its tasks and listen to its changes.
+
+        The running scheduler reloads it from its own thread, so give it a
+        TaskService of its own rather than one an event loop also uses.
+        """
+        self.source = task_service
+        task_service.add_listener(self.on_task_event)
+        self.load(task_service.tasks)
+
+    def next_fire_time(self) -> Optional[float]:
+        """Epoch time of the next live reminder"""
+        with self._lock:
+            while self._heap and self._live.get(self._heap[0][2], (None,))[0] != self._heap[0][1]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def run_due(self, now: Optional[float] = None) -> List[Any]:
+        """Fire every reminder that is due; returns the task ids"""
+        now = self.clock() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, seq, task_id = heapq.heappop(self._heap)
+                live = self._live.get(task_id)
+                if live is None or live[0] != seq:
+                    continue
+                del self._live[task_id]
+                due.append((live[1], fire_at))
+        for task, fire_at in due:
+            try:
+                self.callback(task, datetime.fromtimestamp(fire_at))
+                self.stats['fired'] += 1
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Error sending reminder for task {task.get('id')}: {e}")
+        return [task['id'] for task, _ in due]
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # Send what is due before reloading, which may replace the reminders
+            self.run_due()
+            if self.source is not None:
+                try:
+                    # Pick up tasks written by other workers
+                    self.source.reload_if_changed()
+                except Exception as e:
+                    print(f"Error reloading tasks for reminders: {e}")
+            timeout = self.poll_interval
+            next_fire = self.next_fire_time()
+            if next_fire is not None:
+                timeout = max(0.0, min(timeout, next_fire - self.clock()))
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def start(self) -> None:
+        """Run the scheduler in a daemon thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='due-date-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,180 @@
+from typing import Dict, Any, List, Optional, Tuple
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import heapq
+import itertools
+import threading
+
+
+class FairQueue:
+    """Weighted fair queuing of agent work between users.
+
+    Uses self-clocked fair queuing: each request gets a virtual finish tag
+    `max(virtual_time, user's last tag) + cost / weight` and free slots go
+    to the waiting request with the smallest tag, so a user who floods the
+    queue only delays their own requests. Each user is also capped to
+    `per_user_limit` requests in flight.
+
+    Waiters may come from different event loops (the Slack handler runs one
+    loop per request thread), so state is guarded by a thread lock and
+    waiters are woken through their own loop.
+    """
+
+    def __init__(self,
+                 name: str,
+                 capacity: int = 8,
+                 per_user_limit: int = 2,
+                 weights: Optional[Dict[str, float]] = None,
+                 default_weight: float = 1.0):
+        self.name = name
+        self.capacity = capacity
+        self.per_user_limit = per_user_limit
+        self.weights: Dict[str, float] = dict(weights or {})
+        self.default_weight = default_weight
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        # Per-user FIFO of (finish_tag, seq, loop, future)
+        self._waiting: Dict[str, deque] = {}
+        self._user_in_flight: Dict[str, int] = {}
+        self._last_finish: Dict[str, float] = {}
+        # Heads of users that have waiters and are below their cap
+        self._ready: List[Tuple[float, int, str]] = []
+        self.stats = {'granted': 0, 'queued': 0, 'cancelled': 0}
+
+    def set_weight(self, user: str, weight: float) -> None:
+        """Give a user a larger (or smaller) share of the slots"""
+        if weight <= 0:
+            raise ValueError("Weight must be positive")
+        with self._lock:
+            self.weights[user] = weight
+
+    def _push_ready(self, user: str) -> None:
+        queue = self._waiting.get(user)
+        if queue and self._user_in_flight.get(user, 0) < self.per_user_limit:
+            finish, seq, _, _ = queue[0]
+            heapq.heappush(self._ready, (finish, seq, user))
+
+    def _dispatch(self) -> None:
+        """Grant free slots to the waiters with the smallest finish tags (lock held)"""
+        while self.in_flight < self.capacity and self._ready:
+            finish, seq, user = heapq.heappop(self._ready)
+            queue = self._waiting.get(user)
+            # Skip stale heap entries (head changed or user hit the cap)
+            if not queue or queue[0][1] != seq or self._user_in_flight.get(user, 0) >= self.per_user_limit:
+                continue
+            _, _, loop, future = queue.popleft()
+            if not queue:
+                del self._waiting[user]
+            self._take(user, finish)
+            loop.call_soon_threadsafe(self._grant, future, user)
+            self._push_ready(user)
+
+    def _take(self, user: str, finish: float) -> None:
+        self.in_flight += 1
+        self._user_in_flight[user] = self._user_in_flight.get(user, 0) + 1
+        self.virtual_time = max(self.virtual_time, finish)
+        self.stats['granted'] += 1
+
+    def _grant(self, future: asyncio.Future, user: str) -> None:
+        if future.cancelled():
+            # The waiter gave up after the slot was assigned: hand it back
+            self._release(user)
+        else:
+            future.set_result(True)
+
+    def _release(self, user: str) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._user_in_flight[user] -= 1
+            if not self._user_in_flight[user]:
+                del self._user_in_flight[user]
+            self._push_ready(user)
+            self._dispatch()
+
+    async def acquire(self, user: str, cost: float = 1.0) -> None:
+        """Wait for a slot for the given user"""
+        weight = self.weights.get(user, self.default_weight)
+        with self._lock:
+            finish = max(self.virtual_time, self._last_finish.get(user, 0.0)) + cost / weight
+            self._last_finish[user] = finish
+            if (self.in_flight < self.capacity and not self._ready
+                    and self._user_in_flight.get(user, 0) < self.per_user_limit
+                    and user not in self._waiting):
+                self._take(user, finish)
+                return
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            seq = next(self._seq)
+            queue = self._waiting.setdefault(user, deque())
+            queue.append((finish, seq, loop, future))
+            if len(queue) == 1:
+                self._push_ready(user)
+            self.stats['queued'] += 1
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Cancelled right after the slot was granted
+                self._release(user)
+                raise
+            with self._lock:
+                queue = self._waiting.get(user)
+                if queue:
+                    for entry in queue:
+                        if entry[1] == seq:
+                            queue.remove(entry)
+                            break
+                    if not queue:
+                        del self._waiting[user]
+                    else:
+                        self._push_ready(user)
+                self.stats['cancelled'] += 1
+            raise
+
+    def release(self, user: str) -> None:
+        """Return a slot taken with acquire"""
+        self._release(user)
+
+    @asynccontextmanager
+    async def slot(self, user: Optional[str], cost: float = 1.0):
+        """Hold a fair-queued slot for the duration of the block"""
+        user = user or 'anonymous'
+        await self.acquire(user, cost)
+        try:
+            yield
+        finally:
+            self.release(user)
+
+    def queue_depth(self) -> int:
+        """Number of requests waiting for a slot"""
+        with self._lock:
+            return sum(len(queue) for queue in self._waiting.values())
+
+    def pressure(self) -> float:
+        """Queued plus running work relative to capacity, capped at 1"""
+        return min(1.0, (self.in_flight + self.queue_depth()) / (2 * self.capacity))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue depth and in-flight counts, overall and per user"""
+        with self._lock:
+            users = set(self._waiting) | set(self._user_in_flight)
+            per_user = {
+                user: {
+                    'queued': len(self._waiting.get(user, ())),
+                    'in_flight': self._user_in_flight.get(user, 0),
+                    'weight': self.weights.get(user, self.default_weight)
+                }
+                for user in users
+            }
+            queued = sum(len(queue) for queue in self._waiting.values())
+            return {
+                'capacity': self.capacity,
+                'in_flight': self.in_flight,
+                'queued': queued,
+                'users': per_user,
+                **self.stats
+            }
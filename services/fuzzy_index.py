@@ -0,0 +1,155 @@
+from typing import Dict, Any, List, Tuple, FrozenSet, Hashable, Iterable
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
+import math
+import re
+import unicodedata
+
+# Words dropped before comparing names, so "Pipeline de entrenamiento" and
+# "pipeline entrenamiento" are the same name
+STOPWORDS = frozenset({
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los', 'para',
+    'por', 'un', 'una', 'y', 'o',
+    'an', 'and', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with'
+})
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+_ACCENTS = str.maketrans('áàâäéèêëíìîïóòôöúùûüñç', 'aaaaeeeeiiiioooouuuunc')
+
+
+def _strip_accents(text: str) -> str:
+    text = text.lower().translate(_ACCENTS)
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize(text: str, stopwords: FrozenSet[str] = STOPWORDS) -> str:
+    """Lowercase, strip accents and punctuation, and drop stopwords"""
+    words = _NON_WORD.sub(' ', _strip_accents(text or '')).split()
+    kept = [word for word in words if word not in stopwords]
+    # A name made only of stopwords still has to be comparable
+    return ' '.join(kept or words)
+
+
+@lru_cache(maxsize=65536)
+def _word_trigrams(word: str) -> FrozenSet[str]:
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """Trigrams of each word, padded like pg_trgm ('  w', ' wo', 'wor', ...)"""
+    return frozenset().union(*map(_word_trigrams, text.split()))
+
+
+class FuzzyIndex:
+    """Trigram index over short names for "did you mean" lookups.
+
+    Similarity is the Jaccard index of the normalized names' trigram sets.
+    With threshold t a match shares at least m = ceil(t * q) of the
+    query's q trigrams, so it must contain one of the rarest q - m + 1
+    (prefix filtering). The lookup counts hits over that prefix plus
+    `extra_grams` more trigrams and keeps records hit more than
+    `extra_grams` times; records whose trigram count is outside
+    [t * q, q / t] are skipped too, so only a few candidates are scored.
+    """
+
+    def __init__(self, stopwords: Iterable[str] = STOPWORDS, extra_grams: int = 3):
+        self.stopwords = frozenset(stopwords)
+        self.extra_grams = extra_grams
+        self.postings: Dict[str, set] = {}
+        self.grams: Dict[Hashable, FrozenSet[str]] = {}
+        # Normalized name -> ids, for O(1) exact duplicate checks
+        self.names: Dict[str, set] = {}
+        self._normalized: Dict[Hashable, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.grams)
+
+    def __contains__(self, record_id: Hashable) -> bool:
+        return record_id in self.grams
+
+    def add(self, record_id: Hashable, text: str) -> None:
+        """Index a name (replacing the record's previous one)"""
+        self.remove(record_id)
+        normalized = normalize(text, self.stopwords)
+        self._normalized[record_id] = normalized
+        self.names.setdefault(normalized, set()).add(record_id)
+        grams = trigrams(normalized)
+        self.grams[record_id] = grams
+        postings = self.postings
+        for gram in grams:
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = {record_id}
+            else:
+                ids.add(record_id)
+
+    def remove(self, record_id: Hashable) -> None:
+        grams = self.grams.pop(record_id, None)
+        if grams is None:
+            return
+        normalized = self._normalized.pop(record_id)
+        self.names[normalized].discard(record_id)
+        if not self.names[normalized]:
+            del self.names[normalized]
+        for gram in grams:
+            ids = self.postings[gram]
+            ids.discard(record_id)
+            if not ids:
+                del self.postings[gram]
+
+    def load(self, items: Iterable[Tuple[Hashable, str]]) -> None:
+        """Replace the index contents with (id, name) pairs"""
+        self.postings = {}
+        self.grams = {}
+        self.names = {}
+        self._normalized = {}
+        for record_id, text in items:
+            self.add(record_id, text)
+
+    def exact(self, text: str) -> List[Hashable]:
+        """Ids whose name normalizes to the same text"""
+        return list(self.names.get(normalize(text, self.stopwords), ()))
+
+    def similar(self, text: str, limit: int = 5, threshold: float = 0.7,
+                exclude: Iterable[Hashable] = ()) -> List[Tuple[Hashable, float]]:
+        """Ids of the most similar names with their scores, best first"""
+        if not 0 < threshold <= 1:
+            raise ValueError("Threshold must be in (0, 1]")
+        query = trigrams(normalize(text, self.stopwords))
+        if not query:
+            return []
+        q = len(query)
+        min_overlap = math.ceil(threshold * q - 1e-9)
+        ordered = sorted(query, key=lambda gram: len(self.postings.get(gram, ())))
+        # Scanning a few grams past the prefix lets the count filter below
+        # drop most candidates before the exact check
+        extra = min(self.extra_grams, min_overlap - 1)
+        scanned = q - min_overlap + 1 + extra
+        counts = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in ordered[:scanned]))
+
+        min_size, max_size = threshold * q, q / threshold
+        excluded = set(exclude)
+        scored = []
+        for record_id, count in counts.items():
+            if count <= extra:
+                continue
+            grams = self.grams[record_id]
+            if not min_size <= len(grams) <= max_size or record_id in excluded:
+                continue
+            overlap = len(query & grams)
+            score = overlap / (q + len(grams) - overlap)
+            if score >= threshold:
+                scored.append((record_id, score))
+
+        scored.sort(key=lambda item: -item[1])
+        return [(record_id, round(score, 3)) for record_id, score in scored[:limit]]
+
+    def stats(self) -> Dict[str, Any]:
+        return {'names': len(self.grams), 'trigrams': len(self.postings)}
@@ -8,6 +8,7 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from email.mime.text import MIMEText
 import base64
+from services.tracing import traced
 
 class GmailService:
     SCOPES = [
@@ -41,6 +42,7 @@ class GmailService:
 
         self.service = build('gmail', 'v1', credentials=self.creds)
 
+    @traced()
     async def list_messages(self, query: str = None, max_results: int = 10) -> List[Dict[str, Any]]:
         """List messages matching the specified query"""
         try:
@@ -86,6 +88,7 @@ class GmailService:
             print(f'An error occurred: {error}')
             return []
 
+    @traced()
     async def send_message(self, to: str, subject: str, body: str) -> bool:
         """Send an email message"""
         try:
@@ -117,6 +120,7 @@ class GmailService:
         """Get unread messages"""
         return await self.list_messages(query='is:unread', max_results=max_results)
 
+    @traced()
     async def mark_as_read(self, message_id: str) -> bool:
         """Mark a message as read"""
         try:
@@ -6,6 +6,7 @@ from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from dateutil import parser as date_parser
+from services.tracing import traced
 
 class GoogleCalendarService:
     """Servicio para interactuar con Google Calendar API"""
@@ -65,6 +66,7 @@ class GoogleCalendarService:
             'timeZone': str(self.timezone)
         }
 
+    @traced()
     async def get_events_for_date(
         self,
         date: datetime,
@@ -128,6 +130,7 @@ class GoogleCalendarService:
             print(f"Error getting events: {error}")
             return []
     
+    @traced()
     async def create_event(self, event_details: Dict[str, Any]) -> Dict[str, Any]:
         """Crea un nuevo evento en el calendario"""
         try:
@@ -152,6 +155,7 @@ class GoogleCalendarService:
             print(f"Error creating event: {error}")
             raise
     
+    @traced()
     async def update_event(
         self,
         event_id: str,
@@ -179,6 +183,7 @@ class GoogleCalendarService:
             print(f"Error updating event: {error}")
             raise
     
+    @traced()
     async def delete_event(
         self,
         event_id: str,
@@ -196,6 +201,7 @@ class GoogleCalendarService:
             print(f"Error deleting event: {error}")
             return False
     
+    @traced()
     async def check_availability(
         self,
         start_time: datetime,
@@ -251,6 +257,7 @@ class GoogleCalendarService:
             print(f"Error checking availability: {error}")
             return False
     
+    @traced()
     async def get_calendar_list(self) -> List[Dict[str, Any]]:
         """Obtiene la lista de calendarios disponibles"""
         try:
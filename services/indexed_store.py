@@ -0,0 +1,430 @@
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Set, Tuple
+from bisect import bisect_left, bisect_right, insort
+from functools import total_ordering
+from itertools import islice
+from operator import itemgetter
+import base64
+import heapq
+import json
+
+# Index key for records that do not have the field at all. The legacy
+# list filters skip keys a record lacks, so such records match any value.
+_MISSING = object()
+
+
+# Query operators: eq/in are answered by the hash indexes, the others by
+# the sorted range indexes
+OPERATORS = ('eq', 'in', 'gt', 'gte', 'lt', 'lte')
+_RANGE_OPERATORS = ('gt', 'gte', 'lt', 'lte')
+_COMPARE = {
+    'gt': lambda value, bound: value > bound,
+    'gte': lambda value, bound: value >= bound,
+    'lt': lambda value, bound: value < bound,
+    'lte': lambda value, bound: value <= bound,
+}
+_rank_of_entry = itemgetter(0)
+
+
+def _rank(value: Any) -> tuple:
+    """Sort rank of a value; missing values sort after everything else"""
+    return (1,) if value is None else (0, value)
+
+
+def _bound(value: Any) -> Any:
+    # Dates are stored as ISO strings, so accept date/datetime bounds too
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+@total_ordering
+class _Descending:
+    """Wraps a sort key component to reverse its order"""
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __eq__(self, other: '_Descending') -> bool:
+        return self.value == other.value
+
+    def __lt__(self, other: '_Descending') -> bool:
+        return other.value < self.value
+
+
+def _index_key(value: Any) -> Any:
+    """Make a field value usable as an index key"""
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        # Lists and dicts cannot be hashed; index them by their repr instead
+        return ('__unhashable__', repr(value))
+
+
+class IndexedStore:
+    """In-memory records keyed by id with secondary hash indexes.
+
+    Point lookups by id are O(1) and equality filters on indexed fields are
+    answered by intersecting the matching id sets, smallest first. Range
+    fields (and the id) also keep a sorted list of (rank, id) entries, so
+    range predicates and ordered pages are bisected instead of scanned.
+    Records must only be changed through add/update/remove so the indexes
+    stay in sync.
+    """
+
+    def __init__(self, indexed_fields: Iterable[str], key: str = 'id',
+                 range_fields: Iterable[str] = ()):
+        self.key = key
+        self.indexed_fields = tuple(indexed_fields)
+        self.range_fields = (key,) + tuple(field for field in range_fields if field != key)
+        self.records: Dict[Any, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[Any, Set[Any]]] = {field: {} for field in self.indexed_fields}
+        self.ranges: Dict[str, List[tuple]] = {field: [] for field in self.range_fields}
+        # Insertion sequence, used to return filtered results in stable order
+        self._order: Dict[Any, int] = {}
+        self._sequence = 0
+        self._max_id = 0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, record_id: Any) -> bool:
+        return record_id in self.records
+
+    def load(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Replace the contents of the store"""
+        self.records = {}
+        self.indexes = {field: {} for field in self.indexed_fields}
+        self.ranges = {field: [] for field in self.range_fields}
+        self._order = {}
+        self._sequence = 0
+        self._max_id = 0
+        for record in records:
+            self._insert(record)
+        # Sort each range index once instead of inserting record by record
+        self.ranges = {
+            field: sorted((_rank(record.get(field)), record_id) for record_id, record in self.records.items())
+            for field in self.range_fields
+        }
+
+    def values(self) -> List[Dict[str, Any]]:
+        """All records in insertion order"""
+        return list(self.records.values())
+
+    def next_id(self) -> int:
+        """Next free integer id (never reuses ids of deleted records)"""
+        return self._max_id + 1
+
+    def get(self, record_id: Any) -> Optional[Dict[str, Any]]:
+        return self.records.get(record_id)
+
+    def _index(self, record_id: Any, record: Dict[str, Any], fields: Iterable[str]) -> None:
+        for field in fields:
+            value = _index_key(record[field]) if field in record else _MISSING
+            self.indexes[field].setdefault(value, set()).add(record_id)
+
+    def _unindex(self, record_id: Any, record: Dict[str, Any], fields: Iterable[str]) -> None:
+        for field in fields:
+            value = _index_key(record[field]) if field in record else _MISSING
+            ids = self.indexes[field].get(value)
+            if ids is not None:
+                ids.discard(record_id)
+                if not ids:
+                    del self.indexes[field][value]
+
+    def _range_index(self, record_id: Any, record: Dict[str, Any], fields: Iterable[str]) -> None:
+        for field in fields:
+            insort(self.ranges[field], (_rank(record.get(field)), record_id))
+
+    def _range_unindex(self, record_id: Any, record: Dict[str, Any], fields: Iterable[str]) -> None:
+        for field in fields:
+            entries = self.ranges[field]
+            entry = (_rank(record.get(field)), record_id)
+            position = bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+    def _insert(self, record: Dict[str, Any]) -> Any:
+        record_id = record[self.key]
+        if record_id in self.records:
+            self.remove(record_id)
+        self.records[record_id] = record
+        self._order[record_id] = self._sequence
+        self._sequence += 1
+        if isinstance(record_id, int) and record_id > self._max_id:
+            self._max_id = record_id
+        self._index(record_id, record, self.indexed_fields)
+        return record_id
+
+    def add(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert a record (replacing any record with the same id)"""
+        record_id = self._insert(record)
+        self._range_index(record_id, record, self.range_fields)
+        return record
+
+    def update(self, record_id: Any, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Apply updates in place, re-indexing only the fields that change"""
+        record = self.records.get(record_id)
+        if record is None:
+            return None
+        changed = [
+            field for field in self.indexed_fields
+            if field in updates and (field not in record or record[field] != updates[field])
+        ]
+        changed_ranges = [
+            field for field in self.range_fields
+            if field in updates and record.get(field) != updates[field]
+        ]
+        self._unindex(record_id, record, changed)
+        self._range_unindex(record_id, record, changed_ranges)
+        record.update(updates)
+        self._index(record_id, record, changed)
+        self._range_index(record_id, record, changed_ranges)
+        return record
+
+    def remove(self, record_id: Any) -> Optional[Dict[str, Any]]:
+        """Delete a record and return it"""
+        record = self.records.pop(record_id, None)
+        if record is None:
+            return None
+        del self._order[record_id]
+        self._unindex(record_id, record, self.indexed_fields)
+        self._range_unindex(record_id, record, self.range_fields)
+        return record
+
+    def find(self, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Records matching every filter (keys a record lacks are ignored)"""
+        if not filters:
+            return self.values()
+
+        candidate_sets = []
+        remaining = {}
+        for field, value in filters.items():
+            if field in self.indexes:
+                index = self.indexes[field]
+                matches = index.get(_index_key(value), set())
+                missing = index.get(_MISSING)
+                candidate_sets.append(matches | missing if missing else matches)
+            else:
+                remaining[field] = value
+
+        if candidate_sets:
+            candidate_sets.sort(key=len)
+            ids = set(candidate_sets[0])
+            for other in candidate_sets[1:]:
+                if not ids:
+                    break
+                ids &= other
+            ordered = sorted(ids, key=self._order.__getitem__)
+            candidates = (self.records[record_id] for record_id in ordered)
+        else:
+            candidates = self.records.values()
+
+        return [
+            record for record in candidates
+            if all(field not in record or record[field] == value
+                   for field, value in remaining.items())
+        ]
+
+    # Query engine
+
+    def query(self, where: Optional[Dict[str, Any]] = None,
+              order_by: Optional[Iterable[str]] = None,
+              limit: Optional[int] = None,
+              cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of records matching `where`, plus the cursor of the next page.
+
+        `where` maps fields to a value (equality) or to a dict of operators,
+        e.g. {'status': {'in': ['pending', 'blocked']}, 'due_date': {'gte':
+        '2024-01-01', 'lt': '2024-02-01'}}. Unlike find, records lacking a
+        field never match a predicate on it. `order_by` lists fields, with a
+        '-' prefix for descending; missing values sort last ascending and
+        first descending, and ties are broken by id. The cursor is opaque
+        and only valid for the same order.
+        """
+        if limit is not None and limit < 1:
+            raise ValueError("Limit must be positive")
+        predicates = self._parse_where(where)
+        sort = self._parse_order(order_by)
+        after = self._decode_cursor(cursor, sort) if cursor else None
+
+        matches = self._scan(predicates, sort, after, None if limit is None else limit + 1)
+        if limit is None:
+            return list(matches), None
+        records = list(islice(matches, limit + 1))
+        if len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        return records, self._encode_cursor(records[-1], sort)
+
+    def iter_query(self, where: Optional[Dict[str, Any]] = None,
+                   order_by: Optional[Iterable[str]] = None,
+                   batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """Pages of query results, fetched one cursor at a time"""
+        cursor = None
+        while True:
+            page, cursor = self.query(where, order_by, batch_size, cursor)
+            if page:
+                yield page
+            if cursor is None:
+                return
+
+    def _parse_where(self, where: Optional[Dict[str, Any]]) -> List[Tuple[str, str, Any]]:
+        predicates = []
+        for field, condition in (where or {}).items():
+            if isinstance(condition, dict) and condition and all(op in OPERATORS for op in condition):
+                for op, value in condition.items():
+                    if op == 'in':
+                        value = [_bound(item) for item in value]
+                    predicates.append((field, op, _bound(value)))
+            else:
+                predicates.append((field, 'eq', _bound(condition)))
+        return predicates
+
+    def _parse_order(self, order_by: Optional[Iterable[str]]) -> List[Tuple[str, bool]]:
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        sort = [(name.lstrip('-'), name.startswith('-')) for name in order_by or ()]
+        return sort or [(self.key, False)]
+
+    def _sort_key(self, record: Dict[str, Any], sort: List[Tuple[str, bool]]) -> tuple:
+        return self._key_from_values([record.get(field) for field, _ in sort] + [record[self.key]], sort)
+
+    def _key_from_values(self, values: List[Any], sort: List[Tuple[str, bool]]) -> tuple:
+        # The id breaks ties in the direction of the last sort field
+        directions = [descending for _, descending in sort] + [sort[-1][1]]
+        return tuple(
+            _Descending(_rank(value)) if descending else _rank(value)
+            for value, descending in zip(values, directions)
+        )
+
+    def _encode_cursor(self, record: Dict[str, Any], sort: List[Tuple[str, bool]]) -> str:
+        payload = {
+            'o': [('-' if descending else '') + field for field, descending in sort],
+            'k': [record.get(field) for field, _ in sort] + [record[self.key]]
+        }
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def _decode_cursor(self, cursor: str, sort: List[Tuple[str, bool]]) -> List[Any]:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            order, values = payload['o'], payload['k']
+        except (ValueError, TypeError, KeyError):
+            raise ValueError("Invalid cursor")
+        if order != [('-' if descending else '') + field for field, descending in sort]:
+            raise ValueError("Cursor does not match the requested order")
+        return values
+
+    def _matches(self, record: Dict[str, Any], predicates: List[Tuple[str, str, Any]]) -> bool:
+        for field, op, value in predicates:
+            actual = record.get(field, _MISSING)
+            if op == 'eq':
+                if actual is _MISSING or actual != value:
+                    return False
+            elif op == 'in':
+                if actual is _MISSING or actual not in value:
+                    return False
+            elif actual is _MISSING or actual is None:
+                return False
+            else:
+                try:
+                    if not _COMPARE[op](actual, value):
+                        return False
+                except TypeError:
+                    return False
+        return True
+
+    def _range_bounds(self, field: str, predicates: List[Tuple[str, str, Any]]) -> Tuple[int, int]:
+        """Slice of the field's range index satisfying its range predicates"""
+        entries = self.ranges[field]
+        # Entries without a value rank (1,) and never satisfy a range predicate
+        low, high = 0, bisect_left(entries, (1,), key=_rank_of_entry)
+        for name, op, value in predicates:
+            if name != field or op not in _RANGE_OPERATORS:
+                continue
+            if op == 'gt':
+                low = max(low, bisect_right(entries, (0, value), key=_rank_of_entry))
+            elif op == 'gte':
+                low = max(low, bisect_left(entries, (0, value), key=_rank_of_entry))
+            elif op == 'lt':
+                high = min(high, bisect_left(entries, (0, value), key=_rank_of_entry))
+            else:
+                high = min(high, bisect_right(entries, (0, value), key=_rank_of_entry))
+        return low, max(low, high)
+
+    def _scan(self, predicates: List[Tuple[str, str, Any]], sort: List[Tuple[str, bool]],
+              after: Optional[List[Any]], limit: Optional[int]) -> Iterator[Dict[str, Any]]:
+        """Matching records in sort order, starting after the cursor values"""
+        candidate_sets = []
+        residual = []
+        ranged_fields = set()
+        for field, op, value in predicates:
+            if op == 'eq' and field in self.indexes:
+                candidate_sets.append(self.indexes[field].get(_index_key(value), set()))
+            elif op == 'in' and field in self.indexes:
+                index = self.indexes[field]
+                candidate_sets.append(set().union(*(index.get(_index_key(item), set()) for item in value)))
+            elif op in _RANGE_OPERATORS and field in self.ranges:
+                ranged_fields.add(field)
+            else:
+                residual.append((field, op, value))
+
+        sort_field, descending = sort[0]
+        walk = len(sort) == 1 and sort_field in self.ranges
+        for field in ranged_fields:
+            if walk and field == sort_field:
+                continue
+            low, high = self._range_bounds(field, predicates)
+            candidate_sets.append({record_id for _, record_id in self.ranges[field][low:high]})
+
+        candidates = None
+        if candidate_sets:
+            candidate_sets.sort(key=len)
+            candidates = set(candidate_sets[0])
+            for other in candidate_sets[1:]:
+                if not candidates:
+                    break
+                candidates &= other
+
+        if walk and sort_field in ranged_fields:
+            low, high = self._range_bounds(sort_field, predicates)
+        else:
+            low, high = 0, len(self.ranges.get(sort_field, ()))
+        # Walking the sorted index only pays off when the filters keep a
+        # good share of the records; otherwise sort the few candidates
+        if walk and (candidates is None or len(candidates) * 8 >= high - low):
+            yield from self._walk_range(sort_field, descending, low, high, after, candidates, residual)
+            return
+        if walk and sort_field in ranged_fields:
+            residual.extend(p for p in predicates if p[0] == sort_field and p[1] in _RANGE_OPERATORS)
+
+        if candidates is None:
+            pool = self.records.values()
+        else:
+            pool = (self.records[record_id] for record_id in candidates)
+        matching = (record for record in pool if self._matches(record, residual))
+        if after is not None:
+            after_key = self._key_from_values(after, sort)
+            matching = (record for record in matching if self._sort_key(record, sort) > after_key)
+        if limit is None:
+            yield from sorted(matching, key=lambda record: self._sort_key(record, sort))
+        else:
+            yield from heapq.nsmallest(limit, matching, key=lambda record: self._sort_key(record, sort))
+
+    def _walk_range(self, field: str, descending: bool, low: int, high: int,
+                    after: Optional[List[Any]], candidates: Optional[Set[Any]],
+                    residual: List[Tuple[str, str, Any]]) -> Iterator[Dict[str, Any]]:
+        entries = self.ranges[field]
+        if after is not None:
+            entry = (_rank(after[0]), after[-1])
+            if descending:
+                high = min(high, bisect_left(entries, entry))
+            else:
+                low = max(low, bisect_right(entries, entry))
+        positions = range(high - 1, low - 1, -1) if descending else range(low, high)
+        for position in positions:
+            record_id = entries[position][1]
+            if candidates is not None and record_id not in candidates:
+                continue
+            record = self.records[record_id]
+            if self._matches(record, residual):
+                yield record
@@ -0,0 +1,255 @@
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+import asyncio
+import os
+import threading
+
+# Changes read by a WriteBatcher's load_if_stale (e.g. a storage's
+# read_changes), applied on the event loop; None when there are none
+Records = Optional[Dict[str, Any]]
+
+
+class IOPool:
+    """Bounded thread pool for the blocking file I/O of the async services.
+
+    Coroutines await `run(func, ...)` instead of calling open/json.dump
+    on the event loop, so a slow disk delays the caller but not every
+    other coroutine. The bound keeps a burst of writes from spawning a
+    thread each.
+    """
+
+    def __init__(self, max_workers: int = 4, name: str = 'io'):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+_pool: Optional[IOPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_io_pool() -> IOPool:
+    """Return the process-wide pool (LUCIUS_IO_THREADS threads, default 4).
+
+    A forked worker gets a pool of its own: the parent's threads do not
+    exist in the child.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = IOPool(int(os.getenv('LUCIUS_IO_THREADS', '4')))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+class WriteBatcher:
+    """Runs a service's mutations in groups, with one storage write per group.
+
+    For each group an I/O thread takes the storage lock and, through
+    `load_if_stale`, reads the changes another process wrote since the
+    last load. The event loop then applies them (`apply`) and runs the
+    queued mutations one after another, so in-memory state is only ever
+    changed on the loop and readers there never see it half-updated.
+    Mutations report what they changed through `stage()` instead of
+    writing it. Back on the thread, `flush` persists the staged changes
+    of the whole group at once and the lock is released.
+
+    Mutations submitted while a group is being written wait and form the
+    next group, so a burst of small writes costs a few storage writes
+    rather than one each. Callers resume once their group is persisted;
+    a mutation that raises fails only its own caller.
+
+    Readers call `refresh()` the same way: the changes are read on an I/O
+    thread and applied on the loop. Changes read but not yet applied wait
+    in a queue that the next group applies before its mutations, so a
+    group never runs on state older than what was read.
+
+    Each event loop (e.g. one asyncio.run per request) queues and drains
+    its own mutations; the storage lock orders the groups of all loops.
+    A loop that stops fails its pending group instead of leaving the
+    lock held, and never holds up the callers of other loops.
+    """
+
+    # Seconds between checks that the loop of a group is still running,
+    # while the group waits for it with the lock held
+    LOOP_CHECK_INTERVAL = 1.0
+
+    def __init__(self, pool: IOPool, lock: Callable[[], Any],
+                 flush: Callable[[List[Any], List[Hashable]], None],
+                 load_if_stale: Optional[Callable[[], Records]] = None,
+                 apply: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 key: Callable[[Any], Hashable] = lambda item: item['id'],
+                 max_batch: int = 256):
+        self.pool = pool
+        self.lock = lock
+        self.flush = flush
+        self.load_if_stale = load_if_stale
+        self.apply = apply
+        self.key = key
+        self.max_batch = max_batch
+        # Queued (mutation, future) pairs of each loop with a drain running
+        self._queues: Dict[asyncio.AbstractEventLoop, deque] = {}
+        # Changes read by load_if_stale and not applied yet, oldest first
+        self._unapplied: deque = deque()
+        self._unapplied_lock = threading.Lock()
+        self._changed: Dict[Hashable, Any] = {}
+        self._deleted: Dict[Hashable, None] = {}
+        # True while mutations of a group run on the loop
+        self.active = False
+        self.stats = {'groups': 0, 'mutations': 0}
+
+    async def submit(self, mutation: Callable[[], Any]) -> Any:
+        """Run mutation() on the loop under the storage lock and return its
+        result once its changes are written"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.get(loop)
+        if queue is None:
+            queue = self._queues[loop] = deque()
+            loop.create_task(self._drain(loop, queue))
+        queue.append((mutation, future))
+        return await future
+
+    def stage(self, changed: Iterable[Any] = (), deleted: Iterable[Hashable] = ()) -> None:
+        """Record changes of the running group; the last change of a key wins"""
+        for item in changed:
+            key = self.key(item)
+            self._deleted.pop(key, None)
+            self._changed[key] = item
+        for key in deleted:
+            self._changed.pop(key, None)
+            self._deleted[key] = None
+
+    async def refresh(self) -> None:
+        """Apply the changes other processes wrote, read on an I/O thread.
+
+        Skipped while someone holds the lock: a writer (possibly an I/O
+        thread waiting for this loop) applies them before its mutations.
+        """
+        if self.load_if_stale is None:
+            return
+        await asyncio.get_running_loop().run_in_executor(self.pool.executor, self._read_unless_locked)
+        self._apply_unapplied()
+
+    def refresh_sync(self) -> None:
+        """refresh() for callers without an event loop (e.g. a thread of
+        their own); the changes are read and applied in the calling thread"""
+        if self.load_if_stale is None:
+            return
+        self._read_unless_locked()
+        self._apply_unapplied()
+
+    def _read_unless_locked(self) -> None:
+        lock = self.lock()
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            self._read_changes()
+        finally:
+            lock.release()
+
+    def _read_changes(self) -> None:
+        """Queue the changes of other processes (lock held)"""
+        changes = self.load_if_stale() if self.load_if_stale else None
+        if changes is not None:
+            with self._unapplied_lock:
+                self._unapplied.append(changes)
+
+    def _apply_unapplied(self) -> None:
+        while True:
+            with self._unapplied_lock:
+                if not self._unapplied:
+                    return
+                changes = self._unapplied.popleft()
+            self.apply(changes)
+
+    async def _drain(self, loop: asyncio.AbstractEventLoop, queue: deque) -> None:
+        try:
+            while queue:
+                group = [queue.popleft() for _ in range(min(len(queue), self.max_batch))]
+                await loop.run_in_executor(self.pool.executor, self._write_group, group, loop)
+        finally:
+            del self._queues[loop]
+            # Cancelled (e.g. its loop is shutting down): what is left never runs
+            for _, future in queue:
+                future.cancel()
+
+    def _write_group(self, group: List[Tuple[Callable[[], Any], asyncio.Future]],
+                     loop: asyncio.AbstractEventLoop) -> None:
+        """I/O thread side of a group: lock, load, run the mutations on the
+        loop, flush, then wake the callers"""
+        try:
+            with self.lock():
+                self._read_changes()
+                outcomes, changed, deleted = self._run_on_loop(partial(self._run_mutations, group), loop)
+                if changed or deleted:
+                    self.flush(changed, deleted)
+            self.stats['groups'] += 1
+            self.stats['mutations'] += len(group)
+        except Exception as e:
+            outcomes = [(False, e)] * len(group)
+        for (_, future), (ok, value) in zip(group, outcomes):
+            try:
+                future.get_loop().call_soon_threadsafe(self._resolve, future, ok, value)
+            except RuntimeError:
+                # Its loop is closed: nobody is waiting any more
+                pass
+
+    def _run_on_loop(self, func: Callable[[], Any], loop: asyncio.AbstractEventLoop) -> Any:
+        """Call func() on the loop and return its result, waiting with the
+        lock held; raises if the loop stops before func starts"""
+        result: Future = Future()
+
+        def run() -> None:
+            # False once the group gave up on this loop: it must not run
+            # after the lock is released
+            if not result.set_running_or_notify_cancel():
+                return
+            try:
+                result.set_result(func())
+            except BaseException as e:
+                result.set_exception(e)
+
+        loop.call_soon_threadsafe(run)
+        while True:
+            try:
+                return result.result(timeout=self.LOOP_CHECK_INTERVAL)
+            except FutureTimeoutError:
+                # cancel() fails once run() started, which then finishes soon
+                if not loop.is_running() and result.cancel():
+                    raise RuntimeError("The event loop stopped before the write group ran")
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, ok: bool, value: Any) -> None:
+        # A caller may have been cancelled meanwhile
+        if future.done():
+            return
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def _run_mutations(self, group):
+        self._apply_unapplied()
+        outcomes = []
+        self.active = True
+        try:
+            for mutation, _ in group:
+                try:
+                    outcomes.append((True, mutation()))
+                except Exception as e:
+                    outcomes.append((False, e))
+        finally:
+            self.active = False
+            changed, deleted = list(self._changed.values()), list(self._deleted)
+            self._changed, self._deleted = {}, {}
+        return outcomes, changed, deleted
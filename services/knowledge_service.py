@@ -77,6 +77,36 @@ class KnowledgeService:
         
         return doc_id
 
+    async def add_knowledge_batch(self,
+                                  items: List[Dict[str, Any]],
+                                  batch_size: int = 64) -> List[str]:
+        """Add several entries at once: one encode call, one index update and one save.
+
+        Each item is a dict with 'content' and 'source', and optionally
+        'doc_id' and 'metadata' as in add_knowledge.
+        """
+        if not items:
+            return []
+        embeddings = self.model.encode([item['content'] for item in items], batch_size=batch_size)
+
+        now = datetime.now().isoformat()
+        doc_ids = []
+        for item, embedding in zip(items, embeddings):
+            doc_id = item.get('doc_id') or f"k_{now}_{len(self.metadata)}"
+            self.metadata[doc_id] = {
+                "content": item['content'],
+                "source": item['source'],
+                "timestamp": now,
+                "metadata": item.get('metadata') or {}
+            }
+            self.stored_embeddings[doc_id] = embedding
+            doc_ids.append(doc_id)
+
+        self.index.add(np.array(embeddings))
+        self._save_index()
+
+        return doc_ids
+
     async def search_knowledge(self, 
                              query: str,
                              k: int = 5,
@@ -0,0 +1,204 @@
+from typing import Dict, Optional, Union
+from array import array
+from datetime import datetime
+import mmap
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+# Each resolution is a fixed-size ring of buckets stored column by column in
+# its own file, so a time range maps to at most two contiguous slices per column.
+# The file name carries the capacity: workers configured with different
+# retentions keep separate rings instead of resetting each other's.
+COLUMNS = ('bucket_start', 'interactions', 'errors', 'latency_count', 'latency_sum_us', 'latency_max_us')
+RESOLUTIONS = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+# Number of buckets kept per resolution: 7 days, 90 days and 5 years
+DEFAULT_RETENTION = {
+    'minute': 7 * 24 * 60,
+    'hour': 90 * 24,
+    'day': 5 * 366
+}
+MAGIC = 0x4C55434955535231  # "LUCIUSR1"
+HEADER_WORDS = 4
+
+Timestamp = Union[datetime, float, int]
+
+
+def _lock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def _unlock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _to_epoch(value: Timestamp) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class RollupRing:
+    """A memory-mapped ring of fixed-width time buckets for one resolution"""
+
+    def __init__(self, path: str, bucket_seconds: int, capacity: int):
+        self.path = path
+        self.bucket_seconds = bucket_seconds
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        size = (HEADER_WORDS + len(COLUMNS) * capacity) * 8
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _lock_file(fd)
+            try:
+                header_ok = False
+                if os.fstat(fd).st_size == size:
+                    header = memoryview(os.pread(fd, HEADER_WORDS * 8, 0)).cast('q')
+                    header_ok = tuple(header) == (MAGIC, 1, bucket_seconds, capacity)
+                if not header_ok:
+                    # New file, or one of an older layout: it cannot be reused
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                self._mmap = mmap.mmap(fd, size)
+                self._words = memoryview(self._mmap).cast('q')
+                if not header_ok:
+                    self._words[0:HEADER_WORDS] = array('q', (MAGIC, 1, bucket_seconds, capacity))
+            finally:
+                _unlock_file(fd)
+        finally:
+            os.close(fd)
+        self._fd = os.open(path, os.O_RDWR)
+
+    def _column(self, name: str) -> int:
+        return HEADER_WORDS + COLUMNS.index(name) * self.capacity
+
+    def record(self, timestamp: float, interactions: int = 0, errors: int = 0,
+               latency_us: Optional[int] = None) -> None:
+        """Add an observation to the bucket containing timestamp"""
+        bucket = int(timestamp // self.bucket_seconds)
+        start = bucket * self.bucket_seconds
+        slot = bucket % self.capacity
+        words = self._words
+        with self._lock:
+            # Other workers write to the same ring, so each update holds the file lock
+            _lock_file(self._fd)
+            try:
+                stored = words[self._column('bucket_start') + slot]
+                if stored > start:
+                    # A late observation whose bucket was already overwritten
+                    return
+                if stored < start:
+                    # Slot still holds a bucket that fell out of retention
+                    for name in COLUMNS[1:]:
+                        words[self._column(name) + slot] = 0
+                    words[self._column('bucket_start') + slot] = start
+                words[self._column('interactions') + slot] += interactions
+                words[self._column('errors') + slot] += errors
+                if latency_us is not None:
+                    words[self._column('latency_count') + slot] += 1
+                    words[self._column('latency_sum_us') + slot] += latency_us
+                    max_index = self._column('latency_max_us') + slot
+                    if latency_us > words[max_index]:
+                        words[max_index] = latency_us
+            finally:
+                _unlock_file(self._fd)
+
+    def query(self, start: float, end: float) -> Dict[str, array]:
+        """Return the buckets in [start, end) as one int64 array per column"""
+        first = int(start // self.bucket_seconds)
+        last = int(-(-end // self.bucket_seconds))  # ceil
+        # Buckets older than the retention window have been overwritten
+        first = max(first, last - self.capacity)
+        result = {name: array('q') for name in COLUMNS}
+        if last <= first:
+            return result
+
+        # The range covers at most two contiguous runs of the ring
+        segments = []
+        begin = first % self.capacity
+        count = last - first
+        if begin + count <= self.capacity:
+            segments.append((begin, begin + count))
+        else:
+            segments.append((begin, self.capacity))
+            segments.append((0, begin + count - self.capacity))
+        for name in COLUMNS:
+            offset = self._column(name)
+            for lo, hi in segments:
+                result[name].frombytes(self._words[offset + lo:offset + hi].tobytes())
+
+        # Drop slots that hold stale buckets or were never written
+        expected = first * self.bucket_seconds
+        starts = result['bucket_start']
+        keep = [i for i in range(len(starts)) if starts[i] == expected + i * self.bucket_seconds]
+        if len(keep) != len(starts):
+            for name in COLUMNS:
+                column = result[name]
+                result[name] = array('q', (column[i] for i in keep))
+        return result
+
+    def close(self) -> None:
+        self._words.release()
+        self._mmap.close()
+        os.close(self._fd)
+
+
+class MetricsRollupStore:
+    """Per-minute, per-hour and per-day rollups of interactions, errors and latency"""
+
+    def __init__(self, base_path: str = "data/rollups",
+                 retention: Optional[Dict[str, int]] = None):
+        self.base_path = base_path
+        os.makedirs(base_path, exist_ok=True)
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.rings = {
+            resolution: RollupRing(
+                os.path.join(base_path, f"{resolution}-{self.retention[resolution]}.bin"),
+                bucket_seconds,
+                self.retention[resolution]
+            )
+            for resolution, bucket_seconds in RESOLUTIONS.items()
+        }
+
+    def record(self, interactions: int = 0, errors: int = 0,
+               latency_seconds: Optional[float] = None,
+               timestamp: Optional[Timestamp] = None) -> None:
+        """Add an observation to every resolution"""
+        now = _to_epoch(timestamp) if timestamp is not None else time.time()
+        latency_us = int(latency_seconds * 1_000_000) if latency_seconds is not None else None
+        for ring in self.rings.values():
+            ring.record(now, interactions, errors, latency_us)
+
+    def query(self, resolution: str, start: Timestamp, end: Timestamp) -> Dict[str, array]:
+        """Get the buckets of a resolution between start (inclusive) and end (exclusive)"""
+        if resolution not in self.rings:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        return self.rings[resolution].query(_to_epoch(start), _to_epoch(end))
+
+    def close(self) -> None:
+        for ring in self.rings.values():
+            ring.close()
+
+
+_stores: Dict[str, MetricsRollupStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_rollup_store(base_path: str = "data/rollups") -> MetricsRollupStore:
+    """Return the process-wide rollup store for a directory"""
+    with _stores_lock:
+        store = _stores.get(base_path)
+        if store is None:
+            store = _stores[base_path] = MetricsRollupStore(base_path)
+        return store
@@ -4,8 +4,17 @@ import json
 import os
 import asyncio
 from collections import deque
+from services.shared_metrics import get_shared_store, SharedMetricsStore
+from services.metrics_rollups import get_rollup_store, Timestamp
+from services.tracing import Span
 
 class MetricsService:
+    # should_throttle limits: cognitive load (0-1), and errors per
+    # interaction once the last hour has at least THROTTLE_MIN_INTERACTIONS
+    THROTTLE_COGNITIVE_LOAD = 0.8
+    THROTTLE_ERROR_RATIO = 0.25
+    THROTTLE_MIN_INTERACTIONS = 20
+
     def __init__(self):
         self.metrics_file = "data/metrics.json"
         self.metrics: Dict[str, Any] = {
@@ -29,6 +38,19 @@ class MetricsService:
         }
         # Keep last hour of interactions in memory
         self.recent_interactions = deque(maxlen=1000)
+        # Counters shared by every gunicorn worker
+        self.shared_store = get_shared_store()
+        # Long-term per-minute/hour/day history
+        self.rollups = get_rollup_store()
+        # Per-span timing stats and the most recent request trace trees
+        self.span_stats: Dict[str, Dict[str, int]] = {}
+        self.recent_traces = deque(maxlen=100)
+        # Adaptive concurrency limiters whose state is exported with the status
+        self.limiters: Dict[str, Any] = {}
+        # Fair queues in front of agent work; their backlog feeds the cognitive load
+        self.queues: Dict[str, Any] = {}
+        # Caches whose hit/miss/eviction counters are exported with the status
+        self.caches: Dict[str, Any] = {}
         self._load_metrics()
         
     def _load_metrics(self) -> None:
@@ -52,12 +74,12 @@ class MetricsService:
         now = datetime.now()
         interaction['timestamp'] = now.isoformat()
         self.recent_interactions.append(interaction)
+        self.shared_store.increment('interactions')
+        self.rollups.record(interactions=1, timestamp=now)
         
-        # Update interactions per hour
-        hour_ago = now - timedelta(hours=1)
-        recent_count = sum(1 for i in self.recent_interactions 
-                         if datetime.fromisoformat(i['timestamp']) > hour_ago)
-        self.metrics['cognitive_load']['interactions_per_hour'] = recent_count
+        # Update interactions per hour across all workers
+        deployment = self.shared_store.snapshot()
+        self.metrics['cognitive_load']['interactions_per_hour'] = deployment['last_hour']['interactions']
         
         # Update complexity score (0-1)
         complexity = interaction.get('complexity', 0.5)
@@ -90,13 +112,23 @@ class MetricsService:
         
         # Update task count
         stats['tasks_completed'] += 1
+        self.shared_store.increment('tasks_completed')
+        if task.get('handoff_success') is False:
+            self.shared_store.increment('handoff_failures')
         
         # Update processing time
-        if 'start_time' in task and 'end_time' in task:
+        processing_time = None
+        if 'duration_ns' in task:
+            processing_time = task['duration_ns'] / 1_000_000_000
+        elif 'start_time' in task and 'end_time' in task:
             processing_time = (
                 datetime.fromisoformat(task['end_time']) - 
                 datetime.fromisoformat(task['start_time'])
             ).total_seconds()
+        
+        if processing_time is not None:
+            self.shared_store.observe('task_latency_ms', processing_time * 1000)
+            self.rollups.record(latency_seconds=processing_time)
             
             if stats['avg_processing_time'] == 0:
                 stats['avg_processing_time'] = processing_time
@@ -128,11 +160,11 @@ class MetricsService:
                 self.metrics['system_health']['last_errors'][-100:]
             )
         
-        # Update error rate (errors per hour)
-        hour_ago = now - timedelta(hours=1)
-        recent_errors = [e for e in self.metrics['system_health']['last_errors']
-                        if datetime.fromisoformat(e['timestamp']) > hour_ago]
-        self.metrics['system_health']['error_rate'] = len(recent_errors)
+        # Update error rate (errors per hour across all workers)
+        self.shared_store.increment('errors')
+        self.rollups.record(errors=1, timestamp=now)
+        deployment = self.shared_store.snapshot()
+        self.metrics['system_health']['error_rate'] = deployment['last_hour']['errors']
         
         await self._save_metrics_async()
 
@@ -144,7 +176,10 @@ class MetricsService:
         # Calculate current metrics
         status = {
             'cognitive_load': {
+                # Combined score should_throttle compares with THROTTLE_COGNITIVE_LOAD
+                'score': self.get_cognitive_load(),
                 'current_load': self.metrics['cognitive_load']['interactions_per_hour'] / 60.0,
+                'queue_pressure': self.get_queue_pressure(),
                 'complexity': self.metrics['cognitive_load']['complexity_score'],
                 'override_rate': self.metrics['cognitive_load']['override_rate']
             },
@@ -153,7 +188,26 @@ class MetricsService:
                 'response_time': self.metrics['system_health']['response_time'],
                 'success_rate': self.metrics['system_health']['success_rate']
             },
-            'autonomo_status': {}
+            'autonomo_status': {},
+            'deployment': self.get_deployment_metrics(),
+            'spans': {
+                name: {
+                    'count': stats['count'],
+                    'avg_ms': stats['total_ns'] / stats['count'] / 1_000_000,
+                    'max_ms': stats['max_ns'] / 1_000_000,
+                    'errors': stats['errors']
+                }
+                for name, stats in self.span_stats.items()
+            },
+            'concurrency': {
+                name: limiter.snapshot() for name, limiter in self.limiters.items()
+            },
+            'queues': {
+                name: queue.snapshot() for name, queue in self.queues.items()
+            },
+            'caches': {
+                name: cache.snapshot() for name, cache in self.caches.items()
+            }
         }
         
         # Add autonomo stats
@@ -166,6 +220,65 @@ class MetricsService:
         
         return status
 
+    def register_limiter(self, limiter: Any) -> None:
+        """Export a concurrency limiter's state with the system status"""
+        self.limiters[limiter.name] = limiter
+
+    def register_queue(self, queue: Any) -> None:
+        """Export a fair queue's depth and include it in the cognitive load"""
+        self.queues[queue.name] = queue
+
+    def register_cache(self, cache: Any) -> None:
+        """Export a cache's size and hit/miss/eviction counters with the system status"""
+        self.caches[cache.name] = cache
+
+    def get_queue_pressure(self) -> float:
+        """Highest backlog (0-1) among the registered fair queues"""
+        return max((queue.pressure() for queue in self.queues.values()), default=0.0)
+
+    def record_throttled(self) -> None:
+        """Count a request rejected by a limiter"""
+        self.shared_store.increment('throttled')
+
+    def record_span(self, span: Span) -> None:
+        """Record a finished span; root spans also keep their trace tree"""
+        duration_ns = span.duration_ns
+        stats = self.span_stats.get(span.name)
+        if stats is None:
+            stats = self.span_stats[span.name] = {'count': 0, 'total_ns': 0, 'max_ns': 0, 'errors': 0}
+        stats['count'] += 1
+        stats['total_ns'] += duration_ns
+        if duration_ns > stats['max_ns']:
+            stats['max_ns'] = duration_ns
+        if span.error:
+            stats['errors'] += 1
+        if span.parent is None:
+            self.recent_traces.append(span.to_dict())
+
+    def get_recent_traces(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the trace trees of the most recent requests"""
+        return list(self.recent_traces)[-limit:]
+
+    def get_deployment_metrics(self) -> Dict[str, Any]:
+        """Get metrics aggregated over every worker of the deployment"""
+        deployment = self.shared_store.snapshot()
+        latency = deployment['histograms']['task_latency_ms']
+        deployment['task_latency_ms'] = {
+            'p50': SharedMetricsStore.percentile(latency, 0.5),
+            'p95': SharedMetricsStore.percentile(latency, 0.95),
+            'avg': latency['sum_ms'] / latency['count'] if latency['count'] else None
+        }
+        return deployment
+
+    def query_history(self, resolution: str, start: Timestamp, end: Timestamp) -> Dict[str, Any]:
+        """Get rolled-up history for a time range.
+
+        resolution is 'minute', 'hour' or 'day'. Columns are returned as compact
+        int64 arrays (bucket_start in epoch seconds, interactions, errors,
+        latency_count, latency_sum_us, latency_max_us).
+        """
+        return self.rollups.query(resolution, start, end)
+
     async def _save_metrics_async(self) -> None:
         """Save metrics asynchronously"""
         loop = asyncio.get_event_loop()
@@ -174,38 +287,44 @@ class MetricsService:
     def get_cognitive_load(self) -> float:
         """Get current cognitive load (0-1)"""
         # Combine different factors into a single score
-        interactions_weight = 0.4
-        complexity_weight = 0.4
-        override_weight = 0.2
+        interactions_weight = 0.35
+        complexity_weight = 0.35
+        override_weight = 0.15
+        queue_weight = 0.15
         
         interactions_score = min(1.0, self.metrics['cognitive_load']['interactions_per_hour'] / 60.0)
         complexity_score = self.metrics['cognitive_load']['complexity_score']
         override_score = self.metrics['cognitive_load']['override_rate']
+        queue_score = self.get_queue_pressure()
         
         return (
             interactions_weight * interactions_score +
             complexity_weight * complexity_score +
-            override_weight * override_score
+            override_weight * override_score +
+            queue_weight * queue_score
         )
 
     async def should_throttle(self) -> bool:
-        """Determine if we should throttle interactions"""
-        cognitive_load = self.get_cognitive_load()
-        error_rate = self.metrics['system_health']['error_rate']
+        """Determine if we should throttle interactions.
+
+        Rates are those of the whole deployment over the last hour, from
+        the shared store.
+        """
+        deployment = self.shared_store.snapshot()
+        interactions = deployment['last_hour']['interactions']
+        errors = deployment['last_hour']['errors']
+        self.metrics['cognitive_load']['interactions_per_hour'] = interactions
+        self.metrics['system_health']['error_rate'] = errors
         
         # Throttle if:
-        # 1. Cognitive load is too high (>80%)
-        # 2. Error rate is too high (>5 errors/hour)
-        # 3. Any autonomo is overloaded (>90% load)
-        
-        if cognitive_load > 0.8:
-            return True
-            
-        if error_rate > 5:
-            return True
-            
-        for autonomo, stats in self.metrics['autonomo_stats'].items():
-            if stats['tasks_completed'] > 90:  # More than 90 tasks/hour
-                return True
-                
-        return False
+        # 1. Cognitive load is too high
+        # 2. Too many of the recent interactions failed (a ratio, so turning
+        #    requests away lets it recover)
+        throttle = (
+            self.get_cognitive_load() > self.THROTTLE_COGNITIVE_LOAD
+            or (interactions >= self.THROTTLE_MIN_INTERACTIONS
+                and errors > self.THROTTLE_ERROR_RATIO * interactions)
+        )
+        if throttle:
+            self.record_throttled()
+        return throttle
@@ -0,0 +1,121 @@
+from typing import Dict, Any, List, Tuple, Hashable, Iterable, Set
+import random
+import zlib
+
+# Mersenne prime for the (a * x + b) mod p hash family
+_PRIME = (1 << 61) - 1
+
+
+class MinHashIndex:
+    """Locality-sensitive index of small sets (e.g. a document's topics and tags).
+
+    Each set gets a MinHash signature of bands * rows values, and each band
+    of rows values is a bucket key, so two sets with Jaccard similarity s
+    share a bucket with probability 1 - (1 - s^rows)^bands. Lookups only
+    visit the buckets of the query's bands instead of every set. More
+    bands or fewer rows raise recall at the cost of more candidates;
+    `threshold()` is where that S-curve is steepest.
+
+    Signatures of the individual tokens are cached, and a set's signature
+    is their element-wise minimum.
+    """
+
+    def __init__(self, bands: int = 16, rows: int = 2, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        rng = random.Random(seed)
+        self._coefficients = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+                              for _ in range(bands * rows)]
+        self._token_signatures: Dict[str, Tuple[int, ...]] = {}
+        self.signatures: Dict[Hashable, Tuple[int, ...]] = {}
+        # One {band key: ids} dict per band
+        self.buckets: List[Dict[Tuple[int, ...], Set[Hashable]]] = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.signatures
+
+    def threshold(self) -> float:
+        """Similarity at which a pair becomes a candidate with ~50% probability"""
+        return (1 / self.bands) ** (1 / self.rows)
+
+    def _token_signature(self, token: str) -> Tuple[int, ...]:
+        signature = self._token_signatures.get(token)
+        if signature is None:
+            # crc32 rather than hash(): stable across processes
+            x = zlib.crc32(token.encode('utf-8'))
+            signature = tuple((a * x + b) % _PRIME for a, b in self._coefficients)
+            self._token_signatures[token] = signature
+        return signature
+
+    def signature(self, tokens: Iterable[str]) -> Tuple[int, ...]:
+        signatures = [self._token_signature(token) for token in set(tokens)]
+        if not signatures:
+            return ()
+        if len(signatures) == 1:
+            return signatures[0]
+        return tuple(map(min, *signatures))
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, ...]]:
+        rows = self.rows
+        return [signature[band * rows:(band + 1) * rows] for band in range(self.bands)]
+
+    def add(self, key: Hashable, tokens: Iterable[str]) -> None:
+        """Index a set (replacing the key's previous one); empty sets are not indexed"""
+        self.remove(key)
+        signature = self.signature(tokens)
+        if not signature:
+            return
+        self.signatures[key] = signature
+        for buckets, band_key in zip(self.buckets, self._band_keys(signature)):
+            bucket = buckets.get(band_key)
+            if bucket is None:
+                buckets[band_key] = {key}
+            else:
+                bucket.add(key)
+
+    def remove(self, key: Hashable) -> None:
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for buckets, band_key in zip(self.buckets, self._band_keys(signature)):
+            bucket = buckets[band_key]
+            bucket.discard(key)
+            if not bucket:
+                del buckets[band_key]
+
+    def load(self, items: Iterable[Tuple[Hashable, Iterable[str]]]) -> None:
+        """Replace the index contents with (key, tokens) pairs"""
+        self.signatures = {}
+        self.buckets = [{} for _ in range(self.bands)]
+        for key, tokens in items:
+            self.add(key, tokens)
+
+    def candidates(self, key: Hashable) -> Set[Hashable]:
+        """Keys sharing at least one band with key (excluding key itself)"""
+        signature = self.signatures.get(key)
+        if signature is None:
+            return set()
+        found = set()
+        for buckets, band_key in zip(self.buckets, self._band_keys(signature)):
+            found.update(buckets[band_key])
+        found.discard(key)
+        return found
+
+    def estimate(self, key: Hashable, other: Hashable) -> float:
+        """Jaccard similarity estimated from the signatures"""
+        a, b = self.signatures.get(key), self.signatures.get(other)
+        if not a or not b:
+            return 0.0
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = [len(bucket) for buckets in self.buckets for bucket in buckets.values()]
+        return {
+            'sets': len(self.signatures),
+            'buckets': len(sizes),
+            'largest_bucket': max(sizes, default=0),
+            'threshold': round(self.threshold(), 3)
+        }
@@ -0,0 +1,267 @@
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+import hashlib
+import lzma
+import mmap
+import os
+import struct
+import threading
+import zlib
+from services.file_lock import FileLock
+
+# Pack entry header: sha256 digest, codec, compressed length
+_HEADER = struct.Struct('>32sBI')
+# Index entry: sha256 digest, codec, offset of the compressed bytes, length
+_INDEX_ENTRY = struct.Struct('>32sBQI')
+
+CODECS = {
+    0: (lambda data, level: data, lambda data: data),
+    1: (lambda data, level: zlib.compress(data, level), zlib.decompress),
+    2: (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+CODEC_IDS = {'none': 0, 'zlib': 1, 'lzma': 2}
+
+
+def pack_blob(data: bytes, codec: int = 1, level: int = 6,
+              digest: Optional[str] = None) -> Tuple[str, int, bytes]:
+    """(digest, codec, compressed bytes) of a blob, ready for PackStore.add_packed"""
+    return (digest or hashlib.sha256(data).hexdigest(), codec, CODECS[codec][0](data, level))
+
+
+def unpack_blob(codec: int, compressed: bytes) -> bytes:
+    return CODECS[codec][1](compressed)
+
+
+class PackStore:
+    """Content-addressed blob store kept in one append-only pack file.
+
+    Blobs are keyed by the sha256 of their bytes, so storing the same
+    bytes twice keeps a single copy. Each entry in the pack is a header
+    (digest, codec, length) followed by the compressed bytes, and a side
+    index of fixed-size (digest, codec, offset, length) entries maps
+    digests to their position, so a read is a dict lookup plus a slice of
+    the memory-mapped pack and a decompress. The pack is written before
+    the index, and entries missing from the index after a crash are
+    recovered by scanning the pack tail on open. Loading checks that each
+    index entry points at its own header in the pack, so an index left
+    behind by a compaction that crashed is rebuilt from the pack instead.
+
+    `compact(keep)` rewrites the pack with only the given digests, and
+    `refresh()` picks up blobs written or compacted by other processes.
+    Methods may be called from several threads.
+    """
+
+    def __init__(self, path: str, compression: str = 'zlib', level: int = 6):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.codec = CODEC_IDS[compression]
+        self.level = level
+        self.file_lock = FileLock(f"{path}.lock")
+        # Guards the entries and the mapping against other threads
+        self._lock = threading.RLock()
+        # digest (hex) -> (codec, offset, length)
+        self.entries: Dict[str, Tuple[int, int, int]] = {}
+        self.size = 0
+        self._map: Optional[mmap.mmap] = None
+        # Index file state after this store's last load or write
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self.entries
+
+    def _load(self) -> None:
+        """Read the index, repairing it under the file lock: a writer in
+        another process is then never mid-append while its tail is cut off"""
+        with self.file_lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            for path in (self.path, self.index_path):
+                if not os.path.exists(path):
+                    open(path, 'ab').close()
+
+            self.entries = {}
+            indexed_end = 0
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % _INDEX_ENTRY.size
+            self.size = os.path.getsize(self.path)
+            view = self._view(self.size) if self.size else b''
+            for digest, codec, offset, length in _INDEX_ENTRY.iter_unpack(data[:usable]):
+                start = offset - _HEADER.size
+                if (start < 0 or offset + length > self.size
+                        or view[start:offset] != _HEADER.pack(digest, codec, length)):
+                    # An index older than its pack (a compaction crashed
+                    # between swapping the two): index the whole pack again
+                    self.entries, indexed_end, usable = {}, 0, 0
+                    break
+                self.entries[digest.hex()] = (codec, offset, length)
+                indexed_end = max(indexed_end, offset + length)
+            if usable != len(data) or indexed_end < self.size:
+                self.close()
+                self._recover(indexed_end, usable)
+            self._stamp = self._index_stamp()
+
+    def _index_stamp(self) -> Tuple[int, int, int]:
+        stat = os.stat(self.index_path)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def is_stale(self) -> bool:
+        """Whether another process changed the index since this store last loaded or wrote it"""
+        return self._index_stamp() != self._stamp
+
+    def refresh(self) -> bool:
+        """Reload the index if another process changed it since this store
+        last did; returns whether it was reloaded"""
+        with self.file_lock, self._lock:
+            if not self.is_stale():
+                return False
+            self.close()
+            self._load()
+            return True
+
+    def _recover(self, position: int, index_bytes: int) -> None:
+        """Index the pack entries written after the last complete index entry"""
+        recovered = []
+        with open(self.path, 'rb') as f:
+            f.seek(position)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                digest, codec, length = _HEADER.unpack(header)
+                if len(f.read(length)) < length:
+                    break
+                offset = position + _HEADER.size
+                recovered.append(_INDEX_ENTRY.pack(digest, codec, offset, length))
+                self.entries[digest.hex()] = (codec, offset, length)
+                position = offset + length
+        # Drop a torn tail from either file so appends start clean
+        with open(self.path, 'r+b') as f:
+            f.truncate(position)
+        with open(self.index_path, 'r+b') as f:
+            f.truncate(index_bytes)
+            f.seek(index_bytes)
+            f.write(b''.join(recovered))
+        self.size = position
+
+    def _view(self, end: int) -> mmap.mmap:
+        """Read-only map of the pack, remapped when it no longer covers `end`"""
+        if self._map is None or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def put(self, data: bytes) -> str:
+        """Store bytes (once per distinct content) and return their digest"""
+        return self.put_many([data])[0]
+
+    def put_many(self, blobs: Iterable[bytes]) -> List[str]:
+        """Store several blobs with one append to each file; returns their digests"""
+        digests = []
+        packed = {}
+        for data in blobs:
+            digest = hashlib.sha256(data).hexdigest()
+            digests.append(digest)
+            if digest not in self.entries and digest not in packed:
+                packed[digest] = pack_blob(data, self.codec, self.level, digest)
+        self.add_packed(packed.values())
+        return digests
+
+    def add_packed(self, packed: Iterable[Tuple[str, int, bytes]]) -> None:
+        """Append blobs compressed by pack_blob (e.g. in worker processes)"""
+        packed = [item for item in packed if item[0] not in self.entries]
+        if not packed:
+            return
+        with self.file_lock, self._lock:
+            external = self.is_stale()
+            entries, pack_chunks, index_chunks = {}, [], []
+            with open(self.path, 'ab') as f:
+                position = f.tell()
+                for digest, codec, compressed in packed:
+                    if digest in self.entries or digest in entries:
+                        continue
+                    raw_digest = bytes.fromhex(digest)
+                    offset = position + _HEADER.size
+                    pack_chunks.append(_HEADER.pack(raw_digest, codec, len(compressed)) + compressed)
+                    index_chunks.append(_INDEX_ENTRY.pack(raw_digest, codec, offset, len(compressed)))
+                    entries[digest] = (codec, offset, len(compressed))
+                    position = offset + len(compressed)
+                f.write(b''.join(pack_chunks))
+            with open(self.index_path, 'ab') as f:
+                f.write(b''.join(index_chunks))
+            if external:
+                # Another process wrote too: read its entries along with ours
+                self.close()
+                self._load()
+                return
+            self._stamp = self._index_stamp()
+            self.entries.update(entries)
+            self.size = position
+
+    def get_packed(self, digest: str) -> Optional[Tuple[int, bytes]]:
+        """Codec and compressed bytes of a blob, for unpack_blob elsewhere"""
+        with self._lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            codec, offset, length = entry
+            return codec, self._view(offset + length)[offset:offset + length]
+
+    def get(self, digest: str) -> Optional[bytes]:
+        packed = self.get_packed(digest)
+        return None if packed is None else unpack_blob(*packed)
+
+    def stored_size(self, digest: str) -> int:
+        """Bytes the blob takes in the pack, header included"""
+        entry = self.entries.get(digest)
+        return entry[2] + _HEADER.size if entry else 0
+
+    def compact(self, keep: Iterable[str]) -> int:
+        """Rewrite the pack with only the `keep` digests; returns the bytes reclaimed"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        tmp_index_path = f"{self.index_path}.{os.getpid()}.tmp"
+        entries = {}
+        with self.file_lock, self._lock:
+            if self.is_stale():
+                self.close()
+                self._load()
+            keep = [digest for digest in dict.fromkeys(keep) if digest in self.entries]
+            view = self._view(self.size) if self.size else None
+            with open(tmp_path, 'wb') as pack, open(tmp_index_path, 'wb') as index:
+                position = 0
+                for digest in keep:
+                    codec, offset, length = self.entries[digest]
+                    raw_digest = bytes.fromhex(digest)
+                    pack.write(_HEADER.pack(raw_digest, codec, length))
+                    pack.write(view[offset:offset + length])
+                    offset = position + _HEADER.size
+                    index.write(_INDEX_ENTRY.pack(raw_digest, codec, offset, length))
+                    entries[digest] = (codec, offset, length)
+                    position = offset + length
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            # The pack is swapped first; after a crash in between, the old
+            # index no longer matches the pack headers and _load rebuilds it
+            os.replace(tmp_path, self.path)
+            os.replace(tmp_index_path, self.index_path)
+            self._stamp = self._index_stamp()
+            reclaimed = self.size - position
+            self.entries = entries
+            self.size = position
+        return reclaimed
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {'blobs': len(self.entries), 'pack_bytes': self.size}
@@ -0,0 +1,147 @@
+from typing import Dict, Any, List, Optional
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+# Task statuses that count as finished
+DONE_STATUSES = ('completed', 'done')
+
+
+def _day(timestamp: Optional[str]) -> Optional[str]:
+    return timestamp[:10] if timestamp else None
+
+
+def _due_day(value: Any) -> Optional[str]:
+    """ISO day of a due date, parsed like the scheduler's parse_due_date;
+    None for values that are not ISO dates (e.g. '15/10/2026')"""
+    try:
+        return datetime.fromisoformat(value).date().isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def _bump(counter: Counter, key: Any, sign: int) -> None:
+    counter[key] += sign
+    if counter[key] <= 0:
+        del counter[key]
+
+
+class ProjectStats:
+    """Running totals of one project's tasks"""
+
+    def __init__(self):
+        self.total = 0
+        self.by_status: Counter = Counter()
+        self.by_priority: Counter = Counter()
+        # Due days (ISO) of open tasks, sorted, so overdue counts are a bisect
+        self.open_due_dates: List[str] = []
+        # Tasks created / completed per day, for the burndown
+        self.created_per_day: Counter = Counter()
+        self.completed_per_day: Counter = Counter()
+
+    @property
+    def completed(self) -> int:
+        return sum(self.by_status[status] for status in DONE_STATUSES)
+
+
+class ProjectAggregates:
+    """Per-project task statistics kept up to date on every task change.
+
+    TaskService reports each created, updated and deleted task, and only
+    the counters touched by the change are adjusted, so dashboard reads
+    never scan the tasks. The burndown is derived from how many tasks were
+    created and completed each day.
+    """
+
+    def __init__(self):
+        self.projects: Dict[Any, ProjectStats] = {}
+
+    def load(self, tasks: List[Dict[str, Any]]) -> None:
+        self.projects = {}
+        for task in tasks:
+            self._apply(task, 1)
+
+    def _apply(self, task: Dict[str, Any], sign: int) -> None:
+        """Add (sign=1) or subtract (sign=-1) a task's contribution"""
+        project_id = task.get('project_id')
+        if project_id is None:
+            return
+        stats = self.projects.get(project_id)
+        if stats is None:
+            stats = self.projects[project_id] = ProjectStats()
+
+        status = task.get('status')
+        stats.total += sign
+        _bump(stats.by_status, status, sign)
+        _bump(stats.by_priority, task.get('priority'), sign)
+        created = _day(task.get('created_at'))
+        if created:
+            _bump(stats.created_per_day, created, sign)
+        if status in DONE_STATUSES:
+            completed = _day(task.get('completed_at'))
+            if completed:
+                _bump(stats.completed_per_day, completed, sign)
+        else:
+            # Unparsable due dates are left out rather than counted overdue forever
+            due = _due_day(task.get('due_date'))
+            if due and sign > 0:
+                insort(stats.open_due_dates, due)
+            elif due:
+                position = bisect_left(stats.open_due_dates, due)
+                if position < len(stats.open_due_dates) and stats.open_due_dates[position] == due:
+                    del stats.open_due_dates[position]
+        if not stats.total:
+            del self.projects[project_id]
+
+    def task_created(self, task: Dict[str, Any]) -> None:
+        self._apply(task, 1)
+
+    def task_updated(self, previous: Dict[str, Any], task: Dict[str, Any]) -> None:
+        """Move a task's contribution from its previous field values to the new ones"""
+        self._apply(previous, -1)
+        self._apply(task, 1)
+
+    def task_deleted(self, task: Dict[str, Any]) -> None:
+        self._apply(task, -1)
+
+    def stats(self, project_id: Any, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Counts by status and priority, overdue tasks and completion percentage.
+
+        Open tasks are overdue from the day after their due date.
+        """
+        stats = self.projects.get(project_id) or ProjectStats()
+        today = (now or datetime.now()).date().isoformat()
+        completed = stats.completed
+        return {
+            'total_tasks': stats.total,
+            'by_status': dict(stats.by_status),
+            'by_priority': dict(stats.by_priority),
+            'completed': completed,
+            'open': stats.total - completed,
+            'overdue': bisect_left(stats.open_due_dates, today),
+            'completion_pct': round(100 * completed / stats.total, 1) if stats.total else 0.0
+        }
+
+    def burndown(self, project_id: Any, start: Optional[date] = None,
+                 end: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Open tasks at the end of each day from start (first task) to end (today)"""
+        stats = self.projects.get(project_id)
+        if stats is None or not stats.created_per_day:
+            return []
+        first_day = date.fromisoformat(min(stats.created_per_day))
+        start = start or first_day
+        end = end or date.today()
+
+        # Tasks opened and closed before the window start the running total
+        start_iso = start.isoformat()
+        remaining = sum(count for day, count in stats.created_per_day.items() if day < start_iso)
+        remaining -= sum(count for day, count in stats.completed_per_day.items() if day < start_iso)
+
+        series = []
+        day = start
+        while day <= end:
+            key = day.isoformat()
+            remaining += stats.created_per_day.get(key, 0) - stats.completed_per_day.get(key, 0)
+            series.append({'date': key, 'remaining': remaining})
+            day += timedelta(days=1)
+        return series
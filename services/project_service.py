@@ -1,34 +1,106 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, AsyncIterator, Iterable, Callable
 from datetime import datetime
-import json
-import os
+from functools import partial
+import asyncio
+from services.indexed_store import IndexedStore
+from services.record_storage import create_storage, VersionConflictError
+from services.fuzzy_index import FuzzyIndex
+from services.io_pool import get_io_pool, WriteBatcher
+
+# Fields with a secondary index for list_projects filters
+INDEXED_FIELDS = ('name', 'status', 'priority')
+# Fields kept sorted for range predicates and ordered pages
+RANGE_FIELDS = ('created_at', 'updated_at')
 
 class ProjectService:
-    def __init__(self):
+    def __init__(self, storage=None, task_service=None):
         self.projects_file = "data/projects.json"
-        self.projects: List[Dict[str, Any]] = []
+        # When linked, task statistics come from the TaskService aggregates
+        self.task_service = task_service
+        self.storage = storage or create_storage('projects', self.projects_file, INDEXED_FIELDS)
+        self.store = IndexedStore(INDEXED_FIELDS, range_fields=RANGE_FIELDS)
+        self._name_index: Optional[FuzzyIndex] = None
+        # Mutations run on the event loop; locking, reloading and saving on I/O threads
+        self.writes = WriteBatcher(get_io_pool(), self.storage.lock, self._flush_projects,
+                                   load_if_stale=self.storage.read_changes, apply=self._apply_changes)
         self._load_projects()
 
-    def _load_projects(self) -> None:
-        """Load projects from file"""
-        if os.path.exists(self.projects_file):
-            with open(self.projects_file, 'r') as f:
-                self.projects = json.load(f)
+    @property
+    def projects(self) -> List[Dict[str, Any]]:
+        """All projects in creation order"""
+        self._refresh()
+        return self.store.values()
+
+    def _refresh(self) -> None:
+        """Apply the projects other processes changed since we last looked,
+        in the calling thread. Coroutines await writes.refresh() instead,
+        which reads them on an I/O thread."""
+        self.writes.refresh_sync()
+
+    async def _write(self, mutation: Callable[..., Any], *args) -> Any:
+        """Run a mutation under the cross-process lock, on up-to-date projects,
+        and return once its changes are saved (see WriteBatcher)"""
+        return await self.writes.submit(partial(mutation, *args))
+
+    def _touch(self, project: Dict[str, Any], updates: Dict[str, Any] = None) -> None:
+        """Apply updates, bumping updated_at and the version"""
+        self.store.update(project['id'], {
+            **(updates or {}),
+            'updated_at': datetime.now().isoformat(),
+            'version': project.get('version', 0) + 1
+        })
+
+    def _load_projects(self, records: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Load projects from storage (or from records it returned)"""
+        self.store.load(self.storage.load() if records is None else records)
+        self._name_index = None
+
+    def _apply_changes(self, changes: Dict[str, Any]) -> None:
+        """Apply what storage.read_changes returned: every record (a full
+        reload) or just the projects other processes changed and deleted"""
+        if 'records' in changes:
+            self._load_projects(changes['records'])
+            return
+        for project_id in changes['deleted']:
+            if self.store.remove(project_id) is not None and self._name_index is not None:
+                self._name_index.remove(project_id)
+        for record in changes['changed']:
+            project = self.store.get(record['id'])
+            if project is None:
+                project = self.store.add(record)
+            else:
+                self.store.update(project['id'], record)
+            self._index_name(project)
+
+    @property
+    def name_index(self) -> FuzzyIndex:
+        """Trigram index over project names, built on first use"""
+        if self._name_index is None:
+            self._name_index = FuzzyIndex()
+            self._name_index.load((project['id'], project['name']) for project in self.store.values())
+        return self._name_index
+
+    def _index_name(self, project: Dict[str, Any]) -> None:
+        if self._name_index is not None:
+            self._name_index.add(project['id'], project['name'])
+
+    def _save_projects(self, changed: List[Dict[str, Any]] = (), deleted: List[int] = ()) -> None:
+        """Persist changed and deleted projects (with the rest of the write group, if any)"""
+        if self.writes.active:
+            self.writes.stage(changed, deleted)
         else:
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(self.projects_file), exist_ok=True)
-            self.projects = []
-            self._save_projects()
+            self._flush_projects(changed, deleted)
 
-    def _save_projects(self) -> None:
-        """Save projects to file"""
-        with open(self.projects_file, 'w') as f:
-            json.dump(self.projects, f, indent=2)
+    def _flush_projects(self, changed: List[Dict[str, Any]], deleted: List[int]) -> None:
+        self.storage.save(self.store, changed, deleted)
 
     async def create_project(self, project_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new project"""
+        return await self._write(self._create_project, project_data)
+
+    def _create_project(self, project_data: Dict[str, Any]) -> Dict[str, Any]:
         project = {
-            'id': len(self.projects) + 1,
+            'id': self.store.next_id(),
             'name': project_data['name'],
             'description': project_data.get('description', ''),
             'status': project_data.get('status', 'active'),
@@ -37,77 +109,121 @@ class ProjectService:
             'updated_at': datetime.now().isoformat(),
             'tasks': [],
             'team': [],
-            'metadata': {}
+            'metadata': {},
+            'version': 1
         }
         
-        self.projects.append(project)
-        self._save_projects()
+        self.store.add(project)
+        self._index_name(project)
+        self._save_projects(changed=[project])
         return project
 
     async def get_project(self, project_id: int) -> Optional[Dict[str, Any]]:
         """Get a project by ID"""
-        for project in self.projects:
-            if project['id'] == project_id:
-                return project
-        return None
-
-    async def update_project(self, project_id: int, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Update a project"""
-        for i, project in enumerate(self.projects):
-            if project['id'] == project_id:
-                self.projects[i].update(updates)
-                self.projects[i]['updated_at'] = datetime.now().isoformat()
-                self._save_projects()
-                return self.projects[i]
-        return None
+        await self.writes.refresh()
+        return self.store.get(project_id)
+
+    async def update_project(self, project_id: int, updates: Dict[str, Any],
+                             expected_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Update a project.
+
+        With expected_version, raises VersionConflictError unless the
+        project is still at the version the caller read.
+        """
+        return await self._write(self._update_project, project_id, updates, expected_version)
+
+    def _update_project(self, project_id: int, updates: Dict[str, Any],
+                        expected_version: Optional[int]) -> Optional[Dict[str, Any]]:
+        project = self.store.get(project_id)
+        if project is None:
+            return None
+        if expected_version is not None and project.get('version', 0) != expected_version:
+            raise VersionConflictError(
+                f"Project {project_id} is at version {project.get('version', 0)}, not {expected_version}")
+        self._touch(project, updates)
+        if 'name' in updates:
+            self._index_name(project)
+        self._save_projects(changed=[project])
+        return project
 
     async def delete_project(self, project_id: int) -> bool:
         """Delete a project"""
-        for i, project in enumerate(self.projects):
-            if project['id'] == project_id:
-                del self.projects[i]
-                self._save_projects()
-                return True
-        return False
+        return await self._write(self._delete_project, project_id)
+
+    def _delete_project(self, project_id: int) -> bool:
+        if self.store.remove(project_id) is None:
+            return False
+        if self._name_index is not None:
+            self._name_index.remove(project_id)
+        self._save_projects(deleted=[project_id])
+        return True
 
     async def list_projects(self, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """List all projects, optionally filtered"""
-        if not filters:
-            return self.projects
+        await self.writes.refresh()
+        return self.store.find(filters)
 
-        filtered_projects = []
-        for project in self.projects:
-            match = True
-            for key, value in filters.items():
-                if key in project and project[key] != value:
-                    match = False
-                    break
-            if match:
-                filtered_projects.append(project)
+    async def find_similar_projects(self, name: str, limit: int = 5,
+                                    threshold: float = 0.7) -> List[Dict[str, Any]]:
+        """Get projects whose names look like `name`, best first, as {'project', 'score'} dicts"""
+        await self.writes.refresh()
+        return [
+            {'project': self.store.get(project_id), 'score': score}
+            for project_id, score in self.name_index.similar(name, limit, threshold)
+        ]
 
-        return filtered_projects
+    async def query_projects(self, where: Optional[Dict[str, Any]] = None,
+                             order_by: Optional[Iterable[str]] = None,
+                             limit: Optional[int] = 50,
+                             cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get one page of projects matching compound predicates (see IndexedStore.query)"""
+        await self.writes.refresh()
+        projects, next_cursor = self.store.query(where, order_by, limit, cursor)
+        return {'items': projects, 'next_cursor': next_cursor}
+
+    async def iter_projects(self, where: Optional[Dict[str, Any]] = None,
+                            order_by: Optional[Iterable[str]] = None,
+                            batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream matching projects page by page, yielding to the event loop between pages"""
+        await self.writes.refresh()
+        for page in self.store.iter_query(where, order_by, batch_size):
+            for project in page:
+                yield project
+            await asyncio.sleep(0)
 
     async def add_task_to_project(self, project_id: int, task_id: int) -> bool:
         """Add a task to a project"""
-        for project in self.projects:
-            if project['id'] == project_id:
-                if task_id not in project['tasks']:
-                    project['tasks'].append(task_id)
-                    project['updated_at'] = datetime.now().isoformat()
-                    self._save_projects()
-                return True
-        return False
+        return await self._write(self._add_tasks_to_project, project_id, [task_id])
+
+    async def add_tasks_to_project(self, project_id: int, task_ids: List[int]) -> bool:
+        """Add several tasks to a project with a single save"""
+        return await self._write(self._add_tasks_to_project, project_id, task_ids)
+
+    def _add_tasks_to_project(self, project_id: int, task_ids: List[int]) -> bool:
+        project = self.store.get(project_id)
+        if project is None:
+            return False
+        existing = set(project['tasks'])
+        new_ids = [task_id for task_id in dict.fromkeys(task_ids) if task_id not in existing]
+        if new_ids:
+            project['tasks'].extend(new_ids)
+            self._touch(project)
+            self._save_projects(changed=[project])
+        return True
 
     async def add_team_member(self, project_id: int, user_id: str) -> bool:
         """Add a team member to a project"""
-        for project in self.projects:
-            if project['id'] == project_id:
-                if user_id not in project['team']:
-                    project['team'].append(user_id)
-                    project['updated_at'] = datetime.now().isoformat()
-                    self._save_projects()
-                return True
-        return False
+        return await self._write(self._add_team_member, project_id, user_id)
+
+    def _add_team_member(self, project_id: int, user_id: str) -> bool:
+        project = self.store.get(project_id)
+        if project is None:
+            return False
+        if user_id not in project['team']:
+            project['team'].append(user_id)
+            self._touch(project)
+            self._save_projects(changed=[project])
+        return True
 
     async def get_project_stats(self, project_id: int) -> Optional[Dict[str, Any]]:
         """Get project statistics"""
@@ -115,9 +231,19 @@ class ProjectService:
         if not project:
             return None
 
-        return {
+        stats = {
             'task_count': len(project['tasks']),
             'team_size': len(project['team']),
             'status': project['status'],
             'age_days': (datetime.now() - datetime.fromisoformat(project['created_at'])).days
         }
+        if self.task_service is not None:
+            stats.update(await self.task_service.get_project_stats(project_id))
+        return stats
+
+    async def get_project_burndown(self, project_id: int) -> List[Dict[str, Any]]:
+        """Get the daily burndown of the project's open tasks (needs a linked TaskService)"""
+        await self.writes.refresh()
+        if self.task_service is None or project_id not in self.store:
+            return []
+        return await self.task_service.get_burndown(project_id)
@@ -0,0 +1,399 @@
+from typing import Dict, Any, List, Iterable, Optional
+import json
+import os
+import sqlite3
+import threading
+from services.file_lock import FileLock
+
+
+class VersionConflictError(Exception):
+    """Raised when a record changed since the version the caller read"""
+
+
+def _stat_token(stat: os.stat_result) -> tuple:
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _file_token(path: str) -> Optional[tuple]:
+    """Identity of a file's current contents (None if it does not exist)"""
+    try:
+        return _stat_token(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+
+def _atomic_write_json(path: str, records: List[Dict[str, Any]]) -> None:
+    # Write a new file and swap it in: readers in other processes never see
+    # a half-written file, and the inode change marks it as modified
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(records, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class JSONRecordStorage:
+    """Stores all records of a service as one JSON list, rewritten on every save.
+
+    Several processes may share the file: writers hold `lock()` and the
+    inode/mtime/size of the file tells whether another process wrote it
+    since it was last loaded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file_lock = FileLock(f"{path}.lock")
+        self._token: Optional[tuple] = None
+
+    def lock(self) -> FileLock:
+        """Exclusive cross-process lock for a read-modify-write cycle"""
+        return self.file_lock
+
+    def is_stale(self) -> bool:
+        """Whether another process changed the file since the last load or save"""
+        return _file_token(self.path) != self._token
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load every record, creating an empty file if needed"""
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self._token = _stat_token(os.fstat(f.fileno()))
+                return json.load(f)
+        # Create directory if it doesn't exist
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._write([])
+        return []
+
+    def read_changes(self) -> Optional[Dict[str, Any]]:
+        """None if no other process wrote since the last load or save,
+        else {'records': every record} (see JournalRecordStorage.read_changes)"""
+        return {'records': self.load()} if self.is_stale() else None
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        _atomic_write_json(self.path, records)
+        self._token = _file_token(self.path)
+
+    def save(self, store, changed: Iterable[Dict[str, Any]] = (),
+             deleted: Iterable[Any] = ()) -> None:
+        """Persist the store (the whole file is rewritten)"""
+        self._write(store.values())
+
+    def close(self) -> None:
+        pass
+
+
+class JournalRecordStorage:
+    """Keeps the JSON file as a snapshot and appends each change to a journal.
+
+    A save appends one JSON line holding the changed and deleted records, so
+    its cost depends on the size of the change rather than of the store. Loading
+    replays the journal over the snapshot. Once the journal holds more than
+    `compact_every` entries it is folded into a fresh snapshot, written to a
+    temporary file and swapped in atomically before the journal is cleared.
+    """
+
+    def __init__(self, path: str, key: str = 'id', compact_every: int = 1000):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.key = key
+        self.compact_every = compact_every
+        self.journal_entries = 0
+        self.file_lock = FileLock(f"{path}.lock")
+        self._token: Optional[tuple] = None
+        # Journal bytes already applied; read_changes replays what follows
+        self._offset = 0
+
+    def lock(self) -> FileLock:
+        """Exclusive cross-process lock for a read-modify-write cycle"""
+        return self.file_lock
+
+    def _current_token(self) -> tuple:
+        return (_file_token(self.path), _file_token(self.journal_path))
+
+    def is_stale(self) -> bool:
+        """Whether another process changed the snapshot or journal since the last load or save"""
+        return self._current_token() != self._token
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load the snapshot and replay the journal on top of it.
+
+        Runs under the lock (re-entrant for callers already holding it): a
+        journal line without its newline is then a torn write from a
+        crash, never an append still in progress, and can be cut off.
+        """
+        with self.file_lock:
+            return self._load()
+
+    def _load(self) -> List[Dict[str, Any]]:
+        records: Dict[Any, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for record in json.load(f):
+                    records[record[self.key]] = record
+        else:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._write_snapshot([])
+
+        self.journal_entries = 0
+        self._offset = 0
+        for op in self._read_journal():
+            if op['op'] == 'put':
+                record = op['record']
+                records[record[self.key]] = record
+            else:
+                records.pop(op['id'], None)
+        self._token = self._current_token()
+        return list(records.values())
+
+    def _read_journal(self) -> Iterable[Dict[str, Any]]:
+        """Ops of the journal entries after the last one read (lock held)"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("incomplete line")
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append: cut it off so
+                    # later appends are not hidden behind it
+                    with open(self.journal_path, 'r+b') as journal:
+                        journal.truncate(self._offset)
+                    return
+                self._offset += len(line)
+                ops = entry['ops'] if entry['op'] == 'batch' else [entry]
+                self.journal_entries += len(ops)
+                yield from ops
+
+    def read_changes(self) -> Optional[Dict[str, Any]]:
+        """What other processes wrote since the last load, read or save.
+
+        None if nothing changed. When only new journal entries were
+        appended, just those are read and the result is {'changed':
+        records, 'deleted': ids}, so the cost follows the size of the
+        change. After a compaction (a new snapshot) it is {'records':
+        every record}, as load() returns them.
+        """
+        with self.file_lock:
+            if not self.is_stale():
+                return None
+            journal_size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+            if self._token is None or _file_token(self.path) != self._token[0] or journal_size < self._offset:
+                return {'records': self._load()}
+            changed: Dict[Any, Dict[str, Any]] = {}
+            deleted: Dict[Any, None] = {}
+            for op in self._read_journal():
+                if op['op'] == 'put':
+                    record = op['record']
+                    deleted.pop(record[self.key], None)
+                    changed[record[self.key]] = record
+                else:
+                    changed.pop(op['id'], None)
+                    deleted[op['id']] = None
+            self._token = self._current_token()
+            return {'changed': list(changed.values()), 'deleted': list(deleted)}
+
+    def _write_snapshot(self, records: List[Dict[str, Any]]) -> None:
+        _atomic_write_json(self.path, records)
+        self._token = self._current_token()
+
+    def save(self, store, changed: Iterable[Dict[str, Any]] = (),
+             deleted: Iterable[Any] = ()) -> None:
+        """Append the changes to the journal, compacting when it grows too long"""
+        ops = [{'op': 'put', 'record': record} for record in changed]
+        ops.extend({'op': 'del', 'id': record_id} for record_id in deleted)
+        if not ops:
+            return
+        # A multi-record change is one line, so a torn write drops it as a whole
+        entry = ops[0] if len(ops) == 1 else {'op': 'batch', 'ops': ops}
+        data = (json.dumps(entry) + '\n').encode('utf-8')
+        # One write on an O_APPEND descriptor: the line lands at the end in one piece
+        fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            written = os.write(fd, data)
+            # Callers hold the lock and are up to date, so this is the whole journal
+            self._offset = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if written != len(data):
+            raise OSError(f"Short write to {self.journal_path}: {written} of {len(data)} bytes")
+        self._token = self._current_token()
+        self.journal_entries += len(ops)
+        if self.journal_entries >= self.compact_every:
+            self.compact(store)
+
+    def compact(self, store) -> None:
+        """Fold the journal into a new snapshot"""
+        self._write_snapshot(store.values())
+        # Replaying the old journal over the new snapshot is harmless, so a
+        # crash between these two steps loses nothing
+        open(self.journal_path, 'w').close()
+        self._token = self._current_token()
+        self.journal_entries = 0
+        self._offset = 0
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteRecordStorage:
+    """Stores records as rows of a SQLite table.
+
+    Each record is kept as a JSON document plus one column per indexed
+    field, so the common filters have real SQL indexes. Saves only touch
+    the changed and deleted rows, all in one transaction. The database runs
+    in WAL mode so several gunicorn workers can read while one writes.
+    """
+
+    def __init__(self, path: str, table: str, indexed_fields: Iterable[str],
+                 migrate_from: Optional[str] = None):
+        self.path = path
+        self.table = table
+        self.indexed_fields = tuple(indexed_fields)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Saves may run on executor threads, so share one connection behind a lock
+        self._lock = threading.Lock()
+        # Serializes read-modify-write cycles of the in-memory copies across workers
+        self.file_lock = FileLock(f"{path}.{table}.lock")
+        self._data_version: Optional[int] = None
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+        columns = ', '.join(('id',) + self.indexed_fields + ('data',))
+        placeholders = ', '.join('?' * (len(self.indexed_fields) + 2))
+        self._upsert_sql = f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})"
+        self._delete_sql = f"DELETE FROM {table} WHERE id = ?"
+
+        if migrate_from and os.path.exists(migrate_from) and not self._migrated():
+            with self.file_lock:
+                if not self._migrated():
+                    self.migrate_from_json(migrate_from)
+
+    def _create_schema(self) -> None:
+        columns = ''.join(f", {field}" for field in self.indexed_fields)
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} (id INTEGER PRIMARY KEY{columns}, data TEXT NOT NULL)"
+        )
+        for field in self.indexed_fields:
+            self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.table}_{field} ON {self.table} ({field})"
+            )
+        # One row per table whose JSON data was imported, so a table emptied
+        # later is not filled again from the old file
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _migrated(self) -> bool:
+        with self._lock:
+            if self.connection.execute("SELECT 1 FROM meta WHERE key = ?",
+                                       (f"migrated:{self.table}",)).fetchone():
+                return True
+        # Databases migrated before the marker existed already hold the rows
+        return self.count() > 0
+
+    def _row(self, record: Dict[str, Any]) -> tuple:
+        values = []
+        for field in self.indexed_fields:
+            value = record.get(field)
+            # Only scalars go into the index columns; the document keeps the rest
+            values.append(value if isinstance(value, (str, int, float)) or value is None else None)
+        return (record['id'], *values, json.dumps(record))
+
+    def lock(self) -> FileLock:
+        """Exclusive cross-process lock for a read-modify-write cycle"""
+        return self.file_lock
+
+    def _read_data_version(self) -> int:
+        # Changes whenever another connection commits to the database
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def is_stale(self) -> bool:
+        """Whether another connection committed since the last load"""
+        with self._lock:
+            return self._read_data_version() != self._data_version
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load every record in id order"""
+        with self._lock:
+            self.connection.execute("BEGIN")
+            try:
+                self._data_version = self._read_data_version()
+                rows = self.connection.execute(f"SELECT data FROM {self.table} ORDER BY id").fetchall()
+            finally:
+                self.connection.execute("COMMIT")
+        return [json.loads(data) for (data,) in rows]
+
+    def read_changes(self) -> Optional[Dict[str, Any]]:
+        """None if no other connection committed since the last load, else
+        {'records': every record} (see JournalRecordStorage.read_changes)"""
+        return {'records': self.load()} if self.is_stale() else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self.connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def upsert_many(self, records: Iterable[Dict[str, Any]], deleted: Iterable[Any] = ()) -> None:
+        """Write and delete rows in a single transaction"""
+        rows = [self._row(record) for record in records]
+        deleted_ids = [(record_id,) for record_id in deleted]
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                if rows:
+                    self.connection.executemany(self._upsert_sql, rows)
+                if deleted_ids:
+                    self.connection.executemany(self._delete_sql, deleted_ids)
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def save(self, store, changed: Iterable[Dict[str, Any]] = (),
+             deleted: Iterable[Any] = ()) -> None:
+        """Persist only the records that changed"""
+        self.upsert_many(changed, deleted)
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """Import the records of a JSON store and mark the table as migrated;
+        returns how many were imported"""
+        with open(json_path, 'r') as f:
+            records = json.load(f)
+        rows = [self._row(record) for record in records]
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.executemany(self._upsert_sql, rows)
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                        (f"migrated:{self.table}", json_path))
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        return len(records)
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
+
+
+def create_storage(name: str, json_path: str, indexed_fields: Iterable[str],
+                   backend: Optional[str] = None):
+    """Build the storage backend selected by LUCIUS_STORAGE ('json', 'journal' or 'sqlite')"""
+    backend = backend or os.getenv('LUCIUS_STORAGE', 'json')
+    if backend == 'json':
+        return JSONRecordStorage(json_path)
+    if backend == 'journal':
+        return JournalRecordStorage(json_path)
+    if backend == 'sqlite':
+        db_path = os.getenv('LUCIUS_SQLITE_PATH', os.path.join(os.path.dirname(json_path), 'lucius.db'))
+        # The first start on SQLite imports the existing JSON data
+        return SQLiteRecordStorage(db_path, name, indexed_fields, migrate_from=json_path)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -4,6 +4,7 @@ from serpapi import GoogleSearch
 from bs4 import BeautifulSoup
 import requests
 import json
+from services.tracing import traced
 
 class SearchService:
     def __init__(self):
@@ -16,6 +17,7 @@ class SearchService:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
 
+    @traced()
     async def google_search(self, query: str, num_results: int = 5) -> List[Dict[str, Any]]:
         """Perform a Google search using SerpAPI"""
         try:
@@ -43,6 +45,7 @@ class SearchService:
 
 
 
+    @traced()
     async def extract_content(self, url: str) -> Optional[Dict[str, Any]]:
         """Extract main content from a webpage with metadata"""
         try:
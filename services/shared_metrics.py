@@ -0,0 +1,238 @@
+from typing import Dict, Any, Optional
+import mmap
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+# Layout of the shared file (every field is a signed 64-bit word):
+#   header:  magic, layout version, slot count, words per slot
+#   slots:   one per worker process, only ever written by the worker that owns it
+# A slot holds the owner pid, its last update time, the counters, the
+# histograms (buckets + count + sum in microseconds) and a ring of per-minute
+# interaction/error counts covering the last hour.
+MAGIC = 0x4C55434955534D31  # "LUCIUSM1"
+LAYOUT_VERSION = 1
+HEADER_WORDS = 4
+
+COUNTERS = ('interactions', 'errors', 'tasks_completed', 'handoff_failures', 'throttled')
+HISTOGRAMS = ('task_latency_ms',)
+# Upper bounds in milliseconds; one extra overflow bucket is kept after the last one
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+WINDOW_MINUTES = 60
+WINDOW_FIELDS = ('minute', 'interactions', 'errors')
+
+_SLOT_PID = 0
+_SLOT_UPDATED = 1
+_COUNTERS_OFFSET = 2
+_HISTOGRAM_WORDS = len(LATENCY_BUCKETS_MS) + 1 + 2  # buckets, overflow, count, sum_us
+_HISTOGRAMS_OFFSET = _COUNTERS_OFFSET + len(COUNTERS)
+_WINDOW_OFFSET = _HISTOGRAMS_OFFSET + len(HISTOGRAMS) * _HISTOGRAM_WORDS
+SLOT_WORDS = _WINDOW_OFFSET + WINDOW_MINUTES * len(WINDOW_FIELDS)
+
+
+def _pid_alive(pid: int) -> bool:
+    """Check whether a process with the given pid is still running"""
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedMetricsStore:
+    """Counters and histograms shared by every worker through a mmap'd file.
+
+    Each worker process claims its own slot and is the only writer of it, so
+    updates need no cross-process lock; a per-process lock only guards against
+    executor threads of the same worker. Readers aggregate all slots. Slots of
+    dead workers are reclaimed by new workers without resetting them, so
+    deployment totals survive worker restarts.
+    """
+
+    def __init__(self, path: str = "data/metrics.shm", max_workers: int = 64):
+        self.path = path
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._size = (HEADER_WORDS + max_workers * SLOT_WORDS) * 8
+        self._pid = 0
+        self._slot_base = 0
+        self._open()
+
+    def _open(self) -> None:
+        """Map the shared file, initialising it if needed"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            self._flock(fd, True)
+            try:
+                header_ok = False
+                if os.fstat(fd).st_size == self._size:
+                    header = os.pread(fd, HEADER_WORDS * 8, 0)
+                    words = memoryview(header).cast('q')
+                    header_ok = tuple(words) == (MAGIC, LAYOUT_VERSION, self.max_workers, SLOT_WORDS)
+                if not header_ok:
+                    # Unknown or outdated layout: start a fresh file
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self._size)
+                self._mmap = mmap.mmap(fd, self._size)
+                self._words = memoryview(self._mmap).cast('q')
+                if not header_ok:
+                    self._words[0] = MAGIC
+                    self._words[1] = LAYOUT_VERSION
+                    self._words[2] = self.max_workers
+                    self._words[3] = SLOT_WORDS
+                self._claim_slot()
+            finally:
+                self._flock(fd, False)
+        finally:
+            os.close(fd)
+
+    def _flock(self, fd: int, exclusive: bool) -> None:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_UN)
+
+    def _slot_bases(self) -> range:
+        return range(HEADER_WORDS, HEADER_WORDS + self.max_workers * SLOT_WORDS, SLOT_WORDS)
+
+    def _claim_slot(self) -> None:
+        """Claim a slot for the current process (caller holds the file lock)"""
+        pid = os.getpid()
+        free_base = None
+        for base in self._slot_bases():
+            owner = self._words[base + _SLOT_PID]
+            if owner == pid:
+                free_base = base
+                break
+            if free_base is None and (owner == 0 or not _pid_alive(owner)):
+                free_base = base
+        if free_base is None:
+            raise RuntimeError(
+                f"No free metrics slot in {self.path} (max_workers={self.max_workers})")
+        self._words[free_base + _SLOT_PID] = pid
+        self._slot_base = free_base
+        self._pid = pid
+
+    def _ensure_slot(self) -> int:
+        """Return our slot base, reclaiming one after a fork"""
+        if self._pid != os.getpid():
+            fd = os.open(self.path, os.O_RDWR)
+            try:
+                self._flock(fd, True)
+                try:
+                    self._claim_slot()
+                finally:
+                    self._flock(fd, False)
+            finally:
+                os.close(fd)
+        return self._slot_base
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        """Increment a shared counter"""
+        index = COUNTERS.index(counter)
+        now = time.time()
+        with self._lock:
+            base = self._ensure_slot()
+            self._words[base + _COUNTERS_OFFSET + index] += amount
+            if counter in WINDOW_FIELDS:
+                minute = int(now // 60)
+                entry = base + _WINDOW_OFFSET + (minute % WINDOW_MINUTES) * len(WINDOW_FIELDS)
+                if self._words[entry] != minute:
+                    self._words[entry] = minute
+                    for i in range(1, len(WINDOW_FIELDS)):
+                        self._words[entry + i] = 0
+                self._words[entry + WINDOW_FIELDS.index(counter)] += amount
+            self._words[base + _SLOT_UPDATED] = int(now)
+
+    def observe(self, histogram: str, value_ms: float) -> None:
+        """Record a value (in milliseconds) in a shared histogram"""
+        start = _HISTOGRAMS_OFFSET + HISTOGRAMS.index(histogram) * _HISTOGRAM_WORDS
+        bucket = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if value_ms <= bound:
+                bucket = i
+                break
+        with self._lock:
+            base = self._ensure_slot() + start
+            self._words[base + bucket] += 1
+            self._words[base + len(LATENCY_BUCKETS_MS) + 1] += 1
+            self._words[base + len(LATENCY_BUCKETS_MS) + 2] += int(value_ms * 1000)
+            self._words[self._slot_base + _SLOT_UPDATED] = int(time.time())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Aggregate every worker slot into deployment-wide metrics"""
+        current_minute = int(time.time() // 60)
+        counters = {name: 0 for name in COUNTERS}
+        histograms = {
+            name: {'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1), 'count': 0, 'sum_ms': 0.0}
+            for name in HISTOGRAMS
+        }
+        window = {name: 0 for name in WINDOW_FIELDS[1:]}
+        workers = 0
+        for base in self._slot_bases():
+            pid = self._words[base + _SLOT_PID]
+            if pid == 0:
+                continue
+            if _pid_alive(pid):
+                workers += 1
+            for i, name in enumerate(COUNTERS):
+                counters[name] += self._words[base + _COUNTERS_OFFSET + i]
+            for h, name in enumerate(HISTOGRAMS):
+                start = base + _HISTOGRAMS_OFFSET + h * _HISTOGRAM_WORDS
+                hist = histograms[name]
+                for b in range(len(LATENCY_BUCKETS_MS) + 1):
+                    hist['buckets'][b] += self._words[start + b]
+                hist['count'] += self._words[start + len(LATENCY_BUCKETS_MS) + 1]
+                hist['sum_ms'] += self._words[start + len(LATENCY_BUCKETS_MS) + 2] / 1000.0
+            for m in range(WINDOW_MINUTES):
+                entry = base + _WINDOW_OFFSET + m * len(WINDOW_FIELDS)
+                if current_minute - self._words[entry] < WINDOW_MINUTES:
+                    for i, name in enumerate(WINDOW_FIELDS[1:], start=1):
+                        window[name] += self._words[entry + i]
+        return {
+            'workers': workers,
+            'counters': counters,
+            'histograms': histograms,
+            'last_hour': window
+        }
+
+    @staticmethod
+    def percentile(histogram: Dict[str, Any], q: float) -> Optional[float]:
+        """Estimate a percentile (0-1) from aggregated histogram buckets"""
+        if not histogram['count']:
+            return None
+        target = q * histogram['count']
+        seen = 0
+        for i, count in enumerate(histogram['buckets']):
+            seen += count
+            if seen >= target:
+                return float(LATENCY_BUCKETS_MS[min(i, len(LATENCY_BUCKETS_MS) - 1)])
+        return float(LATENCY_BUCKETS_MS[-1])
+
+    def close(self) -> None:
+        """Release the mapping"""
+        self._words.release()
+        self._mmap.close()
+
+
+_stores: Dict[str, SharedMetricsStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_shared_store(path: str = "data/metrics.shm") -> SharedMetricsStore:
+    """Return the process-wide store for a path so every MetricsService shares one slot"""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = SharedMetricsStore(path)
+        return store
@@ -1,114 +1,442 @@
-from typing import Dict, Any, List, Optional
-from datetime import datetime
-import json
-import os
+from typing import Dict, Any, List, Optional, AsyncIterator, Iterable, Callable
+from datetime import date, datetime
+from functools import partial
+import asyncio
+from services.indexed_store import IndexedStore
+from services.record_storage import create_storage, VersionConflictError
+from services.dependency_graph import DependencyGraph, DependencyCycleError
+from services.fuzzy_index import FuzzyIndex
+from services.project_aggregates import ProjectAggregates, DONE_STATUSES
+from services.io_pool import get_io_pool, WriteBatcher
+
+# Fields with a secondary index; equality filters on them never scan all tasks
+INDEXED_FIELDS = ('name', 'assignee', 'project_id', 'status', 'priority')
+# Fields kept sorted for range predicates and ordered pages
+RANGE_FIELDS = ('due_date', 'created_at', 'updated_at')
+
+# listener(event, task, previous): event is 'created', 'updated' (previous
+# is the task before the change), 'deleted' or 'reloaded' (task is None)
+TaskListener = Callable[[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]], None]
 
 class TaskService:
-    def __init__(self):
+    def __init__(self, storage=None):
         self.tasks_file = "data/tasks.json"
-        self.tasks: List[Dict[str, Any]] = []
+        self.storage = storage or create_storage('tasks', self.tasks_file, INDEXED_FIELDS)
+        self.store = IndexedStore(INDEXED_FIELDS, range_fields=RANGE_FIELDS)
+        self.graph = DependencyGraph()
+        self._name_index: Optional[FuzzyIndex] = None
+        self.aggregates = ProjectAggregates()
+        self.listeners: List[TaskListener] = []
+        # Mutations run on the event loop; locking, reloading and saving on I/O threads
+        self.writes = WriteBatcher(get_io_pool(), self.storage.lock, self._flush_tasks,
+                                   load_if_stale=self.storage.read_changes, apply=self._apply_changes)
         self._load_tasks()
 
-    def _load_tasks(self) -> None:
-        """Load tasks from file"""
-        if os.path.exists(self.tasks_file):
-            with open(self.tasks_file, 'r') as f:
-                self.tasks = json.load(f)
+    @property
+    def tasks(self) -> List[Dict[str, Any]]:
+        """All tasks in creation order"""
+        self._refresh()
+        return self.store.values()
+
+    def _refresh(self) -> None:
+        """Apply the tasks other processes changed since we last looked, in
+        the calling thread. Coroutines await writes.refresh() instead, which
+        reads them on an I/O thread."""
+        self.writes.refresh_sync()
+
+    def reload_if_changed(self) -> None:
+        """Pick up tasks written by other processes or TaskService instances"""
+        self._refresh()
+
+    def add_listener(self, listener: TaskListener) -> None:
+        """Call listener after every task change (see TaskListener)"""
+        self.listeners.append(listener)
+
+    def _notify(self, event: str, task: Optional[Dict[str, Any]] = None,
+                previous: Optional[Dict[str, Any]] = None) -> None:
+        for listener in self.listeners:
+            try:
+                listener(event, task, previous)
+            except Exception as e:
+                print(f"Error in task listener: {e}")
+
+    async def _write(self, mutation: Callable[..., Any], *args) -> Any:
+        """Run a mutation under the cross-process lock, on up-to-date tasks,
+        and return once its changes are saved (see WriteBatcher)"""
+        return await self.writes.submit(partial(mutation, *args))
+
+    def _load_tasks(self, records: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Load tasks from storage (or from records it returned)"""
+        self.store.load(self.storage.load() if records is None else records)
+        for task in self.store.values():
+            if task.get('status') in DONE_STATUSES and not task.get('completed_at'):
+                # Tasks finished before completed_at existed: best guess
+                task['completed_at'] = task.get('updated_at')
+        self._build_graph()
+        self._name_index = None
+        self.aggregates.load(self.store.values())
+        self._notify('reloaded')
+
+    def _apply_changes(self, changes: Dict[str, Any]) -> None:
+        """Apply what storage.read_changes returned: every record (a full
+        reload) or just the tasks other processes changed and deleted,
+        reported to the listeners as the matching events"""
+        if 'records' in changes:
+            self._load_tasks(changes['records'])
+            return
+        for task_id in changes['deleted']:
+            task = self.store.remove(task_id)
+            if task is None:
+                continue
+            self.graph.remove_node(task_id)
+            self.aggregates.task_deleted(task)
+            if self._name_index is not None:
+                self._name_index.remove(task_id)
+            self._notify('deleted', task)
+
+        events = []
+        for record in changes['changed']:
+            task = self.store.get(record['id'])
+            if task is None:
+                task = self.store.add(record)
+                self.graph.add_node(task['id'])
+                self.aggregates.task_created(task)
+                self._index_name(task)
+                events.append(('created', task, None))
+            else:
+                # In place, so the task keeps its position and identity
+                previous = dict(task)
+                self.store.update(task['id'], record)
+                self.aggregates.task_updated(previous, task)
+                if task['name'] != previous['name']:
+                    self._index_name(task)
+                events.append(('updated', task, previous))
+        # Edges once every changed task is in the store
+        try:
+            for _, task, _ in events:
+                self._set_graph_dependencies(task['id'], task.get('dependencies', []))
+        except DependencyCycleError:
+            self._build_graph()
+        for event, task, previous in events:
+            self._notify(event, task, previous)
+
+    @property
+    def name_index(self) -> FuzzyIndex:
+        """Trigram index over task names, built on first use"""
+        if self._name_index is None:
+            self._name_index = FuzzyIndex()
+            self._name_index.load((task['id'], task['name']) for task in self.store.values())
+        return self._name_index
+
+    def _index_name(self, task: Dict[str, Any]) -> None:
+        if self._name_index is not None:
+            self._name_index.add(task['id'], task['name'])
+
+    def _build_graph(self) -> None:
+        """Rebuild the dependency graph from the stored tasks"""
+        self.graph = DependencyGraph()
+        for task in self.store.values():
+            self.graph.add_node(task['id'])
+        rejected = self.graph.load(
+            (task['id'], dep_id)
+            for task in self.store.values()
+            for dep_id in task.get('dependencies', [])
+            if dep_id in self.store
+        )
+        for task_id, dep_id in rejected:
+            print(f"Dependencia cíclica ignorada: tarea {task_id} -> {dep_id}")
+
+    def _set_graph_dependencies(self, task_id: int, dependency_ids: List[int]) -> None:
+        """Replace a task's edges, leaving the graph untouched if that creates a cycle"""
+        previous = set(self.graph.prerequisites.get(task_id, ()))
+        for dep_id in previous:
+            self.graph.remove_edge(task_id, dep_id)
+        try:
+            for dep_id in dependency_ids:
+                if dep_id in self.store:
+                    self.graph.add_edge(task_id, dep_id)
+        except DependencyCycleError:
+            for dep_id in list(self.graph.prerequisites[task_id]):
+                self.graph.remove_edge(task_id, dep_id)
+            for dep_id in previous:
+                self.graph.add_edge(task_id, dep_id)
+            raise
+
+    def _check_version(self, task: Dict[str, Any], expected_version: Optional[int]) -> None:
+        if expected_version is not None and task.get('version', 0) != expected_version:
+            raise VersionConflictError(
+                f"Task {task['id']} is at version {task.get('version', 0)}, not {expected_version}")
+
+    def _prepare_updates(self, task: Dict[str, Any], updates: Dict[str, Any], now: str) -> Dict[str, Any]:
+        """Add updated_at and the next version, and completed_at when the
+        status enters or leaves a done status"""
+        updates = {**updates, 'updated_at': now, 'version': task.get('version', 0) + 1}
+        if 'status' in updates:
+            was_done = task.get('status') in DONE_STATUSES
+            is_done = updates['status'] in DONE_STATUSES
+            if is_done and not was_done:
+                updates['completed_at'] = now
+            elif was_done and not is_done:
+                updates['completed_at'] = None
+        return updates
+
+    def _save_tasks(self, changed: List[Dict[str, Any]] = (), deleted: List[int] = ()) -> None:
+        """Persist changed and deleted tasks (with the rest of the write group, if any)"""
+        if self.writes.active:
+            self.writes.stage(changed, deleted)
         else:
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(self.tasks_file), exist_ok=True)
-            self.tasks = []
-            self._save_tasks()
+            self._flush_tasks(changed, deleted)
 
-    def _save_tasks(self) -> None:
-        """Save tasks to file"""
-        with open(self.tasks_file, 'w') as f:
-            json.dump(self.tasks, f, indent=2)
+    def _flush_tasks(self, changed: List[Dict[str, Any]], deleted: List[int]) -> None:
+        self.storage.save(self.store, changed, deleted)
 
     async def create_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new task"""
+        return await self._write(self._create_task, task_data)
+
+    def _create_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.now().isoformat()
+        status = task_data.get('status', 'pending')
         task = {
-            'id': len(self.tasks) + 1,
+            'id': self.store.next_id(),
             'name': task_data['name'],
             'description': task_data.get('description', ''),
-            'status': task_data.get('status', 'pending'),
+            'status': status,
             'priority': task_data.get('priority', 'medium'),
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat(),
+            'created_at': now,
+            'updated_at': now,
+            'completed_at': now if status in DONE_STATUSES else None,
             'due_date': task_data.get('due_date'),
             'assignee': task_data.get('assignee'),
             'project_id': task_data.get('project_id'),
             'dependencies': [],
-            'metadata': {}
+            'metadata': {},
+            'version': 1
         }
         
-        self.tasks.append(task)
-        self._save_tasks()
+        self.store.add(task)
+        self.graph.add_node(task['id'])
+        self._index_name(task)
+        self.aggregates.task_created(task)
+        self._save_tasks(changed=[task])
+        self._notify('created', task)
         return task
 
+    async def create_tasks(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create several tasks at once.
+
+        The whole batch is validated first; if any entry is invalid nothing
+        is created. Storage is written once for the batch.
+        """
+        invalid = [i for i, task_data in enumerate(batch) if not task_data.get('name')]
+        if invalid:
+            raise ValueError(f"Tasks without a name at positions {invalid}")
+        return await self._write(self._create_tasks, batch)
+
+    def _create_tasks(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        now = datetime.now().isoformat()
+        first_id = self.store.next_id()
+        tasks = [{
+            'id': first_id + i,
+            'name': task_data['name'],
+            'description': task_data.get('description', ''),
+            'status': task_data.get('status', 'pending'),
+            'priority': task_data.get('priority', 'medium'),
+            'created_at': now,
+            'updated_at': now,
+            'completed_at': now if task_data.get('status') in DONE_STATUSES else None,
+            'due_date': task_data.get('due_date'),
+            'assignee': task_data.get('assignee'),
+            'project_id': task_data.get('project_id'),
+            'dependencies': [],
+            'metadata': {},
+            'version': 1
+        } for i, task_data in enumerate(batch)]
+
+        for task in tasks:
+            self.store.add(task)
+            self.graph.add_node(task['id'])
+            self._index_name(task)
+            self.aggregates.task_created(task)
+        self._save_tasks(changed=tasks)
+        for task in tasks:
+            self._notify('created', task)
+        return tasks
+
+    async def update_tasks(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Apply several updates, each a dict with the task 'id' plus the fields to change.
+
+        Unknown ids, dependency cycles or an 'expected_version' that does
+        not match reject the whole batch. Storage is written once for the
+        batch.
+        """
+        return await self._write(self._update_tasks, batch)
+
+    def _update_tasks(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        missing = [item.get('id') for item in batch if item.get('id') not in self.store]
+        if missing:
+            raise ValueError(f"Tasks not found: {missing}")
+        for item in batch:
+            self._check_version(self.store.get(item['id']), item.get('expected_version'))
+
+        # Dependency changes are the only step that can fail, so apply them
+        # first and undo them if any of them would create a cycle
+        applied = []
+        try:
+            for item in batch:
+                if 'dependencies' in item:
+                    previous = list(self.graph.prerequisites[item['id']])
+                    self._set_graph_dependencies(item['id'], item['dependencies'])
+                    applied.append((item['id'], previous))
+        except DependencyCycleError:
+            for task_id, previous in reversed(applied):
+                self._set_graph_dependencies(task_id, previous)
+            raise
+
+        now = datetime.now().isoformat()
+        updated = {}
+        originals = {}
+        for item in batch:
+            updates = {key: value for key, value in item.items() if key not in ('id', 'expected_version')}
+            task = self.store.get(item['id'])
+            previous = dict(task)
+            originals.setdefault(item['id'], previous)
+            self.store.update(item['id'], self._prepare_updates(task, updates, now))
+            self.aggregates.task_updated(previous, task)
+            if 'name' in updates:
+                self._index_name(task)
+            updated[item['id']] = task
+        tasks = list(updated.values())
+        self._save_tasks(changed=tasks)
+        for task in tasks:
+            self._notify('updated', task, originals[task['id']])
+        return tasks
+
+    async def assign_tasks(self, assignments: Dict[int, str]) -> List[Dict[str, Any]]:
+        """Assign several tasks ({task_id: assignee}); unknown ids reject the whole batch"""
+        return await self.update_tasks([
+            {'id': task_id, 'assignee': assignee}
+            for task_id, assignee in assignments.items()
+        ])
+
     async def get_task(self, task_id: int) -> Optional[Dict[str, Any]]:
         """Get a task by ID"""
-        for task in self.tasks:
-            if task['id'] == task_id:
-                return task
-        return None
-
-    async def update_task(self, task_id: int, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Update a task"""
-        for i, task in enumerate(self.tasks):
-            if task['id'] == task_id:
-                self.tasks[i].update(updates)
-                self.tasks[i]['updated_at'] = datetime.now().isoformat()
-                self._save_tasks()
-                return self.tasks[i]
-        return None
+        await self.writes.refresh()
+        return self.store.get(task_id)
+
+    async def update_task(self, task_id: int, updates: Dict[str, Any],
+                          expected_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Update a task.
+
+        With expected_version, raises VersionConflictError unless the task
+        is still at the version the caller read.
+        """
+        return await self._write(self._update_task, task_id, updates, expected_version)
+
+    def _update_task(self, task_id: int, updates: Dict[str, Any],
+                     expected_version: Optional[int]) -> Optional[Dict[str, Any]]:
+        task = self.store.get(task_id)
+        if task is None:
+            return None
+        self._check_version(task, expected_version)
+        if 'dependencies' in updates:
+            self._set_graph_dependencies(task_id, updates['dependencies'])
+        previous = dict(task)
+        self.store.update(task_id, self._prepare_updates(task, updates, datetime.now().isoformat()))
+        self.aggregates.task_updated(previous, task)
+        if 'name' in updates:
+            self._index_name(task)
+        self._save_tasks(changed=[task])
+        self._notify('updated', task, previous)
+        return task
 
     async def delete_task(self, task_id: int) -> bool:
         """Delete a task"""
-        for i, task in enumerate(self.tasks):
-            if task['id'] == task_id:
-                del self.tasks[i]
-                self._save_tasks()
-                return True
-        return False
+        return await self._write(self._delete_task, task_id)
+
+    def _delete_task(self, task_id: int) -> bool:
+        task = self.store.remove(task_id)
+        if task is None:
+            return False
+        self.graph.remove_node(task_id)
+        self.aggregates.task_deleted(task)
+        if self._name_index is not None:
+            self._name_index.remove(task_id)
+        self._save_tasks(deleted=[task_id])
+        self._notify('deleted', task)
+        return True
 
     async def list_tasks(self, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """List all tasks, optionally filtered"""
-        if not filters:
-            return self.tasks
+        await self.writes.refresh()
+        return self.store.find(filters)
 
-        filtered_tasks = []
-        for task in self.tasks:
-            match = True
-            for key, value in filters.items():
-                if key in task and task[key] != value:
-                    match = False
-                    break
-            if match:
-                filtered_tasks.append(task)
+    async def find_similar_tasks(self, name: str, limit: int = 5,
+                                 threshold: float = 0.7) -> List[Dict[str, Any]]:
+        """Get tasks whose names look like `name`, best first, as {'task', 'score'} dicts"""
+        await self.writes.refresh()
+        return [
+            {'task': self.store.get(task_id), 'score': score}
+            for task_id, score in self.name_index.similar(name, limit, threshold)
+        ]
 
-        return filtered_tasks
+    async def query_tasks(self, where: Optional[Dict[str, Any]] = None,
+                          order_by: Optional[Iterable[str]] = None,
+                          limit: Optional[int] = 50,
+                          cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get one page of tasks matching compound predicates.
+
+        See IndexedStore.query for the predicate and order syntax; pass the
+        returned next_cursor back to get the following page.
+        """
+        await self.writes.refresh()
+        tasks, next_cursor = self.store.query(where, order_by, limit, cursor)
+        return {'items': tasks, 'next_cursor': next_cursor}
+
+    async def iter_tasks(self, where: Optional[Dict[str, Any]] = None,
+                         order_by: Optional[Iterable[str]] = None,
+                         batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream matching tasks page by page, yielding to the event loop between pages"""
+        await self.writes.refresh()
+        for page in self.store.iter_query(where, order_by, batch_size):
+            for task in page:
+                yield task
+            await asyncio.sleep(0)
 
     async def assign_task(self, task_id: int, assignee: str) -> bool:
         """Assign a task to a user"""
-        for task in self.tasks:
-            if task['id'] == task_id:
-                task['assignee'] = assignee
-                task['updated_at'] = datetime.now().isoformat()
-                self._save_tasks()
-                return True
-        return False
+        return await self._write(self._assign_task, task_id, assignee)
+
+    def _assign_task(self, task_id: int, assignee: str) -> bool:
+        task = self.store.get(task_id)
+        if task is None:
+            return False
+        previous = dict(task)
+        self.store.update(task_id, self._prepare_updates(task, {'assignee': assignee}, datetime.now().isoformat()))
+        self._save_tasks(changed=[task])
+        self._notify('updated', task, previous)
+        return True
 
     async def add_dependency(self, task_id: int, dependency_id: int) -> bool:
-        """Add a dependency to a task"""
-        for task in self.tasks:
-            if task['id'] == task_id:
-                if dependency_id not in task['dependencies']:
-                    task['dependencies'].append(dependency_id)
-                    task['updated_at'] = datetime.now().isoformat()
-                    self._save_tasks()
-                return True
-        return False
+        """Add a dependency to a task.
+
+        Raises DependencyCycleError if the dependency already (transitively)
+        depends on the task.
+        """
+        return await self._write(self._add_dependency, task_id, dependency_id)
+
+    def _add_dependency(self, task_id: int, dependency_id: int) -> bool:
+        task = self.store.get(task_id)
+        if task is None or dependency_id not in self.store:
+            return False
+        if dependency_id not in task['dependencies']:
+            self.graph.add_edge(task_id, dependency_id)
+            previous = {**task, 'dependencies': list(task['dependencies'])}
+            task['dependencies'].append(dependency_id)
+            self.store.update(task_id, self._prepare_updates(task, {}, datetime.now().isoformat()))
+            self._save_tasks(changed=[task])
+            self._notify('updated', task, previous)
+        return True
 
     async def get_task_dependencies(self, task_id: int) -> List[Dict[str, Any]]:
         """Get all dependencies for a task"""
@@ -131,3 +459,57 @@ class TaskService:
     async def get_assignee_tasks(self, assignee: str) -> List[Dict[str, Any]]:
         """Get all tasks assigned to a user"""
         return await self.list_tasks({'assignee': assignee})
+
+    async def get_transitive_dependencies(self, task_id: int) -> List[Dict[str, Any]]:
+        """Get every task this task waits on, directly or indirectly, in execution order"""
+        await self.writes.refresh()
+        ids = self.graph.transitive_dependencies(task_id)
+        return [self.store.get(dep_id) for dep_id in self.graph.topological_order(ids)]
+
+    async def get_transitive_dependents(self, task_id: int) -> List[Dict[str, Any]]:
+        """Get every task blocked by this task, directly or indirectly, in execution order"""
+        await self.writes.refresh()
+        ids = self.graph.transitive_dependents(task_id)
+        return [self.store.get(dep_id) for dep_id in self.graph.topological_order(ids)]
+
+    async def get_execution_order(self, project_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get tasks (optionally of one project) with dependencies before dependents"""
+        await self.writes.refresh()
+        if project_id is None:
+            ids = None
+        else:
+            ids = [task['id'] for task in self.store.find({'project_id': project_id})]
+        return [self.store.get(task_id) for task_id in self.graph.topological_order(ids)]
+
+    async def get_project_stats(self, project_id: int) -> Dict[str, Any]:
+        """Get the project's task counts by status and priority, overdue tasks and completion"""
+        await self.writes.refresh()
+        return self.aggregates.stats(project_id)
+
+    async def get_burndown(self, project_id: int, start: Optional[date] = None,
+                           end: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Get the project's open task count at the end of each day"""
+        await self.writes.refresh()
+        return self.aggregates.burndown(project_id, start, end)
+
+    async def get_critical_path(self, project_id: int) -> Dict[str, Any]:
+        """Get the critical path and per-task slack of a project.
+
+        Durations come from metadata['estimate_hours'] (1 hour when unset);
+        only dependencies inside the project are considered.
+        """
+        await self.writes.refresh()
+        ids = [task['id'] for task in self.store.find({'project_id': project_id})]
+
+        def duration(task_id: int) -> float:
+            metadata = self.store.get(task_id).get('metadata') or {}
+            return float(metadata.get('estimate_hours', 1))
+
+        result = self.graph.critical_path(ids, duration)
+        return {
+            'length_hours': result['length'],
+            'critical_path': [self.store.get(task_id) for task_id in result['path']],
+            'slack_hours': result['slack'],
+            'earliest_start_hours': result['earliest_start']
+        }
+
@@ -0,0 +1,41 @@
+from typing import List, Union
+from difflib import SequenceMatcher
+import re
+
+# Chunk boundaries: after each line break and after each sentence, so an
+# edit inside a long paragraph only rewrites the sentences it touches
+_BOUNDARY = re.compile(r'(?<=\n)|(?<=[.!?] )')
+
+# A delta is a list of ops: [start, end] copies base chunks start..end-1,
+# a string is inserted as is
+Delta = List[Union[List[int], str]]
+
+
+def chunks(text: str) -> List[str]:
+    """Lines and sentences of a text; joined, they give the text back"""
+    return [chunk for chunk in _BOUNDARY.split(text) if chunk]
+
+
+def make_delta(base: str, target: str) -> Delta:
+    """Ops that rebuild target from the chunks of base"""
+    base_chunks, target_chunks = chunks(base), chunks(target)
+    delta: Delta = []
+    matcher = SequenceMatcher(None, base_chunks, target_chunks)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == 'equal':
+            if delta and isinstance(delta[-1], list) and delta[-1][1] == i1:
+                delta[-1][1] = i2
+            else:
+                delta.append([i1, i2])
+        elif j1 < j2:
+            inserted = ''.join(target_chunks[j1:j2])
+            if delta and isinstance(delta[-1], str):
+                delta[-1] += inserted
+            else:
+                delta.append(inserted)
+    return delta
+
+
+def apply_delta(base: str, delta: Delta) -> str:
+    base_chunks = chunks(base)
+    return ''.join(op if isinstance(op, str) else ''.join(base_chunks[op[0]:op[1]]) for op in delta)
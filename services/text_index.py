@@ -0,0 +1,212 @@
+from typing import Dict, Any, List, Tuple, Hashable, Iterable, Optional
+from bisect import bisect_left, insort
+from collections import Counter
+import heapq
+import math
+from services.fuzzy_index import normalize, STOPWORDS
+
+
+def tokenize(text: str, stopwords: Iterable[str] = STOPWORDS) -> List[str]:
+    """Lowercase, accent-free words of a text, without stopwords"""
+    return [word for word in normalize(text, frozenset()).split() if word not in stopwords]
+
+
+def field_terms(fields: Dict[str, str], stopwords: Iterable[str] = STOPWORDS) -> Dict[str, Dict[str, int]]:
+    """Term counts of each non-empty field, as TextIndex.docs keeps them"""
+    terms = {}
+    for field, text in fields.items():
+        counts = Counter(tokenize(text, stopwords))
+        if counts:
+            terms[field] = dict(counts)
+    return terms
+
+
+def flatten_text(value: Any) -> str:
+    """Join the strings found in a (possibly nested) value"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, (list, tuple)):
+        return ''
+    return ' '.join(filter(None, map(flatten_text, value)))
+
+
+class TextIndex:
+    """Inverted index over the text fields of documents, ranked with BM25.
+
+    `docs` holds each document's term counts per field and is the only
+    part worth persisting: postings, lengths and the sorted vocabulary are
+    derived from it by `load`. Field weights scale the term counts before
+    scoring (a simplified BM25F), so a word in the query or title counts
+    more than one in the body.
+
+    Searches are conjunctive: a document must contain every query word.
+    The last word also matches as a prefix ("neuro" finds "neuronal"),
+    expanded through a bisect over the vocabulary to its `max_expansions`
+    most frequent completions; a document scores it through the rarest
+    completion it contains.
+    """
+
+    def __init__(self, field_weights: Optional[Dict[str, float]] = None,
+                 k1: float = 1.2, b: float = 0.75, max_expansions: int = 50,
+                 min_prefix: int = 2, stopwords: Iterable[str] = STOPWORDS):
+        self.field_weights = field_weights or {}
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+        self.min_prefix = min_prefix
+        self.stopwords = frozenset(stopwords)
+        self.docs: Dict[Hashable, Dict[str, Dict[str, int]]] = {}
+        # term -> {doc id: weighted term frequency}
+        self.postings: Dict[str, Dict[Hashable, float]] = {}
+        self.lengths: Dict[Hashable, float] = {}
+        self.total_length = 0.0
+        self.vocabulary: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self.docs
+
+    def _weighted(self, fields: Dict[str, Dict[str, int]]) -> Counter:
+        weighted = Counter()
+        for field, terms in fields.items():
+            weight = self.field_weights.get(field, 1.0)
+            for term, count in terms.items():
+                weighted[term] += weight * count
+        return weighted
+
+    def _post(self, doc_id: Hashable, fields: Dict[str, Dict[str, int]]) -> None:
+        weighted = self._weighted(fields)
+        postings = self.postings
+        for term, frequency in weighted.items():
+            docs = postings.get(term)
+            if docs is None:
+                postings[term] = {doc_id: frequency}
+                insort(self.vocabulary, term)
+            else:
+                docs[doc_id] = frequency
+        length = sum(weighted.values())
+        self.lengths[doc_id] = length
+        self.total_length += length
+
+    def set_fields(self, doc_id: Hashable, fields: Dict[str, str]) -> None:
+        """Index (or re-index) some text fields of a document, keeping the others"""
+        terms = dict(self.docs.get(doc_id, {}))
+        counted = field_terms(fields, self.stopwords)
+        for field in fields:
+            if field in counted:
+                terms[field] = counted[field]
+            else:
+                terms.pop(field, None)
+        self.remove(doc_id)
+        self.docs[doc_id] = terms
+        self._post(doc_id, terms)
+
+    def set_terms(self, doc_id: Hashable, terms: Dict[str, Dict[str, int]]) -> None:
+        """Index (or re-index) a document from persisted term counts, as load does"""
+        self.remove(doc_id)
+        self.docs[doc_id] = terms
+        self._post(doc_id, terms)
+
+    def remove(self, doc_id: Hashable) -> None:
+        fields = self.docs.pop(doc_id, None)
+        if fields is None:
+            return
+        for term in self._weighted(fields):
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+                del self.vocabulary[bisect_left(self.vocabulary, term)]
+        self.total_length -= self.lengths.pop(doc_id)
+
+    def load(self, docs: Dict[Hashable, Dict[str, Dict[str, int]]]) -> None:
+        """Rebuild the index from persisted term counts (kept by reference)"""
+        self.docs = docs
+        self.postings = {}
+        self.lengths = {}
+        self.total_length = 0.0
+        for doc_id, fields in docs.items():
+            weighted = self._weighted(fields)
+            for term, frequency in weighted.items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+            length = sum(weighted.values())
+            self.lengths[doc_id] = length
+            self.total_length += length
+        self.vocabulary = sorted(self.postings)
+
+    def expand(self, prefix: str) -> List[str]:
+        """Indexed terms starting with prefix, the most frequent first"""
+        start = bisect_left(self.vocabulary, prefix)
+        end = bisect_left(self.vocabulary, prefix + '\uffff', start)
+        terms = self.vocabulary[start:end]
+        if len(terms) > self.max_expansions:
+            terms = heapq.nlargest(self.max_expansions, terms, key=lambda term: len(self.postings[term]))
+        return terms
+
+    def _idf(self, term: str) -> float:
+        df = len(self.postings[term])
+        return math.log(1 + (len(self.docs) - df + 0.5) / (df + 0.5))
+
+    def search(self, text: str, limit: Optional[int] = None,
+               prefix: bool = True) -> List[Tuple[Hashable, float]]:
+        """Ids of the documents containing every word of text, best BM25 score first"""
+        words = list(dict.fromkeys(tokenize(text, self.stopwords)))
+        if not words:
+            return []
+
+        # One posting dict per query word. A prefix matches through the
+        # rarest of its completions that a document contains: map each
+        # document to that completion with C-level dict updates, from the
+        # most to the least frequent completion
+        words_postings = []
+        for position, word in enumerate(words):
+            if prefix and position == len(words) - 1 and len(word) >= self.min_prefix:
+                terms = self.expand(word)
+            else:
+                terms = [word] if word in self.postings else []
+            if not terms:
+                return []
+            if len(terms) == 1:
+                words_postings.append((self.postings[terms[0]], None, self._idf(terms[0])))
+                continue
+            terms.sort(key=lambda term: -len(self.postings[term]))
+            owner = {}
+            for position_in_group, term in enumerate(terms):
+                owner.update(dict.fromkeys(self.postings[term], position_in_group))
+            completions = [(self.postings[term], self._idf(term)) for term in terms]
+            words_postings.append((owner, completions, None))
+
+        # Start from the rarest word and keep the documents every other word has
+        words_postings.sort(key=lambda item: len(item[0]))
+        candidates = words_postings[0][0].keys()
+        for docs, _, _ in words_postings[1:]:
+            candidates = [doc_id for doc_id in candidates if doc_id in docs]
+
+        k1, b = self.k1, self.b
+        average = self.total_length / len(self.docs)
+        lengths = self.lengths
+        scored = []
+        for doc_id in candidates:
+            norm = k1 * (1 - b + b * lengths[doc_id] / average)
+            score = 0.0
+            for docs, completions, idf in words_postings:
+                if completions is None:
+                    frequency = docs[doc_id]
+                else:
+                    completion, idf = completions[docs[doc_id]]
+                    frequency = completion[doc_id]
+                score += idf * frequency * (k1 + 1) / (frequency + norm)
+            scored.append((doc_id, score))
+
+        if limit is not None:
+            scored = heapq.nlargest(limit, scored, key=lambda item: item[1])
+        else:
+            scored.sort(key=lambda item: -item[1])
+        return [(doc_id, round(score, 4)) for doc_id, score in scored]
+
+    def stats(self) -> Dict[str, Any]:
+        return {'documents': len(self.docs), 'terms': len(self.postings)}
@@ -0,0 +1,112 @@
+from typing import Dict, Any, List, Optional, Callable
+from contextvars import ContextVar
+import asyncio
+import functools
+import time
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+class Span:
+    """A timed section of work, nested under the span that was active when it started"""
+
+    __slots__ = ('name', 'attributes', 'parent', 'children', 'recorder',
+                 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, name: str, parent: Optional['Span'] = None,
+                 recorder: Any = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.parent = parent
+        self.children: List['Span'] = []
+        # Spans report to the closest recorder up the tree
+        self.recorder = recorder if recorder is not None else (parent.recorder if parent else None)
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ns(self) -> int:
+        end_ns = self.end_ns or time.perf_counter_ns()
+        return end_ns - self.start_ns
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the span and its children into a trace tree"""
+        tree = {
+            'name': self.name,
+            'duration_ms': self.duration_ns / 1_000_000,
+            'offset_ms': (self.start_ns - self.parent.start_ns) / 1_000_000 if self.parent else 0.0,
+            'children': [child.to_dict() for child in self.children]
+        }
+        if self.attributes:
+            tree['attributes'] = self.attributes
+        if self.error:
+            tree['error'] = self.error
+        return tree
+
+
+class trace_span:
+    """Time a block of code as a span, usable with both `with` and `async with`.
+
+    Pass a recorder (anything with a record_span(span) method, such as
+    MetricsService) on the outermost span; nested spans inherit it.
+    """
+
+    def __init__(self, name: str, recorder: Any = None, **attributes: Any):
+        self.name = name
+        self.recorder = recorder
+        self.attributes = attributes
+        self.span: Optional[Span] = None
+        self._token = None
+
+    def __enter__(self) -> Span:
+        parent = _current_span.get()
+        span = Span(self.name, parent, self.recorder, self.attributes)
+        if parent is not None:
+            parent.children.append(span)
+        self.span = span
+        self._token = _current_span.set(span)
+        span.start_ns = time.perf_counter_ns()
+        return span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        span = self.span
+        span.end_ns = time.perf_counter_ns()
+        _current_span.reset(self._token)
+        if exc is not None:
+            span.error = f"{exc_type.__name__}: {exc}"
+        if span.recorder is not None:
+            span.recorder.record_span(span)
+        return False
+
+    async def __aenter__(self) -> Span:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        return self.__exit__(exc_type, exc, tb)
+
+
+def current_span() -> Optional[Span]:
+    """Get the span active in the current context"""
+    return _current_span.get()
+
+
+def traced(name: Optional[str] = None, recorder: Any = None) -> Callable:
+    """Decorator that wraps every call of a function (sync or async) in a span"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                async with trace_span(span_name, recorder):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace_span(span_name, recorder):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from services.concurrency_limiter import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded
+
+def test_limit_grows_additively_under_slo():
+    limiter = AdaptiveConcurrencyLimiter('test', initial_limit=4, latency_slo_ms=100)
+    for _ in range(40):
+        assert limiter.try_acquire()
+        limiter.release(10_000_000)
+    # +1/limit per success: roughly one slot per round of `limit` requests
+    assert 9 <= limiter.limit <= 11
+
+def test_limit_holds_when_p95_exceeds_slo():
+    limiter = AdaptiveConcurrencyLimiter('test', initial_limit=4, latency_slo_ms=100)
+    for _ in range(20):
+        limiter.try_acquire()
+        limiter.release(500_000_000)
+    assert limiter.limit == 4
+
+def test_errors_shrink_limit_once_per_slo_period():
+    limiter = AdaptiveConcurrencyLimiter('test', initial_limit=16, latency_slo_ms=60000)
+    for _ in range(5):
+        limiter.try_acquire()
+        limiter.release(0, 'error')
+    assert limiter.limit == 8
+    assert limiter.snapshot()['errors'] == 5
+
+def test_rejects_when_limit_reached():
+    limiter = AdaptiveConcurrencyLimiter('test', initial_limit=2)
+    assert limiter.try_acquire()
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.snapshot()['rejected'] == 1
+
+@pytest.mark.asyncio
+async def test_slot_records_timeouts():
+    limiter = AdaptiveConcurrencyLimiter('test', initial_limit=4, latency_slo_ms=1)
+    with pytest.raises(asyncio.TimeoutError):
+        async with limiter.slot():
+            await asyncio.wait_for(asyncio.sleep(1), 0.001)
+    assert limiter.in_flight == 0
+    assert limiter.limit == 2
+
+    limiter.limit = 1
+    async with limiter.slot():
+        with pytest.raises(ConcurrencyLimitExceeded):
+            async with limiter.slot():
+                pass
@@ -0,0 +1,71 @@
+import asyncio
+import multiprocessing
+import os
+import pytest
+from services.record_storage import VersionConflictError
+from services.task_service import TaskService
+
+WORKERS = 4
+ROUNDS = 40
+
+def _worker(data_dir: str, backend: str, counter_id: int, worker: int, queue) -> None:
+    os.chdir(data_dir)
+    os.environ['LUCIUS_STORAGE'] = backend
+
+    async def run() -> int:
+        service = TaskService()
+        conflicts = 0
+        for i in range(ROUNDS):
+            await service.create_task({'name': f'w{worker}-{i}'})
+            # Read-modify-write of a shared counter, retried on conflicts
+            while True:
+                task = await service.get_task(counter_id)
+                count = task['metadata'].get('count', 0)
+                try:
+                    await service.update_task(counter_id, {'metadata': {'count': count + 1}},
+                                              expected_version=task['version'])
+                    break
+                except VersionConflictError:
+                    conflicts += 1
+        return conflicts
+
+    queue.put(asyncio.run(run()))
+
+@pytest.mark.parametrize('backend', ['json', 'journal', 'sqlite'])
+def test_concurrent_workers_lose_no_updates(backend, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('LUCIUS_STORAGE', backend)
+    counter = asyncio.run(TaskService().create_task({'name': 'counter'}))
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(str(tmp_path), backend, counter['id'], worker, queue))
+        for worker in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    conflicts = [queue.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    service = TaskService()
+    tasks = service.tasks
+    assert len(tasks) == 1 + WORKERS * ROUNDS
+    assert len({task['id'] for task in tasks}) == len(tasks)
+    final = asyncio.run(service.get_task(counter['id']))
+    assert final['metadata']['count'] == WORKERS * ROUNDS
+    assert final['version'] == 1 + WORKERS * ROUNDS
+
+def test_expected_version_mismatch_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = TaskService()
+    task = asyncio.run(service.create_task({'name': 'A'}))
+    other = TaskService()
+    asyncio.run(other.update_task(task['id'], {'status': 'in_progress'}, expected_version=1))
+
+    # The first instance sees the other write and rejects its stale version
+    with pytest.raises(VersionConflictError):
+        asyncio.run(service.update_task(task['id'], {'status': 'blocked'}, expected_version=1))
+    assert asyncio.run(service.get_task(task['id']))['status'] == 'in_progress'
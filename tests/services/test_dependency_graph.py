@@ -0,0 +1,59 @@
+import random
+import pytest
+from services.dependency_graph import DependencyGraph, DependencyCycleError
+
+def _assert_topological(graph):
+    for task, prerequisites in graph.prerequisites.items():
+        for dependency in prerequisites:
+            assert graph.order[dependency] < graph.order[task]
+
+def test_insert_reorders_and_detects_cycles():
+    graph = DependencyGraph()
+    for node in range(1, 5):
+        graph.add_node(node)
+    # 1 depends on 4: 4 must move before 1
+    graph.add_edge(1, 4)
+    graph.add_edge(4, 3)
+    _assert_topological(graph)
+    order = graph.topological_order()
+    assert order.index(3) < order.index(4) < order.index(1)
+
+    with pytest.raises(DependencyCycleError):
+        graph.add_edge(3, 1)
+    with pytest.raises(DependencyCycleError):
+        graph.add_edge(2, 2)
+    assert 1 not in graph.prerequisites[3]
+
+def test_random_dag_stays_topological():
+    rng = random.Random(7)
+    graph = DependencyGraph()
+    nodes = list(range(300))
+    rng.shuffle(nodes)
+    for node in nodes:
+        graph.add_node(node)
+    for _ in range(1500):
+        a, b = rng.sample(range(300), 2)
+        task, dependency = max(a, b), min(a, b)
+        graph.add_edge(task, dependency)
+    _assert_topological(graph)
+    with pytest.raises(DependencyCycleError):
+        graph.add_edge(*next((dep, task) for task, deps in graph.prerequisites.items() for dep in deps))
+
+def test_transitive_queries_and_critical_path():
+    graph = DependencyGraph()
+    # design -> build -> test -> release, docs only needs design
+    graph.add_edge('build', 'design')
+    graph.add_edge('test', 'build')
+    graph.add_edge('release', 'test')
+    graph.add_edge('release', 'docs')
+    graph.add_edge('docs', 'design')
+    durations = {'design': 2, 'build': 5, 'test': 3, 'docs': 1, 'release': 1}
+
+    assert graph.transitive_dependencies('release') == {'design', 'build', 'test', 'docs'}
+    assert graph.transitive_dependents('design') == {'build', 'test', 'release', 'docs'}
+
+    result = graph.critical_path(durations, durations.__getitem__)
+    assert result['length'] == 11
+    assert result['path'] == ['design', 'build', 'test', 'release']
+    assert result['slack']['docs'] == 7
+    assert result['slack']['build'] == 0
@@ -0,0 +1,479 @@
+import asyncio
+import json
+import os
+import pytest
+from services.document_service import DocumentService
+
+@pytest.fixture
+def document_service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return DocumentService()
+
+@pytest.fixture
+def reads(document_service, monkeypatch):
+    """Ids of the document files read from disk"""
+    read_ids = []
+    get_document = document_service.get_document
+
+    async def counting_get_document(doc_id):
+        read_ids.append(doc_id)
+        return await get_document(doc_id)
+
+    monkeypatch.setattr(document_service, 'get_document', counting_get_document)
+    return read_ids
+
+async def save(document_service, query, topics=(), tags=()):
+    doc_id = await document_service.save_research({'query': query, 'summary': f"Resumen de {query}"})
+    await document_service.analyze_and_tag(doc_id, list(topics), list(tags))
+    return doc_id
+
+@pytest.mark.asyncio
+async def test_search_returns_metadata_without_reading_files(document_service, reads):
+    doc_id = await save(document_service, 'Redes neuronales', ['ia'], ['ml'])
+    await save(document_service, 'Recetas de cocina', ['cocina'])
+
+    results = await document_service.search_documents(query='neuronales')
+
+    assert [result.id for result in results] == [doc_id]
+    assert results[0].metadata['topics'] == ['ia']
+    assert not results[0].loaded and results[0].content is None
+    assert reads == []
+
+    document = await results[0].load()
+    await results[0].load()
+    assert document['content']['summary'] == 'Resumen de Redes neuronales'
+    assert results[0].to_dict()['content'] == document['content']
+    assert reads == [doc_id]
+
+@pytest.mark.asyncio
+async def test_search_pages_only_load_the_requested_page(document_service, reads):
+    ids = [await save(document_service, f"Tema {i}", ['ia']) for i in range(7)]
+
+    first = await document_service.search_documents(topics=['ia'], limit=3)
+    second = await document_service.search_documents(topics=['ia'], limit=3, offset=3, include_content=True)
+    last = await document_service.search_documents(topics=['ia'], limit=3, offset=6)
+
+    assert [r.id for r in first] == ids[:3]
+    assert [r.id for r in second] == ids[3:6]
+    assert [r.id for r in last] == ids[6:]
+    assert all(r.loaded for r in second)
+    assert reads == ids[3:6]
+    assert len(await document_service.search_documents(limit=None)) == 7
+
+@pytest.mark.asyncio
+async def test_related_documents_are_ranked_from_metadata(document_service, reads):
+    source = await save(document_service, 'Fuente', ['ia', 'datos'], ['ml'])
+    close = await save(document_service, 'Cercano', ['ia', 'datos'], ['ml'])
+    partial = await save(document_service, 'Parcial', ['ia', 'datos', 'etica'])
+    await save(document_service, 'Lejano', ['cocina'])
+
+    related = await document_service.get_related_documents(source)
+
+    assert [r.id for r in related] == [close, partial]
+    assert related[0].similarity == pytest.approx(1.0)
+    assert reads == []
+    page = await document_service.get_related_documents(source, limit=1, offset=1, include_content=True)
+    assert [r.id for r in page] == [partial]
+    assert reads == [partial]
+
+@pytest.mark.asyncio
+async def test_query_ranks_text_matches_across_fields(document_service):
+    in_query = await save(document_service, 'Energía solar')
+    in_tags = await save(document_service, 'Informe anual', ['energia'], ['solar'])
+    await save(document_service, 'Energía eólica')
+    in_summary = await document_service.save_research({
+        'query': 'Mercados', 'summary': 'Paneles solares y energía', 'findings': ['Costes']})
+
+    results = await document_service.search_documents(query='energia sol')
+
+    assert {r.id for r in results} == {in_query, in_tags, in_summary}
+    assert results[0].score >= results[1].score >= results[2].score > 0
+    assert [r.id for r in await document_service.search_documents(query='energia sol', topics=['energia'])] == [in_tags]
+    page = await document_service.search_documents(query='energia sol', limit=1, offset=1)
+    assert [r.id for r in page] == [results[1].id]
+
+    await document_service.delete_document(in_query)
+    assert in_query not in {r.id for r in await document_service.search_documents(query='solar')}
+
+@pytest.mark.asyncio
+async def test_index_survives_restarts_through_the_log(document_service):
+    doc_id = await save(document_service, 'Computación cuántica', ['fisica'], ['paper'])
+    other = await save(document_service, 'Borrador', ['fisica'])
+    await document_service.delete_document(other)
+
+    reloaded = DocumentService()
+    assert [r.id for r in await reloaded.search_documents(query='cuantica')] == [doc_id]
+    assert [r.id for r in await reloaded.search_documents(topics=['fisica'])] == [doc_id]
+    assert reloaded.document_index['tags'] == {'paper': [doc_id]}
+    assert reloaded.document_index['documents'][doc_id]['topics'] == ['fisica']
+
+@pytest.mark.asyncio
+async def test_saves_append_to_the_log_until_compaction(document_service, monkeypatch):
+    snapshot = document_service.storage.path
+    journal = document_service.storage.journal_path
+    await save(document_service, 'Primero')
+    snapshot_size = os.path.getsize(snapshot)
+
+    journal_size = os.path.getsize(journal)
+    await save(document_service, 'Segundo', ['ia'])
+    # Saving and tagging one document appends two short lines, whatever the index size
+    assert os.path.getsize(snapshot) == snapshot_size
+    assert os.path.getsize(journal) > journal_size
+    with open(journal) as f:
+        assert len(f.readlines()) == 4
+
+    document_service.storage.compact_every = 6
+    await save(document_service, 'Tercero')
+    assert os.path.getsize(journal) == 0
+    with open(snapshot) as f:
+        assert [record['metadata']['query'] for record in json.load(f)] == ['Primero', 'Segundo', 'Tercero']
+
+@pytest.mark.asyncio
+async def test_legacy_index_file_is_migrated(document_service):
+    doc_id = await save(document_service, 'Computación cuántica', ['fisica'])
+    metadata = document_service.document_index['documents'][doc_id]
+    # Single-file index of earlier versions, from before the text index
+    with open(document_service.index_file, 'w', encoding='utf-8') as f:
+        json.dump({'documents': {doc_id: metadata}, 'topics': {'fisica': [doc_id]}, 'tags': {}}, f)
+    os.remove(document_service.storage.path)
+    os.remove(document_service.storage.journal_path)
+
+    migrated = DocumentService()
+    assert [r.id for r in await migrated.search_documents(query='fisica cuant')] == [doc_id]
+    assert not migrated.index_file.exists()
+    assert os.path.exists(f"{migrated.index_file}.bak")
+    assert [r.id for r in await DocumentService().search_documents(topics=['fisica'])] == [doc_id]
+
+@pytest.mark.asyncio
+async def test_planner_starts_from_the_most_selective_index(document_service):
+    common = [await save(document_service, f"Común {i}", ['ia'], ['ml']) for i in range(6)]
+    rare = await save(document_service, 'Raro', ['ia', 'robotica'], ['ml'])
+
+    plan = document_service.explain_search(topics=['ia', 'robotica'], tags=['ml'])
+    assert (plan['driver'], plan['value'], plan['rows']) == ('topics', 'robotica', 1)
+    # The other lists are short enough to intersect instead of checking each candidate
+    assert plan['intersected'] == [('topics', 'ia'), ('tags', 'ml')]
+    assert plan['residual'] == []
+    document_service.INTERSECT_RATIO = 1
+    assert document_service.explain_search(topics=['ia', 'robotica'], tags=['ml'])['residual'] == [
+        ('topics', 'ia'), ('tags', 'ml')]
+    assert document_service.explain_search()['driver'] == 'all'
+    assert [r.id for r in await document_service.search_documents(topics=['ia', 'robotica'], tags=['ml'])] == [rare]
+    assert await document_service.search_documents(topics=['ia'], tags=['desconocido']) == []
+
+    # Re-tagging drops the document from the topics it no longer has
+    await document_service.analyze_and_tag(common[0], ['fisica'], [])
+    assert document_service.document_index['topics']['ia'] == sorted(common[1:] + [rare])
+    assert [r.id for r in await document_service.search_documents(topics=['fisica'])] == [common[0]]
+
+@pytest.mark.asyncio
+async def test_planned_searches_match_a_full_scan(document_service):
+    import random
+    rng = random.Random(3)
+    for i in range(120):
+        doc_id = await save(document_service, f"Doc {i}",
+                            rng.sample(['ia', 'datos', 'etica', 'fisica'], rng.randint(0, 2)),
+                            rng.sample(['ml', 'web', 'paper'], rng.randint(0, 2)))
+        document_service.document_index['documents'][doc_id]['timestamp'] = f"2024-01-{i % 28 + 1:02d}T12:00:00"
+    document_service._build_search_indexes()
+    documents = list(document_service.document_index['documents'].values())
+
+    for _ in range(60):
+        topics = rng.sample(['ia', 'datos', 'etica', 'fisica'], rng.randint(0, 2))
+        tags = rng.sample(['ml', 'web', 'paper'], rng.randint(0, 1))
+        date_from = f"2024-01-{rng.randint(1, 28):02d}" if rng.random() < 0.5 else None
+        date_to = f"2024-01-{rng.randint(1, 28):02d}T23:59:59" if rng.random() < 0.5 else None
+        expected = {
+            metadata['id'] for metadata in documents
+            if all(t in metadata['topics'] for t in topics) and all(t in metadata['tags'] for t in tags)
+            and (not date_from or metadata['timestamp'] >= date_from)
+            and (not date_to or metadata['timestamp'] <= date_to)
+        }
+        results = await document_service.search_documents(topics=topics, tags=tags, date_from=date_from,
+                                                          date_to=date_to, limit=None)
+        assert {r.id for r in results} == expected
+        assert len(results) == len(expected)
+
+    dated = document_service.explain_search(date_from='2024-01-03', date_to='2024-01-03T23:59:59')
+    assert dated['driver'] == 'date' and dated['rows'] == len([
+        m for m in documents if m['timestamp'].startswith('2024-01-03')])
+
+@pytest.mark.asyncio
+async def test_related_documents_use_lsh_candidates_and_exact_scores(document_service):
+    import random
+    rng = random.Random(11)
+    topics = [f"tema{i}" for i in range(12)]
+    tags = [f"etiqueta{i}" for i in range(6)]
+    ids = [await save(document_service, f"Doc {i}", rng.sample(topics, rng.randint(1, 3)),
+                      rng.sample(tags, rng.randint(0, 2))) for i in range(80)]
+
+    found = expected = 0
+    for doc_id in ids[:20]:
+        lsh = await document_service.get_related_documents(doc_id, limit=None)
+        exact = await document_service.get_related_documents(doc_id, limit=None, exhaustive=True)
+        exact_scores = {r.id: r.similarity for r in exact}
+        # Whatever LSH finds is scored exactly, and it finds nearly everything
+        assert all(exact_scores[r.id] == r.similarity for r in lsh)
+        assert [r.similarity for r in lsh] == sorted((r.similarity for r in lsh), reverse=True)
+        found += len(lsh)
+        expected += len(exact)
+    assert found >= 0.9 * expected
+
+    # Re-tagging updates the signatures
+    await document_service.analyze_and_tag(ids[1], ['unico'], [])
+    await document_service.analyze_and_tag(ids[2], ['unico'], [])
+    assert [r.id for r in await document_service.get_related_documents(ids[1])] == [ids[2]]
+    await document_service.delete_document(ids[2])
+    assert await document_service.get_related_documents(ids[1]) == []
+
+@pytest.mark.asyncio
+async def test_contents_are_packed_and_deduplicated(document_service):
+    research = {'query': 'Energía solar', 'summary': 'Paneles fotovoltaicos'}
+    first = await document_service.save_research(research)
+    second = await document_service.save_research(dict(research))
+    await document_service.analyze_and_tag(first, ['energia'], [])
+
+    assert not any(name.startswith('doc_') for name in os.listdir(document_service.base_path))
+    assert len(document_service.packs) == 1
+    document = await DocumentService().get_document(first)
+    assert document == {'metadata': document_service.document_index['documents'][first], 'content': research}
+
+    await document_service.delete_document(first)
+    assert (await document_service.get_document(second))['content'] == research
+    assert await document_service.get_document(first) is None
+
+@pytest.mark.asyncio
+async def test_unused_blobs_are_compacted_away(document_service, monkeypatch):
+    monkeypatch.setattr(DocumentService, 'PACK_COMPACT_MIN_BYTES', 0)
+    kept = await save(document_service, 'Se queda')
+    deleted = [await save(document_service, f"Se borra {i}") for i in range(3)]
+    for doc_id in deleted:
+        await document_service.delete_document(doc_id)
+
+    assert len(document_service.packs) == 1
+    assert os.path.getsize(document_service.packs.path) == document_service.packs.size
+    assert (await DocumentService().get_document(kept))['content']['query'] == 'Se queda'
+
+@pytest.mark.asyncio
+async def test_document_files_of_earlier_versions_are_moved_into_the_pack(document_service):
+    doc_id = await save(document_service, 'Biología marina', ['biologia'])
+    content = (await document_service.get_document(doc_id))['content']
+    document_service.packs.compact([])
+    document_service.document_index['blobs'].clear()
+    document_service._compact_index()
+    doc_path = document_service.base_path / f"{doc_id}.json"
+    with open(doc_path, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': {'id': doc_id, 'topics': []}, 'content': content}, f, indent=2)
+
+    migrated = DocumentService()
+    assert not doc_path.exists()
+    document = await DocumentService().get_document(doc_id)
+    assert document['content'] == content and document['metadata']['topics'] == ['biologia']
+    assert len(migrated.packs) == 1
+
+@pytest.mark.asyncio
+async def test_documents_are_cached_until_changed(document_service, monkeypatch):
+    doc_id = await save(document_service, 'Astronomía')
+    reads = []
+    get = document_service.packs.get
+    monkeypatch.setattr(document_service.packs, 'get', lambda digest: reads.append(digest) or get(digest))
+
+    first = await document_service.get_document(doc_id)
+    assert await document_service.get_document(doc_id) is first
+    assert len(reads) == 1
+
+    await document_service.analyze_and_tag(doc_id, ['espacio'], [])
+    assert (await document_service.get_document(doc_id))['metadata']['topics'] == ['espacio']
+    assert len(reads) == 2
+
+    # Another process writing to the pack drops the cache
+    DocumentService().packs.put(b'{}')
+    await document_service.get_document(doc_id)
+    assert len(reads) == 3
+
+    await document_service.delete_document(doc_id)
+    assert await document_service.get_document(doc_id) is None
+    assert document_service.cache.snapshot()['hits'] == 1
+
+@pytest.mark.asyncio
+async def test_cache_is_bounded_and_reported_in_metrics(document_service):
+    from services.metrics_service import MetricsService
+    document_service.cache.max_bytes = 150
+    ids = [await save(document_service, f"Documento {i}") for i in range(4)]
+    for doc_id in ids + ids[-1:]:
+        await document_service.get_document(doc_id)
+
+    metrics = MetricsService()
+    metrics.register_cache(document_service.cache)
+    status = (await metrics.get_system_status())['caches']['documents']
+    assert status['bytes'] <= 150 and status['evictions'] > 0
+    assert status['hits'] == 1 and status['misses'] == 4
+
+def prepared(doc_id, content, topics=()):
+    from services.pack_store import pack_blob
+    from services.text_index import field_terms
+    metadata = {'id': doc_id, 'timestamp': doc_id[4:], 'query': content['query'],
+                'topics': list(topics), 'tags': [], 'type': 'research'}
+    return {'metadata': metadata, 'terms': field_terms(DocumentService._text_fields(metadata, content)),
+            'blob': pack_blob(DocumentService._encode_content(content))}
+
+@pytest.mark.asyncio
+async def test_bulk_import_writes_pack_and_index_once(document_service, monkeypatch):
+    existing = await save(document_service, 'Existente')
+    saves, puts = [], []
+    monkeypatch.setattr(document_service.storage, 'save', lambda *args: saves.append(args))
+    add_packed = document_service.packs.add_packed
+    monkeypatch.setattr(document_service.packs, 'add_packed', lambda items: puts.append(1) or add_packed(items))
+    documents = [prepared(f"doc_2024-01-01T00:00:0{i}", {'query': f"Volcanes {i}", 'summary': 'Lava'}, ['geologia'])
+                 for i in range(5)]
+
+    assert document_service.import_documents(documents) == 5
+    assert saves == [] and len(puts) == 1
+
+    reloaded = DocumentService()
+    results = await reloaded.search_documents(query='volcanes', limit=None)
+    assert [result.id for result in results] == [d['metadata']['id'] for d in documents]
+    assert len(await reloaded.search_documents(topics=['geologia'], limit=None)) == 5
+    assert (await reloaded.get_document(documents[3]['metadata']['id']))['content']['query'] == 'Volcanes 3'
+    assert await reloaded.get_document(existing) is not None
+
+@pytest.mark.asyncio
+async def test_replace_terms_rebuilds_the_text_index(document_service):
+    doc_id = await save(document_service, 'Glaciares')
+
+    document_service.replace_terms({doc_id: {'query': {'hielo': 1}}})
+
+    reloaded = DocumentService()
+    assert [result.id for result in await reloaded.search_documents(query='hielo')] == [doc_id]
+    assert await reloaded.search_documents(query='glaciares') == []
+
+def revision(i):
+    return {'query': 'Fusión nuclear',
+            'summary': ''.join(f"Hallazgo {n} de la revisión {i if n == i else 0}. " for n in range(60))}
+
+@pytest.mark.asyncio
+async def test_updates_keep_earlier_versions_as_deltas(document_service, monkeypatch):
+    monkeypatch.setattr(DocumentService, 'VERSION_KEYFRAME_EVERY', 3)
+    doc_id = await save(document_service, 'Fusión nuclear', ['energia'])
+    await document_service.update_document(doc_id, revision(1))
+    pack_size = document_service.packs.size
+    for i in range(2, 7):
+        assert await document_service.update_document(doc_id, revision(i)) == i + 1
+    assert await document_service.update_document(doc_id, revision(6)) == 7
+
+    # Each revision adds its content and a small delta for the one it replaced
+    assert document_service.packs.size - pack_size < 5 * 2 * document_service.packs.stored_size(
+        document_service.document_index['blobs'][doc_id])
+    reloaded = DocumentService()
+    history = await reloaded.get_document_history(doc_id)
+    assert [entry['version'] for entry in history] == list(range(1, 8))
+    assert [entry['delta'] for entry in history] == [True, True, False, True, True, False, False]
+    assert history[1]['stored_bytes'] < history[2]['stored_bytes'] / 2
+    assert (await reloaded.get_document_version(doc_id, 1))['content']['summary'] == 'Resumen de Fusión nuclear'
+    for i in range(2, 7):
+        document = await reloaded.get_document_version(doc_id, i)
+        assert document['content'] == revision(i - 1) and document['metadata']['version'] == i
+    current = await reloaded.get_document(doc_id)
+    assert current['content'] == revision(6) and current['metadata']['topics'] == ['energia']
+    assert await reloaded.get_document_version(doc_id, 7) is current
+    assert await reloaded.get_document_version(doc_id, 8) is None
+    assert [result.id for result in await reloaded.search_documents(query='revisión')] == [doc_id]
+
+@pytest.mark.asyncio
+async def test_versions_survive_concurrent_updates_compaction_and_deletion(document_service, monkeypatch):
+    monkeypatch.setattr(DocumentService, 'PACK_COMPACT_MIN_BYTES', 0)
+    doc_id = await save(document_service, 'Fusión nuclear')
+    other = await save(document_service, 'Otro')
+
+    versions = await asyncio.gather(*(document_service.update_document(doc_id, revision(i)) for i in range(1, 4)))
+    await document_service.delete_document(other)
+
+    assert sorted(versions) == [2, 3, 4]
+    contents = [(await document_service.get_document_version(doc_id, v))['content'] for v in range(2, 5)]
+    assert sorted(content['summary'] for content in contents) == sorted(revision(i)['summary'] for i in range(1, 4))
+    assert (await DocumentService().get_document_version(doc_id, 1))['content']['query'] == 'Fusión nuclear'
+
+    await document_service.delete_document(doc_id)
+    assert await document_service.get_document_version(doc_id, 2) is None
+    assert await document_service.get_document_history(doc_id) == []
+    assert len(DocumentService().packs) == 0
+    with pytest.raises(ValueError):
+        await document_service.update_document(doc_id, revision(5))
+
+@pytest.mark.asyncio
+async def test_documents_of_other_workers_are_applied_and_survive_compaction(document_service):
+    other = DocumentService()
+    mine = await save(document_service, 'Mío', ['fisica'], ['paper'])
+    theirs = await save(other, 'Ajeno cuántico', ['fisica'], ['paper'])
+    draft = await save(other, 'Borrador', ['quimica'])
+    await other.delete_document(draft)
+
+    # Applied as deltas: text, topic, tag, date and related indexes all know it
+    assert [r.id for r in await document_service.search_documents(query='cuantico')] == [theirs]
+    assert [r.id for r in await document_service.search_documents(topics=['fisica'])] == [mine, theirs]
+    assert [r.id for r in await document_service.search_documents(date_from='2000-01-01')] == [mine, theirs]
+    assert [r.id for r in await document_service.get_related_documents(mine)] == [theirs]
+    assert (await document_service.get_document(theirs))['content']['query'] == 'Ajeno cuántico'
+    assert 'quimica' not in document_service.document_index['topics']
+
+    # Compacting here keeps the other worker's documents in the snapshot
+    document_service.storage.compact_every = 1
+    latest = await save(document_service, 'Último')
+    assert os.path.getsize(document_service.storage.journal_path) == 0
+    assert sorted(DocumentService().document_index['documents']) == sorted([mine, theirs, latest])
+
+    # After the compaction, the other worker reloads everything
+    assert [r.id for r in await other.search_documents(query='ultimo')] == [latest]
+    assert (await other.get_document(mine))['content']['query'] == 'Mío'
+
+@pytest.mark.asyncio
+async def test_pack_compaction_keeps_blobs_of_other_workers(document_service, monkeypatch):
+    monkeypatch.setattr(DocumentService, 'PACK_COMPACT_MIN_BYTES', 0)
+    monkeypatch.setattr(DocumentService, 'PACK_COMPACT_RATIO', 0)
+    other = DocumentService()
+    theirs = await save(other, 'Fusión nuclear')
+    versions = [await other.update_document(theirs, revision(i)) for i in range(1, 3)]
+    mine = await save(document_service, 'Mío')
+    size = document_service.packs.size
+
+    # Deleting here compacts the pack; the other worker's blobs stay
+    await document_service.delete_document(mine)
+    assert document_service.packs.size < size
+
+    assert (await DocumentService().get_document(theirs))['content']['summary'] == revision(2)['summary']
+    # The other worker reads its versions from the compacted pack, not
+    # through a mapping of the old one
+    other.packs.close()
+    assert versions == [2, 3]
+    assert (await other.get_document_version(theirs, 2))['content']['summary'] == revision(1)['summary']
+    assert (await other.get_document_version(theirs, 1))['content']['query'] == 'Fusión nuclear'
+    assert await other.update_document(theirs, revision(3)) == 4
+    assert (await other.get_document_version(theirs, 3))['content']['summary'] == revision(2)['summary']
+
+@pytest.mark.asyncio
+async def test_documents_of_other_workers_can_be_updated(document_service):
+    other = DocumentService()
+    doc_id = await save(other, 'Ajeno')
+
+    assert await document_service.update_document(doc_id, revision(1)) == 2
+    assert (await other.get_document(doc_id))['content']['summary'] == revision(1)['summary']
+
+@pytest.mark.asyncio
+async def test_versions_with_non_string_keys_rebuild_exactly(document_service):
+    content = {'query': 'Claves', 'sections': {2: 'dos. ' * 20, 10: 'diez. ' * 20}}
+    doc_id = await document_service.save_research(content)
+    await document_service.update_document(doc_id, {'query': 'Claves', 'sections': {2: 'dos. ' * 20, 10: 'otro. '}})
+
+    rebuilt = await DocumentService().get_document_version(doc_id, 1)
+    assert rebuilt['content'] == json.loads(json.dumps(content))
+
+@pytest.mark.asyncio
+async def test_changes_of_other_workers_do_not_count_live_blobs_as_dead(document_service):
+    doc_id = await save(document_service, 'Compartido')
+    other = DocumentService()
+    for i in range(5):
+        await other.analyze_and_tag(doc_id, [f"tema{i}"], [])
+        await document_service.search_documents()
+
+    assert document_service.document_index['documents'][doc_id]['topics'] == ['tema4']
+    assert document_service._dead_bytes == 0
@@ -0,0 +1,189 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from services.task_service import TaskService
+from services.due_date_scheduler import DueDateScheduler
+
+START = datetime(2024, 5, 1, 8, 0)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = START.timestamp()
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs).total_seconds()
+
+
+@pytest.fixture
+def task_service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return TaskService()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def fired():
+    return []
+
+
+@pytest.fixture
+def scheduler(task_service, clock, fired):
+    scheduler = DueDateScheduler(lambda task, due_at: fired.append((task['name'], due_at)), clock=clock)
+    scheduler.attach(task_service)
+    return scheduler
+
+
+def at(**kwargs):
+    return (START + timedelta(**kwargs)).isoformat()
+
+
+@pytest.mark.asyncio
+async def test_fires_each_open_task_once_when_due(task_service, scheduler, clock, fired):
+    await task_service.create_task({'name': 'Later', 'due_date': at(hours=2)})
+    await task_service.create_task({'name': 'Soon', 'due_date': at(minutes=30)})
+    await task_service.create_task({'name': 'No date'})
+    await task_service.create_task({'name': 'Done', 'due_date': at(minutes=10), 'status': 'done'})
+    assert len(scheduler) == 2
+    assert scheduler.next_fire_time() == clock() + 30 * 60
+
+    clock.advance(minutes=29)
+    assert scheduler.run_due() == []
+    clock.advance(minutes=1)
+    scheduler.run_due()
+    clock.advance(hours=3)
+    scheduler.run_due()
+    scheduler.run_due()
+
+    assert fired == [('Soon', START + timedelta(minutes=30)), ('Later', START + timedelta(hours=2))]
+    assert len(scheduler) == 0
+
+
+@pytest.mark.asyncio
+async def test_updates_and_deletes_replace_pending_reminders(task_service, scheduler, clock, fired):
+    moved = await task_service.create_task({'name': 'Moved', 'due_date': at(minutes=10)})
+    finished = await task_service.create_task({'name': 'Finished', 'due_date': at(minutes=20)})
+    deleted = await task_service.create_task({'name': 'Deleted', 'due_date': at(minutes=30)})
+
+    await task_service.update_task(moved['id'], {'due_date': at(hours=1)})
+    await task_service.update_tasks([{'id': finished['id'], 'status': 'completed'}])
+    await task_service.delete_task(deleted['id'])
+    # Unrelated changes keep the reminder
+    await task_service.assign_task(moved['id'], 'tom')
+
+    clock.advance(minutes=45)
+    assert scheduler.run_due() == []
+    clock.advance(minutes=15)
+    assert scheduler.run_due() == [moved['id']]
+    assert fired == [('Moved', START + timedelta(hours=1))]
+
+
+@pytest.mark.asyncio
+async def test_date_only_due_dates_use_default_time_and_lead_time(task_service, clock, fired):
+    await task_service.create_task({'name': 'Report', 'due_date': '2024-05-02'})
+    scheduler = DueDateScheduler(lambda task, due_at: fired.append(due_at),
+                                 lead_time=timedelta(minutes=15), clock=clock)
+    scheduler.attach(task_service)
+
+    assert scheduler.next_fire_time() == datetime(2024, 5, 2, 8, 45).timestamp()
+
+
+@pytest.mark.asyncio
+async def test_past_due_dates_are_not_reminded(task_service, scheduler, clock, fired):
+    await task_service.create_task({'name': 'Overdue', 'due_date': at(hours=-1)})
+    clock.advance(days=1)
+    assert scheduler.run_due() == []
+    assert fired == []
+
+
+@pytest.mark.asyncio
+async def test_superseded_entries_are_compacted(task_service, scheduler):
+    task = await task_service.create_task({'name': 'Moving', 'due_date': at(days=1)})
+    for minutes in range(500):
+        await task_service.update_task(task['id'], {'due_date': at(days=1, minutes=minutes)})
+    assert len(scheduler) == 1
+    assert len(scheduler._heap) <= 2 * len(scheduler) + 64
+
+
+@pytest.mark.asyncio
+async def test_changes_from_other_instances_are_picked_up(task_service, scheduler, clock):
+    other = TaskService()
+    task = await other.create_task({'name': 'Elsewhere', 'due_date': at(minutes=5)})
+    task_service.reload_if_changed()
+
+    clock.advance(minutes=5)
+    assert scheduler.run_due() == [task['id']]
+
+
+@pytest.mark.asyncio
+async def test_a_reload_keeps_reminders_that_came_due_since_the_last_tick(task_service, scheduler, clock, fired):
+    await task_service.create_task({'name': 'Due', 'due_date': at(minutes=5)})
+    clock.advance(minutes=6)
+    # Another worker writes between two ticks: the JSON backend reloads everything
+    await TaskService().create_task({'name': 'Unrelated'})
+    task_service.reload_if_changed()
+
+    assert scheduler.run_due() == [1]
+    assert fired == [('Due', START + timedelta(minutes=5))]
+
+
+def test_the_runner_sends_due_reminders_before_reloading(clock, fired):
+    calls = []
+
+    class Source:
+        def reload_if_changed(self):
+            calls.append('reload')
+            scheduler._stop.set()
+
+    scheduler = DueDateScheduler(lambda task, due_at: calls.append('fire'), clock=clock)
+    scheduler.schedule({'id': 1, 'name': 'Due', 'due_date': at(minutes=1)})
+    scheduler.source = Source()
+    clock.advance(minutes=1)
+    scheduler._run()
+
+    assert calls == ['fire', 'reload']
+
+
+@pytest.mark.asyncio
+async def test_callback_errors_do_not_stop_other_reminders(task_service, clock):
+    sent = []
+
+    def callback(task, due_at):
+        if task['name'] == 'Broken':
+            raise RuntimeError('slack down')
+        sent.append(task['name'])
+
+    scheduler = DueDateScheduler(callback, clock=clock)
+    scheduler.attach(task_service)
+    await task_service.create_task({'name': 'Broken', 'due_date': at(minutes=1)})
+    await task_service.create_task({'name': 'Fine', 'due_date': at(minutes=1)})
+    clock.advance(minutes=1)
+    scheduler.run_due()
+
+    assert sent == ['Fine']
+    assert scheduler.stats == {'fired': 1, 'errors': 1}
+
+
+@pytest.mark.asyncio
+async def test_background_thread_wakes_up_for_earlier_reminders(task_service):
+    fired = threading.Event()
+    scheduler = DueDateScheduler(lambda task, due_at: fired.set(), poll_interval=60)
+    scheduler.attach(task_service)
+    scheduler.start()
+    try:
+        # The thread is sleeping for poll_interval; the new reminder must wake it
+        time.sleep(0.05)
+        due = datetime.now() + timedelta(seconds=0.2)
+        await task_service.create_task({'name': 'Now', 'due_date': due.isoformat()})
+        assert fired.wait(2)
+        assert time.time() >= due.timestamp()
+    finally:
+        scheduler.stop()
@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from services.fair_queue import FairQueue
+
+async def _run(queue, user, order, cost=1.0):
+    async with queue.slot(user, cost):
+        order.append(user)
+        await asyncio.sleep(0)
+
+@pytest.mark.asyncio
+async def test_flooding_user_does_not_starve_others():
+    queue = FairQueue('test', capacity=1, per_user_limit=1)
+    order = []
+    tasks = [asyncio.create_task(_run(queue, 'alice', order)) for _ in range(10)]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(_run(queue, 'bob', order)) for _ in range(2)]
+    await asyncio.gather(*tasks)
+
+    assert len(order) == 12
+    # Bob is interleaved with Alice instead of waiting behind her backlog
+    assert order.index('bob') <= 3
+    assert order[:6].count('bob') == 2
+    assert queue.snapshot()['in_flight'] == 0
+
+@pytest.mark.asyncio
+async def test_weights_and_per_user_cap():
+    queue = FairQueue('test', capacity=4, per_user_limit=2, weights={'vip': 3.0})
+    order = []
+    blocker = asyncio.Event()
+
+    async def hold(user):
+        async with queue.slot(user):
+            order.append(user)
+            await blocker.wait()
+
+    tasks = [asyncio.create_task(hold('alice')) for _ in range(4)]
+    await asyncio.sleep(0.01)
+    # Alice is capped at two slots even though four are free
+    snapshot = queue.snapshot()
+    assert snapshot['in_flight'] == 2
+    assert snapshot['users']['alice'] == {'queued': 2, 'in_flight': 2, 'weight': 1.0}
+    assert queue.pressure() == 0.5
+    blocker.set()
+    await asyncio.gather(*tasks)
+
+    queue = FairQueue('test', capacity=1, per_user_limit=1, weights={'vip': 3.0})
+    order.clear()
+    tasks = [asyncio.create_task(_run(queue, user, order)) for user in ['std'] * 6 + ['vip'] * 6]
+    await asyncio.gather(*tasks)
+    assert order[:8].count('vip') >= 5
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    queue = FairQueue('test', capacity=1)
+    await queue.acquire('alice')
+    waiter = asyncio.create_task(queue.acquire('bob'))
+    await asyncio.sleep(0)
+    assert queue.queue_depth() == 1
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert queue.queue_depth() == 0
+    queue.release('alice')
+    assert queue.in_flight == 0
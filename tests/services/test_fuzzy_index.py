@@ -0,0 +1,40 @@
+import random
+from services.fuzzy_index import FuzzyIndex, normalize, trigrams
+
+def test_normalize_drops_accents_case_and_stopwords():
+    assert normalize("Pipeline de Entrenamiento") == "pipeline entrenamiento"
+    assert normalize("Migración: del CRM") == "migracion crm"
+    assert normalize("de la") == "de la"
+
+def test_similar_finds_near_duplicates_best_first():
+    index = FuzzyIndex()
+    index.load(enumerate(["Pipeline de entrenamiento", "Pipeline de despliegue", "Informe trimestral"]))
+
+    matches = index.similar("pipeline entrenamiento")
+    assert matches[0] == (0, 1.0)
+    assert index.similar("Pipline de entrenamiento")[0][0] == 0
+    assert index.similar("Revisar presupuesto") == []
+    assert index.exact("PIPELINE ENTRENAMIENTO") == [0]
+
+def test_updates_and_removals_are_reflected():
+    index = FuzzyIndex()
+    index.add(1, "Informe trimestral")
+    index.add(1, "Informe anual")
+    index.add(2, "Informe anual")
+    index.remove(2)
+    assert [record_id for record_id, _ in index.similar("informe anual")] == [1]
+    assert index.similar("informe trimestral", threshold=0.9) == []
+
+def test_filtered_lookup_matches_brute_force():
+    rng = random.Random(3)
+    words = ['alfa', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'theta', 'kappa', 'lambda', 'sigma']
+    names = [' '.join(rng.sample(words, rng.randint(1, 4))) for _ in range(300)]
+    index = FuzzyIndex()
+    index.load(enumerate(names))
+    for query in rng.sample(names, 20):
+        q = trigrams(normalize(query))
+        expected = {
+            i for i, name in enumerate(names)
+            if len(q & trigrams(normalize(name))) / len(q | trigrams(normalize(name))) >= 0.6
+        }
+        assert {i for i, _ in index.similar(query, limit=1000, threshold=0.6)} == expected
@@ -0,0 +1,67 @@
+import random
+import pytest
+from services.indexed_store import IndexedStore
+
+def _store(count=300, seed=7):
+    rng = random.Random(seed)
+    store = IndexedStore(('status', 'priority'), range_fields=('due_date', 'updated_at'))
+    for i in range(1, count + 1):
+        record = {
+            'id': i,
+            'status': rng.choice(['pending', 'in_progress', 'done']),
+            'priority': rng.choice(['low', 'medium', 'high']),
+            'due_date': rng.choice([None, f"2024-0{rng.randint(1, 9)}-{rng.randint(10, 28)}"]),
+            'updated_at': f"2024-05-{rng.randint(10, 28)}T00:00:00",
+            'points': rng.randint(0, 5)
+        }
+        store.add(record)
+    return store
+
+def _pages(store, where, order_by, limit):
+    records, cursor = store.query(where, order_by, limit)
+    pages = [records]
+    while cursor:
+        records, cursor = store.query(where, order_by, limit, cursor)
+        pages.append(records)
+    return [record['id'] for page in pages for record in page]
+
+def _expected(store, where_fn, field, descending):
+    records = [r for r in store.values() if where_fn(r)]
+    valued = sorted((r for r in records if r.get(field) is not None),
+                    key=lambda r: (r[field], r['id']), reverse=descending)
+    missing = sorted((r for r in records if r.get(field) is None), key=lambda r: r['id'], reverse=descending)
+    ordered = missing + valued if descending else valued + missing
+    return [r['id'] for r in ordered]
+
+@pytest.mark.parametrize('order', ['due_date', '-due_date', 'points', '-points', 'id'])
+@pytest.mark.parametrize('limit', [1, 7, 1000])
+def test_paged_queries_match_a_full_scan(order, limit):
+    store = _store()
+    field, descending = order.lstrip('-'), order.startswith('-')
+    cases = [
+        (None, lambda r: True),
+        ({'status': {'in': ['pending', 'done']}, 'priority': 'high'},
+         lambda r: r['status'] in ('pending', 'done') and r['priority'] == 'high'),
+        ({'due_date': {'gte': '2024-03-01', 'lt': '2024-06-01'}},
+         lambda r: r['due_date'] is not None and '2024-03-01' <= r['due_date'] < '2024-06-01'),
+        ({'updated_at': {'gt': '2024-05-20'}, 'points': {'lte': 2}},
+         lambda r: r['updated_at'] > '2024-05-20' and r['points'] <= 2),
+    ]
+    for where, where_fn in cases:
+        assert _pages(store, where, [order], limit) == _expected(store, where_fn, field, descending)
+
+def test_range_index_follows_updates_and_removals():
+    store = _store(count=20)
+    store.update(3, {'due_date': '2030-01-01'})
+    store.remove(5)
+    records, _ = store.query({'due_date': {'gte': '2030-01-01'}})
+    assert [r['id'] for r in records] == [3]
+    assert 5 not in [r['id'] for r in store.query(order_by=['-due_date'])[0]]
+
+def test_bad_cursors_are_rejected():
+    store = _store(count=20)
+    _, cursor = store.query(order_by=['due_date'], limit=5)
+    with pytest.raises(ValueError):
+        store.query(order_by=['-due_date'], limit=5, cursor=cursor)
+    with pytest.raises(ValueError):
+        store.query(limit=5, cursor='not-a-cursor')
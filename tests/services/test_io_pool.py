@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+import pytest
+from services.document_service import DocumentService
+from services.io_pool import WriteBatcher
+from services.project_service import ProjectService
+from services.record_storage import VersionConflictError
+from services.task_service import TaskService
+
+@pytest.fixture(params=['json', 'journal', 'sqlite'])
+def task_service(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('LUCIUS_STORAGE', request.param)
+    return TaskService()
+
+def count_saves(service, monkeypatch, delay=0.0):
+    """Number of storage writes, each taking `delay` seconds"""
+    saves = []
+    save = service.storage.save
+
+    def slow_save(*args):
+        saves.append(args)
+        time.sleep(delay)
+        save(*args)
+
+    monkeypatch.setattr(service.storage, 'save', slow_save)
+    return saves
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_are_grouped(task_service, monkeypatch):
+    saves = count_saves(task_service, monkeypatch, delay=0.02)
+
+    tasks = await asyncio.gather(*(task_service.create_task({'name': f"Tarea {i}"}) for i in range(40)))
+
+    assert len({task['id'] for task in tasks}) == 40
+    assert len(saves) < 10
+    assert len(TaskService().tasks) == 40
+
+@pytest.mark.asyncio
+async def test_slow_writes_do_not_block_the_event_loop(task_service, monkeypatch):
+    count_saves(task_service, monkeypatch, delay=0.2)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    ticking = asyncio.ensure_future(ticker())
+    await task_service.create_task({'name': 'Lenta'})
+    ticking.cancel()
+
+    assert len(ticks) > 5
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+
+@pytest.mark.asyncio
+async def test_a_failing_mutation_only_fails_its_caller(task_service):
+    task = await task_service.create_task({'name': 'A'})
+
+    results = await asyncio.gather(
+        task_service.update_task(task['id'], {'status': 'done'}, expected_version=7),
+        task_service.create_task({'name': 'B'}),
+        task_service.assign_task(task['id'], 'tom'),
+        return_exceptions=True)
+
+    assert isinstance(results[0], VersionConflictError)
+    assert results[1]['name'] == 'B' and results[2] is True
+    reloaded = TaskService()
+    assert [t['name'] for t in reloaded.tasks] == ['A', 'B']
+    assert reloaded.store.get(task['id'])['assignee'] == 'tom'
+
+@pytest.mark.asyncio
+async def test_writes_reload_changes_of_other_instances(task_service):
+    other = TaskService()
+    await other.create_task({'name': 'Otra'})
+    created = await task_service.create_task({'name': 'Nuestra'})
+
+    assert created['id'] == 2
+    assert [t['name'] for t in TaskService().tasks] == ['Otra', 'Nuestra']
+
+@pytest.mark.asyncio
+async def test_project_writes_go_through_the_pool(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = ProjectService()
+    saves = count_saves(service, monkeypatch, delay=0.02)
+    project = await service.create_project({'name': 'Lanzamiento'})
+
+    await asyncio.gather(*(service.add_task_to_project(project['id'], i) for i in range(10)),
+                         service.add_team_member(project['id'], 'mike'))
+
+    assert len(saves) < 6
+    stored = ProjectService().store.get(project['id'])
+    assert stored['tasks'] == list(range(10)) and stored['team'] == ['mike']
+
+@pytest.mark.asyncio
+async def test_document_saves_share_index_writes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = DocumentService()
+    saves = count_saves(service, monkeypatch, delay=0.02)
+
+    ids = await asyncio.gather(*(service.save_research({'query': f"Consulta {i}"}) for i in range(20)))
+    await asyncio.gather(*(service.analyze_and_tag(doc_id, ['ia'], []) for doc_id in ids))
+
+    assert len(saves) < 10
+    reloaded = DocumentService()
+    assert len(await reloaded.search_documents(topics=['ia'], limit=None)) == 20
+    documents = await reloaded.load_documents(await reloaded.search_documents(limit=None))
+    assert sorted(result.content['query'] for result in documents) == sorted(f"Consulta {i}" for i in range(20))
+
+def test_each_event_loop_drains_its_own_writes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = TaskService()
+    count_saves(service, monkeypatch, delay=0.01)
+    errors = []
+
+    def request(worker):
+        # One asyncio.run per request, as app.py does, from several threads
+        async def run():
+            await asyncio.gather(*(service.create_task({'name': f"w{worker}-{i}"}) for i in range(10)))
+        try:
+            asyncio.run(asyncio.wait_for(run(), 10))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=request, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(15)
+
+    assert errors == [] and not any(thread.is_alive() for thread in threads)
+    assert len(TaskService().tasks) == 40
+    assert service.writes._queues == {}
+
+def test_a_stopped_loop_does_not_keep_the_lock(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(WriteBatcher, 'LOOP_CHECK_INTERVAL', 0.05)
+    service = TaskService()
+    load_if_stale = service.writes.load_if_stale
+
+    def slow_load_if_stale():
+        time.sleep(0.2)
+        return load_if_stale()
+
+    monkeypatch.setattr(service.writes, 'load_if_stale', slow_load_if_stale)
+    # The caller gives up and its loop stops (without closing) while the
+    # group holds the lock and is about to run on that loop
+    stopped = asyncio.new_event_loop()
+    with pytest.raises(asyncio.TimeoutError):
+        stopped.run_until_complete(asyncio.wait_for(service.create_task({'name': 'Abandonada'}), 0.05))
+
+    try:
+        done = []
+        thread = threading.Thread(target=lambda: done.append(asyncio.run(service.create_task({'name': 'Segunda'}))))
+        thread.start()
+        thread.join(5)
+        assert done and done[0]['name'] == 'Segunda'
+
+        # The abandoned mutation does not run if the loop runs again
+        stopped.run_until_complete(asyncio.sleep(0.01))
+        assert [task['name'] for task in TaskService().tasks] == ['Segunda']
+    finally:
+        stopped.close()
+
+@pytest.mark.asyncio
+async def test_reads_pick_up_other_writes_off_the_event_loop(task_service, monkeypatch):
+    threads = []
+    read_changes = task_service.writes.load_if_stale
+
+    def recording_read_changes():
+        threads.append(threading.current_thread())
+        return read_changes()
+
+    monkeypatch.setattr(task_service.writes, 'load_if_stale', recording_read_changes)
+    task = await TaskService().create_task({'name': 'Otra'})
+
+    assert (await task_service.get_task(task['id']))['name'] == 'Otra'
+    assert [t['name'] for t in (await task_service.query_tasks())['items']] == ['Otra']
+    assert threads and threading.current_thread() not in threads
@@ -0,0 +1,28 @@
+from services.lru_cache import ByteLRUCache
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = ByteLRUCache('docs', max_bytes=100)
+    cache.put('a', 'A', 40)
+    cache.put('b', 'B', 40)
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C', 40)
+
+    assert 'b' not in cache and cache.get('a') == 'A' and cache.get('c') == 'C'
+    assert cache.bytes == 80 and cache.evictions == 1
+    assert cache.get('b') is None
+    assert cache.snapshot() == {'entries': 2, 'bytes': 80, 'max_bytes': 100, 'hits': 3,
+                                'misses': 1, 'evictions': 1, 'hit_rate': 0.75}
+
+def test_replacing_invalidating_and_oversized_values():
+    cache = ByteLRUCache('docs', max_bytes=100)
+    cache.put('a', 'A', 30)
+    cache.put('a', 'A2', 50)
+    assert cache.bytes == 50 and cache.get('a') == 'A2'
+    cache.put('huge', 'H', 101)
+    assert 'huge' not in cache and cache.evictions == 0
+    cache.invalidate('a')
+    cache.invalidate('a')
+    assert len(cache) == 0 and cache.bytes == 0
+    cache.put('b', 'B', 10)
+    cache.clear()
+    assert len(cache) == 0 and cache.bytes == 0
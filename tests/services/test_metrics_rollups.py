@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+import pytest
+from services.metrics_rollups import MetricsRollupStore
+
+@pytest.fixture
+def rollups(tmp_path):
+    store = MetricsRollupStore(str(tmp_path), retention={'minute': 10, 'hour': 48, 'day': 30})
+    yield store
+    store.close()
+
+def test_query_returns_buckets_in_range(rollups):
+    start = datetime(2025, 2, 13, 10, 0)
+    for minute in range(5):
+        timestamp = start + timedelta(minutes=minute)
+        rollups.record(interactions=1, timestamp=timestamp)
+        rollups.record(latency_seconds=0.5, timestamp=timestamp)
+    rollups.record(errors=1, timestamp=start + timedelta(minutes=2))
+
+    result = rollups.query('minute', start, start + timedelta(minutes=5))
+    assert list(result['interactions']) == [1, 1, 1, 1, 1]
+    assert list(result['errors']) == [0, 0, 1, 0, 0]
+    assert list(result['latency_sum_us']) == [500000] * 5
+
+    hourly = rollups.query('hour', start, start + timedelta(hours=1))
+    assert list(hourly['interactions']) == [5]
+    assert list(hourly['latency_count']) == [5]
+
+def test_retention_drops_overwritten_buckets(rollups):
+    start = datetime(2025, 2, 13, 10, 0)
+    for minute in range(15):
+        rollups.record(interactions=1, timestamp=start + timedelta(minutes=minute))
+
+    result = rollups.query('minute', start, start + timedelta(minutes=15))
+    # Only the last 10 minutes fit in the ring
+    assert len(result['bucket_start']) == 10
+    assert result['bucket_start'][0] == int((start + timedelta(minutes=5)).timestamp())
+
+def test_unknown_resolution(rollups):
+    with pytest.raises(ValueError):
+        rollups.query('week', 0, 1)
+
+def test_late_observations_do_not_reset_newer_buckets(rollups):
+    start = datetime(2025, 2, 13, 10, 0)
+    rollups.record(interactions=3, timestamp=start + timedelta(minutes=10))
+    # Same slot of the 10-minute ring, but a bucket that is no longer kept
+    rollups.record(interactions=1, timestamp=start)
+
+    result = rollups.query('minute', start, start + timedelta(minutes=11))
+    assert list(result['interactions']) == [3]
+    assert result['bucket_start'][0] == int((start + timedelta(minutes=10)).timestamp())
+
+def test_workers_with_other_retention_keep_their_own_rings(tmp_path, rollups):
+    start = datetime(2025, 2, 13, 10, 0)
+    rollups.record(interactions=1, timestamp=start)
+
+    other = MetricsRollupStore(str(tmp_path), retention={'minute': 20})
+    try:
+        other.record(interactions=2, timestamp=start)
+        assert list(other.query('minute', start, start + timedelta(minutes=1))['interactions']) == [2]
+    finally:
+        other.close()
+    # Opening the other configuration did not wipe this one
+    assert list(rollups.query('minute', start, start + timedelta(minutes=1))['interactions']) == [1]
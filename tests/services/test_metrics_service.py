@@ -0,0 +1,65 @@
+import multiprocessing
+import pytest
+from services.metrics_service import MetricsService
+from services.shared_metrics import SharedMetricsStore
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = MetricsService()
+    service.shared_store = SharedMetricsStore(str(tmp_path / "metrics.shm"))
+    return service
+
+@pytest.mark.asyncio
+async def test_a_high_error_ratio_throttles_until_it_recovers(metrics):
+    metrics.shared_store.increment('interactions', 20)
+    metrics.shared_store.increment('errors', 5)
+    assert not await metrics.should_throttle()
+
+    metrics.shared_store.increment('errors')
+    assert await metrics.should_throttle()
+    assert metrics.shared_store.snapshot()['counters']['throttled'] == 1
+
+    # Requests turned away still count as interactions, so the ratio falls
+    metrics.shared_store.increment('interactions', 5)
+    assert not await metrics.should_throttle()
+
+def _failing_worker(path: str):
+    store = SharedMetricsStore(path)
+    store.increment('interactions', 20)
+    store.increment('errors', 10)
+
+@pytest.mark.asyncio
+async def test_errors_of_other_workers_throttle_this_one(metrics, tmp_path):
+    process = multiprocessing.Process(target=_failing_worker, args=(str(tmp_path / "metrics.shm"),))
+    process.start()
+    process.join()
+
+    assert await metrics.should_throttle()
+    assert metrics.metrics['system_health']['error_rate'] == 10
+
+class FakeQueue:
+    name = 'agents'
+
+    def __init__(self):
+        self.backlog = 0.0
+
+    def pressure(self):
+        return self.backlog
+
+    def snapshot(self):
+        return {'pressure': self.backlog}
+
+@pytest.mark.asyncio
+async def test_queue_pressure_counts_in_the_cognitive_load(metrics):
+    queue = FakeQueue()
+    metrics.register_queue(queue)
+    metrics.shared_store.increment('interactions', 60)
+    metrics.metrics['cognitive_load']['complexity_score'] = 1.0
+    assert not await metrics.should_throttle()
+
+    queue.backlog = 1.0
+    assert await metrics.should_throttle()
+    status = await metrics.get_system_status()
+    assert status['cognitive_load']['score'] == pytest.approx(0.85)
+    assert status['cognitive_load']['queue_pressure'] == 1.0
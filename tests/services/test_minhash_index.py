@@ -0,0 +1,49 @@
+import random
+import pytest
+from services.minhash_index import MinHashIndex
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+def test_identical_sets_always_collide_and_disjoint_ones_rarely():
+    index = MinHashIndex(bands=16, rows=2)
+    index.add('a', ['x', 'y', 'z'])
+    index.add('b', ['z', 'y', 'x'])
+    index.add('c', ['p', 'q'])
+    index.add('empty', [])
+
+    assert index.candidates('a') == {'b'}
+    assert index.estimate('a', 'b') == 1.0
+    assert 'empty' not in index and index.candidates('empty') == set()
+    assert index.threshold() == pytest.approx(0.25)
+
+def test_updates_and_removals_move_buckets():
+    index = MinHashIndex()
+    index.add(1, ['x', 'y'])
+    index.add(2, ['x', 'y'])
+    index.add(2, ['p', 'q'])
+    assert 2 not in index.candidates(1)
+    index.add(3, ['p', 'q'])
+    index.remove(3)
+    index.remove(3)
+    assert index.candidates(2) == set()
+    assert sum(len(buckets) for buckets in index.buckets) == 2 * index.bands
+    assert index.stats()['largest_bucket'] == 1
+
+def test_recall_follows_the_banding_curve():
+    rng = random.Random(5)
+    universe = [f"t{i}" for i in range(40)]
+    sets = {i: set(rng.sample(universe, rng.randint(2, 6))) for i in range(400)}
+    for bands, rows in ((16, 2), (4, 4)):
+        index = MinHashIndex(bands, rows)
+        index.load(sets.items())
+        similar_pairs = found = 0
+        for i in range(50):
+            candidates = index.candidates(i)
+            for j, other in sets.items():
+                if i != j and jaccard(sets[i], other) >= 0.5:
+                    similar_pairs += 1
+                    found += j in candidates
+        recall = found / similar_pairs
+        expected = 1 - (1 - 0.5 ** rows) ** bands
+        assert recall >= expected - 0.1
@@ -0,0 +1,76 @@
+import os
+import pytest
+from services.pack_store import PackStore
+
+@pytest.fixture
+def pack_path(tmp_path):
+    return str(tmp_path / 'docs.pack')
+
+def test_identical_content_is_stored_once(pack_path):
+    packs = PackStore(pack_path)
+    first = packs.put(b'{"query": "hola"}' * 50)
+    size = packs.size
+    assert packs.put(b'{"query": "hola"}' * 50) == first
+    assert packs.size == size == os.path.getsize(pack_path)
+    assert size < 850  # compressed
+    assert packs.get(first) == b'{"query": "hola"}' * 50
+    assert packs.get('0' * 64) is None
+
+def test_reopened_store_reads_from_the_index(pack_path):
+    packs = PackStore(pack_path, compression='lzma')
+    digests = [packs.put(f"documento {i}".encode()) for i in range(20)]
+    packs.close()
+
+    reopened = PackStore(pack_path)
+    assert len(reopened) == 20
+    assert [reopened.get(digest) for digest in digests] == [f"documento {i}".encode() for i in range(20)]
+    # New blobs use the store's codec, old ones keep theirs
+    latest = reopened.put(b'zlib')
+    assert reopened.get(latest) == b'zlib' and reopened.get(digests[0]) == b'documento 0'
+
+def test_entries_missing_from_the_index_are_recovered(pack_path):
+    packs = PackStore(pack_path)
+    kept = packs.put(b'primero')
+    lost = packs.put(b'segundo')
+    with open(packs.index_path, 'r+b') as f:
+        f.truncate(os.path.getsize(packs.index_path) - 10)
+    with open(pack_path, 'ab') as f:
+        f.write(b'cabecera rota')
+
+    recovered = PackStore(pack_path)
+    assert recovered.get(kept) == b'primero' and recovered.get(lost) == b'segundo'
+    assert recovered.size == packs.size == os.path.getsize(pack_path)
+    assert PackStore(pack_path).entries == recovered.entries
+
+def test_compaction_keeps_only_live_blobs(pack_path):
+    packs = PackStore(pack_path)
+    live = packs.put(b'vivo' * 100)
+    dead = packs.put(b'muerto' * 100)
+    packs.get(live)  # maps the pack before it is replaced
+    size = packs.size
+
+    reclaimed = packs.compact([live])
+
+    assert packs.size == packs.stored_size(live) and reclaimed == size - packs.size
+    assert dead not in packs and packs.get(live) == b'vivo' * 100
+    assert os.path.getsize(pack_path) == packs.size
+    reopened = PackStore(pack_path)
+    assert list(reopened.entries) == [live] and reopened.get(live) == b'vivo' * 100
+    assert reopened.put(b'nuevo') in reopened
+
+def test_index_left_by_an_interrupted_compaction_is_rebuilt(pack_path):
+    packs = PackStore(pack_path)
+    dead = packs.put(b'muerto' * 100)
+    live = packs.put(b'vivo' * 100)
+    with open(packs.index_path, 'rb') as f:
+        old_index = f.read()
+
+    packs.compact([live])
+    # Crash after the new pack replaced the old one, before its index did
+    with open(packs.index_path, 'wb') as f:
+        f.write(old_index)
+
+    reopened = PackStore(pack_path)
+    assert list(reopened.entries) == [live] and reopened.get(live) == b'vivo' * 100
+    assert dead not in reopened
+    assert PackStore(pack_path).entries == reopened.entries
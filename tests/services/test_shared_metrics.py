@@ -0,0 +1,43 @@
+import multiprocessing
+import pytest
+from services.shared_metrics import SharedMetricsStore
+
+def _worker(path: str, count: int):
+    store = SharedMetricsStore(path)
+    for _ in range(count):
+        store.increment('interactions')
+        store.observe('task_latency_ms', 120)
+    store.increment('errors', 2)
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "metrics.shm")
+
+def test_counters_aggregate_across_processes(store_path):
+    reader = SharedMetricsStore(store_path)
+    processes = [
+        multiprocessing.Process(target=_worker, args=(store_path, 500))
+        for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    snapshot = reader.snapshot()
+    assert snapshot['counters']['interactions'] == 2000
+    assert snapshot['counters']['errors'] == 8
+    assert snapshot['last_hour']['interactions'] == 2000
+    assert snapshot['histograms']['task_latency_ms']['count'] == 2000
+    assert SharedMetricsStore.percentile(snapshot['histograms']['task_latency_ms'], 0.95) == 250
+
+def test_dead_worker_slot_is_reclaimed_without_losing_totals(store_path):
+    process = multiprocessing.Process(target=_worker, args=(store_path, 10))
+    process.start()
+    process.join()
+
+    store = SharedMetricsStore(store_path, max_workers=64)
+    store.increment('interactions')
+    snapshot = store.snapshot()
+    assert snapshot['counters']['interactions'] == 11
+    assert snapshot['workers'] == 1
@@ -0,0 +1,320 @@
+import json
+import threading
+import pytest
+from services.task_service import TaskService
+
+@pytest.fixture(params=['json', 'journal', 'sqlite'])
+def task_service(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('LUCIUS_STORAGE', request.param)
+    return TaskService()
+
+@pytest.mark.asyncio
+async def test_lookups_and_filters_use_indexes(task_service):
+    first = await task_service.create_task({'name': 'Pipeline', 'priority': 'high', 'project_id': 1})
+    second = await task_service.create_task({'name': 'Docs', 'priority': 'low', 'project_id': 1})
+    await task_service.create_task({'name': 'Deploy', 'priority': 'high', 'project_id': 2})
+
+    assert await task_service.get_task(second['id']) is second
+    assert await task_service.list_tasks({'name': 'Pipeline'}) == [first]
+    assert await task_service.list_tasks({'project_id': 1, 'priority': 'high'}) == [first]
+    assert [t['name'] for t in await task_service.get_project_tasks(1)] == ['Pipeline', 'Docs']
+    # Non-indexed fields are still filtered
+    assert await task_service.list_tasks({'project_id': 1, 'description': 'x'}) == []
+
+@pytest.mark.asyncio
+async def test_updates_keep_indexes_in_sync(task_service):
+    task = await task_service.create_task({'name': 'Pipeline'})
+    await task_service.update_task(task['id'], {'status': 'in_progress'})
+    await task_service.assign_task(task['id'], 'tom')
+
+    assert await task_service.list_tasks({'status': 'pending'}) == []
+    assert await task_service.list_tasks({'status': 'in_progress'}) == [task]
+    assert await task_service.get_assignee_tasks('tom') == [task]
+
+@pytest.mark.asyncio
+async def test_deleted_ids_are_not_reused(task_service):
+    first = await task_service.create_task({'name': 'A'})
+    second = await task_service.create_task({'name': 'B'})
+    assert await task_service.delete_task(first['id'])
+    third = await task_service.create_task({'name': 'C'})
+
+    assert third['id'] == second['id'] + 1
+    assert await task_service.list_tasks({'name': 'A'}) == []
+    assert await task_service.delete_task(first['id']) is False
+
+@pytest.mark.asyncio
+async def test_tasks_persist_across_instances(task_service):
+    task = await task_service.create_task({'name': 'Pipeline', 'assignee': 'tom'})
+    reloaded = TaskService()
+    assert (await reloaded.get_task(task['id']))['name'] == 'Pipeline'
+    assert len(await reloaded.get_assignee_tasks('tom')) == 1
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_migrates_json_tasks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'data' / 'tasks.json').write_text(json.dumps([
+        {'id': 1, 'name': 'Legacy', 'status': 'pending', 'priority': 'high', 'dependencies': []}
+    ]))
+    monkeypatch.setenv('LUCIUS_STORAGE', 'sqlite')
+
+    service = TaskService()
+    assert (await service.get_task(1))['name'] == 'Legacy'
+    task = await service.create_task({'name': 'Nueva'})
+    assert task['id'] == 2
+    assert [t['name'] for t in TaskService().tasks] == ['Legacy', 'Nueva']
+
+    # Emptying the table must not bring the JSON tasks back
+    await service.delete_task(1)
+    await service.delete_task(task['id'])
+    assert TaskService().tasks == []
+
+@pytest.mark.asyncio
+async def test_journal_replays_and_compacts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('LUCIUS_STORAGE', 'journal')
+    service = TaskService()
+    service.storage.compact_every = 5
+
+    first = await service.create_task({'name': 'A'})
+    second = await service.create_task({'name': 'B'})
+    await service.update_task(first['id'], {'status': 'done'})
+    await service.delete_task(second['id'])
+    # Snapshot is untouched until compaction; the journal carries the changes
+    assert json.loads((tmp_path / 'data' / 'tasks.json').read_text()) == []
+    reloaded = TaskService()
+    assert [(t['name'], t['status']) for t in reloaded.tasks] == [('A', 'done')]
+
+    await service.create_task({'name': 'C'})
+    assert (tmp_path / 'data' / 'tasks.json.journal').read_text() == ''
+    assert [t['name'] for t in json.loads((tmp_path / 'data' / 'tasks.json').read_text())] == ['A', 'C']
+
+@pytest.mark.asyncio
+async def test_journal_ignores_torn_tail(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('LUCIUS_STORAGE', 'journal')
+    service = TaskService()
+    await service.create_task({'name': 'A'})
+    with open(tmp_path / 'data' / 'tasks.json.journal', 'a') as f:
+        f.write('{"op": "put", "rec')
+
+    reloaded = TaskService()
+    await reloaded.create_task({'name': 'B'})
+    assert [t['name'] for t in TaskService().tasks] == ['A', 'B']
+
+@pytest.mark.asyncio
+async def test_journal_load_waits_for_an_append_in_progress(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('LUCIUS_STORAGE', 'journal')
+    service = TaskService()
+    await service.create_task({'name': 'A'})
+    line = json.dumps({'op': 'put', 'record': {**service.store.get(1), 'id': 2, 'name': 'B'}}) + '\n'
+    loaded = []
+
+    with service.storage.lock():
+        with open(tmp_path / 'data' / 'tasks.json.journal', 'a') as f:
+            f.write(line[:20])
+            f.flush()
+            # A worker starting now must not cut the half-written line off
+            starting = threading.Thread(target=lambda: loaded.append(TaskService()))
+            starting.start()
+            starting.join(0.2)
+            assert starting.is_alive()
+            f.write(line[20:])
+    starting.join()
+
+    assert [t['name'] for t in loaded[0].tasks] == ['A', 'B']
+
+@pytest.mark.asyncio
+async def test_dependencies_reject_cycles_and_give_critical_path(task_service):
+    design = await task_service.create_task({'name': 'Diseño', 'project_id': 1})
+    build = await task_service.create_task({'name': 'Desarrollo', 'project_id': 1})
+    await task_service.update_task(design['id'], {'metadata': {'estimate_hours': 3}})
+    assert await task_service.add_dependency(build['id'], design['id'])
+    assert await task_service.add_dependency(build['id'], 999) is False
+
+    with pytest.raises(ValueError):
+        await task_service.add_dependency(design['id'], build['id'])
+    assert design['dependencies'] == []
+
+    assert await task_service.get_transitive_dependents(design['id']) == [build]
+    assert [t['name'] for t in await task_service.get_execution_order(1)] == ['Diseño', 'Desarrollo']
+    critical = await task_service.get_critical_path(1)
+    assert critical['length_hours'] == 4
+    assert [t['id'] for t in critical['critical_path']] == [design['id'], build['id']]
+
+    reloaded = TaskService()
+    assert await reloaded.get_transitive_dependencies(build['id']) == [design]
+
+@pytest.mark.asyncio
+async def test_bulk_create_update_and_assign(task_service):
+    tasks = await task_service.create_tasks([{'name': 'A'}, {'name': 'B', 'priority': 'high'}, {'name': 'C'}])
+    assert [t['id'] for t in tasks] == [1, 2, 3]
+
+    await task_service.update_tasks([
+        {'id': 2, 'status': 'in_progress'},
+        {'id': 3, 'dependencies': [1, 2]}
+    ])
+    await task_service.assign_tasks({1: 'tom', 3: 'tom'})
+
+    reloaded = TaskService()
+    assert [t['name'] for t in await reloaded.get_assignee_tasks('tom')] == ['A', 'C']
+    assert (await reloaded.get_task(2))['status'] == 'in_progress'
+    assert [t['id'] for t in await reloaded.get_transitive_dependencies(3)] in ([1, 2], [2, 1])
+
+@pytest.mark.asyncio
+async def test_invalid_bulk_batches_change_nothing(task_service):
+    with pytest.raises(ValueError):
+        await task_service.create_tasks([{'name': 'A'}, {'description': 'no name'}])
+    assert task_service.tasks == []
+
+    await task_service.create_tasks([{'name': 'A'}, {'name': 'B'}])
+    with pytest.raises(ValueError):
+        await task_service.assign_tasks({1: 'tom', 99: 'tom'})
+    # The second update would close a cycle, so the first is undone too
+    with pytest.raises(ValueError):
+        await task_service.update_tasks([
+            {'id': 2, 'dependencies': [1], 'status': 'blocked'},
+            {'id': 1, 'dependencies': [2]}
+        ])
+
+    assert await task_service.get_assignee_tasks('tom') == []
+    assert (await task_service.get_task(2))['status'] == 'pending'
+    await task_service.add_dependency(1, 2)
+    assert task_service.graph.transitive_dependencies(1) == {2}
+
+@pytest.mark.asyncio
+async def test_query_tasks_pages_through_a_due_date_window(task_service):
+    await task_service.create_tasks([
+        {'name': f'T{i}', 'due_date': f'2024-01-{10 + i}', 'status': 'done' if i % 3 == 0 else 'pending'}
+        for i in range(10)
+    ])
+    where = {'due_date': {'gte': '2024-01-12', 'lte': '2024-01-18'}, 'status': {'in': ['pending']}}
+    page = await task_service.query_tasks(where, order_by=['-due_date'], limit=3)
+    assert [t['name'] for t in page['items']] == ['T8', 'T7', 'T5']
+    page = await task_service.query_tasks(where, order_by=['-due_date'], limit=3, cursor=page['next_cursor'])
+    assert [t['name'] for t in page['items']] == ['T4', 'T2']
+    assert page['next_cursor'] is None
+
+    streamed = [task['name'] async for task in task_service.iter_tasks(where, batch_size=2)]
+    assert streamed == ['T2', 'T4', 'T5', 'T7', 'T8']
+
+@pytest.mark.asyncio
+async def test_similar_task_names_follow_renames_and_deletes(task_service):
+    task = await task_service.create_task({'name': 'Pipeline de entrenamiento'})
+    other = await task_service.create_task({'name': 'Informe trimestral'})
+
+    matches = await task_service.find_similar_tasks('pipeline entrenamiento')
+    assert [(m['task']['id'], m['score']) for m in matches] == [(task['id'], 1.0)]
+
+    await task_service.update_task(task['id'], {'name': 'Revisar contrato'})
+    await task_service.delete_task(other['id'])
+    assert await task_service.find_similar_tasks('pipeline entrenamiento') == []
+    assert await task_service.find_similar_tasks('informe trimestral') == []
+    assert (await task_service.find_similar_tasks('revisar el contrato'))[0]['task'] is task
+
+@pytest.mark.asyncio
+async def test_project_aggregates_follow_task_changes(task_service):
+    from datetime import date, timedelta
+    today = date.today()
+    yesterday = (today - timedelta(days=1)).isoformat()
+    a, b, c = await task_service.create_tasks([
+        {'name': 'A', 'project_id': 1, 'priority': 'high', 'due_date': yesterday},
+        {'name': 'B', 'project_id': 1, 'due_date': yesterday},
+        {'name': 'C', 'project_id': 1, 'due_date': today.isoformat()},
+    ])
+    await task_service.create_task({'name': 'Other', 'project_id': 2})
+
+    stats = await task_service.get_project_stats(1)
+    assert stats['total_tasks'] == 3 and stats['overdue'] == 2
+    assert stats['by_priority'] == {'high': 1, 'medium': 2}
+
+    await task_service.update_task(a['id'], {'status': 'completed'})
+    await task_service.update_task(c['id'], {'project_id': 2})
+    await task_service.delete_task(b['id'])
+    stats = await task_service.get_project_stats(1)
+    assert stats == {
+        'total_tasks': 1, 'by_status': {'completed': 1}, 'by_priority': {'high': 1},
+        'completed': 1, 'open': 0, 'overdue': 0, 'completion_pct': 100.0
+    }
+    assert (await task_service.get_task(a['id']))['completed_at'] is not None
+    assert (await task_service.get_project_stats(2))['total_tasks'] == 2
+
+    # Reopening clears completed_at; the aggregates rebuild the same on load
+    await task_service.update_task(a['id'], {'status': 'in_progress'})
+    assert (await task_service.get_task(a['id']))['completed_at'] is None
+    reloaded = TaskService()
+    for project_id in (1, 2):
+        assert await reloaded.get_project_stats(project_id) == await task_service.get_project_stats(project_id)
+
+@pytest.mark.asyncio
+async def test_overdue_counts_only_parsable_due_dates(task_service):
+    from datetime import date, timedelta
+    yesterday = date.today() - timedelta(days=1)
+    tasks = await task_service.create_tasks([
+        {'name': 'A', 'project_id': 5, 'due_date': '15/10/2099'},
+        {'name': 'B', 'project_id': 5, 'due_date': f'{yesterday.isoformat()}T18:30:00'},
+        {'name': 'C', 'project_id': 5, 'due_date': f'{date.today().isoformat()}T09:00:00'},
+    ])
+    assert (await task_service.get_project_stats(5))['overdue'] == 1
+
+    await task_service.update_task(tasks[1]['id'], {'status': 'done'})
+    await task_service.delete_task(tasks[0]['id'])
+    assert (await task_service.get_project_stats(5))['overdue'] == 0
+
+@pytest.mark.asyncio
+async def test_burndown_counts_open_tasks_per_day(task_service):
+    from datetime import date, timedelta
+    tasks = await task_service.create_tasks([{'name': n, 'project_id': 7} for n in 'ABC'])
+    await task_service.update_task(tasks[0]['id'], {'status': 'done'})
+
+    today = date.today()
+    series = await task_service.get_burndown(7, start=today - timedelta(days=2))
+    assert series[-1] == {'date': today.isoformat(), 'remaining': 2}
+    assert [point['remaining'] for point in series[:-1]] == [0, 0]
+    assert await task_service.get_burndown(99) == []
+
+@pytest.mark.asyncio
+async def test_linked_project_service_reads_task_aggregates(task_service):
+    from services.project_service import ProjectService
+    projects = ProjectService(task_service=task_service)
+    project = await projects.create_project({'name': 'Dashboard'})
+    await task_service.create_tasks([{'name': 'A', 'project_id': project['id'], 'status': 'done'},
+                                     {'name': 'B', 'project_id': project['id']}])
+
+    stats = await projects.get_project_stats(project['id'])
+    assert stats['completion_pct'] == 50.0 and stats['team_size'] == 0
+    assert (await projects.get_project_burndown(project['id']))[-1]['remaining'] == 1
+
+@pytest.mark.asyncio
+async def test_journal_changes_of_other_workers_are_applied_incrementally(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('LUCIUS_STORAGE', 'journal')
+    ours, theirs = TaskService(), TaskService()
+    design = await ours.create_task({'name': 'Diseño', 'project_id': 1})
+    build = await ours.create_task({'name': 'Obra', 'project_id': 1})
+    theirs.reload_if_changed()
+    events = []
+    ours.add_listener(lambda event, task, previous: events.append((event, task and task['name'])))
+
+    await theirs.create_task({'name': 'Pruebas', 'project_id': 1})
+    await theirs.update_task(build['id'], {'status': 'done', 'dependencies': [design['id']]})
+    await theirs.delete_task(design['id'])
+    full_loads = []
+    load = ours.storage._load
+    monkeypatch.setattr(ours.storage, '_load', lambda: full_loads.append(1) or load())
+
+    assert [t['name'] for t in ours.tasks] == ['Obra', 'Pruebas']
+    assert full_loads == []
+    assert sorted(events) == [('created', 'Pruebas'), ('deleted', 'Diseño'), ('updated', 'Obra')]
+    assert ours.store.get(build['id']) is build and build['status'] == 'done'
+    assert await ours.list_tasks({'status': 'done'}) == [build]
+    assert ours.aggregates.stats(1)['completed'] == 1
+    assert [m['task']['name'] for m in await ours.find_similar_tasks('Pruebas')] == ['Pruebas']
+
+    # After a compaction the new snapshot is read whole
+    theirs.storage.compact(theirs.store)
+    await theirs.create_task({'name': 'Entrega'})
+    assert [t['name'] for t in ours.tasks] == ['Obra', 'Pruebas', 'Entrega']
+    assert full_loads == [1] and events[-1] == ('reloaded', None)
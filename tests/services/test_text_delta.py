@@ -0,0 +1,18 @@
+from services.text_delta import apply_delta, chunks, make_delta
+
+def test_chunks_split_lines_and_sentences_losslessly():
+    text = "Primera frase. Segunda frase! Fin\nOtra línea\n\nÚltima"
+    assert chunks(text) == ["Primera frase. ", "Segunda frase! ", "Fin\n", "Otra línea\n", "\n", "Última"]
+    assert ''.join(chunks(text)) == text
+
+def test_delta_copies_unchanged_chunks_and_rebuilds_the_target():
+    base = ''.join(f"Frase número {i}. " for i in range(200)) + "\nCierre\n"
+    target = base.replace("Frase número 120. ", "Frase corregida. ") + "Anexo\n"
+
+    delta = make_delta(base, target)
+
+    assert apply_delta(base, delta) == target
+    assert [op for op in delta if isinstance(op, str)] == ["Frase corregida. ", "Anexo\n"]
+    assert apply_delta(target, make_delta(target, base)) == base
+    assert apply_delta("algo", make_delta("algo", "")) == ""
+    assert apply_delta("", make_delta("", "nuevo")) == "nuevo"
@@ -0,0 +1,68 @@
+import json
+import pytest
+from services.text_index import TextIndex, tokenize, flatten_text
+
+def test_tokenize_drops_accents_punctuation_and_stopwords():
+    assert tokenize('Análisis de las Redes, neuronales!') == ['analisis', 'redes', 'neuronales']
+    assert flatten_text({'a': 'uno', 'b': ['dos', {'c': 'tres'}], 'n': 4}) == 'uno dos tres'
+
+def test_all_words_must_match_and_rarer_words_rank_higher():
+    index = TextIndex()
+    index.set_fields(1, {'body': 'redes neuronales profundas'})
+    index.set_fields(2, {'body': 'redes sociales'})
+    index.set_fields(3, {'body': 'redes neuronales'})
+    index.set_fields(4, {'body': 'cocina'})
+
+    assert [doc for doc, _ in index.search('redes neuronales', prefix=False)] == [3, 1]
+    assert index.search('redes cocina') == []
+    assert index.search('de la') == []
+    # Shorter documents with the same words score higher
+    scores = dict(index.search('neuronales', prefix=False))
+    assert scores[3] > scores[1] > 0
+
+def test_field_weights_and_term_frequency():
+    index = TextIndex({'title': 3.0})
+    index.set_fields('a', {'title': 'python', 'body': 'texto largo sobre otra cosa'})
+    index.set_fields('b', {'title': 'otra cosa', 'body': 'python texto largo sobre'})
+    index.set_fields('c', {'body': 'nada'})
+
+    assert [doc for doc, _ in index.search('python')] == ['a', 'b']
+
+def test_last_word_matches_as_prefix():
+    index = TextIndex(max_expansions=2)
+    index.set_fields(1, {'body': 'red neuronal'})
+    index.set_fields(2, {'body': 'red neurociencia'})
+    index.set_fields(3, {'body': 'neutro'})
+    index.set_fields(4, {'body': 'neuronal'})
+
+    assert {doc for doc, _ in index.search('red neur')} == {1, 2}
+    assert index.search('red neur', prefix=False) == []
+    # Only the most frequent completions are expanded
+    assert index.expand('neu') == ['neuronal', 'neurociencia']
+    assert index.expand('neuronal') == ['neuronal']
+
+def test_updates_and_removals_keep_postings_consistent():
+    index = TextIndex()
+    index.set_fields(1, {'query': 'clima', 'tags': 'ciencia'})
+    index.set_fields(1, {'tags': 'politica'})
+    index.set_fields(2, {'query': 'clima'})
+
+    assert index.search('ciencia') == []
+    assert [doc for doc, _ in index.search('clima politica')] == [1]
+    index.remove(1)
+    index.remove(1)
+    assert [doc for doc, _ in index.search('clima')] == [2]
+    assert 'politica' not in index.vocabulary and 'ciencia' not in index.postings
+    assert index.total_length == pytest.approx(index.lengths[2])
+
+def test_load_rebuilds_from_persisted_term_counts():
+    index = TextIndex({'query': 2.0})
+    for i, text in enumerate(['alfa beta', 'beta gamma', 'gamma delta alfa']):
+        index.set_fields(i, {'query': text, 'body': text})
+
+    restored = TextIndex({'query': 2.0})
+    restored.load(json.loads(json.dumps(index.docs)))
+
+    assert restored.vocabulary == index.vocabulary
+    for text in ['alfa', 'beta gam', 'gamma alfa']:
+        assert [doc for doc, _ in restored.search(text)] == [str(doc) for doc, _ in index.search(text)]
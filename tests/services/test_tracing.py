@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from services.tracing import trace_span, traced, current_span
+
+class RecorderStub:
+    def __init__(self):
+        self.spans = []
+
+    def record_span(self, span):
+        self.spans.append(span)
+
+@traced()
+async def fetch_data():
+    await asyncio.sleep(0)
+    return current_span().name
+
+@traced('compute')
+def compute():
+    return 42
+
+@pytest.mark.asyncio
+async def test_nested_spans_build_trace_tree():
+    recorder = RecorderStub()
+    async with trace_span('workflow.research', recorder=recorder) as root:
+        async with trace_span('mike.research'):
+            name = await fetch_data()
+        assert compute() == 42
+
+    assert name == 'fetch_data'
+    assert [span.name for span in recorder.spans] == [
+        'fetch_data', 'mike.research', 'compute', 'workflow.research'
+    ]
+    tree = root.to_dict()
+    assert [child['name'] for child in tree['children']] == ['mike.research', 'compute']
+    assert tree['children'][0]['children'][0]['name'] == 'fetch_data'
+    assert root.duration_ns >= tree['children'][0]['duration_ms'] * 1_000_000
+    assert current_span() is None
+
+@pytest.mark.asyncio
+async def test_span_records_error():
+    recorder = RecorderStub()
+    with pytest.raises(ValueError):
+        async with trace_span('failing', recorder=recorder):
+            raise ValueError('boom')
+    assert recorder.spans[0].error == 'ValueError: boom'